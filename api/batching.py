@@ -0,0 +1,252 @@
+"""Asyncio micro-batching scheduler for the inference API.
+
+Concurrent requests are queued. A single scheduler task collects them into
+a batch until one of these happens: the batch holds `max_batch_size`
+requests, adding the next request would exceed `max_batch_tokens`, or
+`max_wait_ms` has passed since the first request arrived. The batch then
+runs as one blocking `generate_batch(prompts)` call on a worker thread, so
+the event loop keeps accepting requests, and each caller's future receives
+its own result.
+
+Batches run one at a time; requests that arrive during a batch wait in the
+queue and form the next one, so batches grow with load.
+
+Nothing here imports torch or FastAPI, so the scheduler can be tested and
+benchmarked on its own.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+from src.latency import latency_summary
+
+
+@dataclass
+class _Pending:
+    prompt: str
+    tokens: int
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """Coalesce concurrent `submit()` calls into batched generate calls.
+
+    `max_batch_tokens` bounds the padded sequence size of a batch, that is
+    batch size times (longest prompt + `max_new_tokens`), the width every
+    row's KV cache grows to. `count_tokens` measures a prompt; without it
+    every prompt counts as one token. A single prompt over the budget still
+    runs, on its own.
+    """
+
+    def __init__(
+        self,
+        generate_batch: Callable[[List[str]], Sequence[Any]],
+        *,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_batch_tokens: Optional[int] = None,
+        max_new_tokens: int = 0,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        executor: Optional[Executor] = None,
+        history: int = 1000,
+    ) -> None:
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be > 0")
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+        self.max_new_tokens = max_new_tokens
+        self.count_tokens = count_tokens
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="generate"
+        )
+        self._owns_executor = executor is None
+        self._queue: Optional[asyncio.Queue] = None
+        self._carry: Optional[_Pending] = None
+        self._task: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=history)
+        self._queue_wait: Deque[float] = deque(maxlen=history)
+        self._batch_time: Deque[float] = deque(maxlen=history)
+
+    @property
+    def executor(self) -> Executor:
+        """Thread that runs generation; share it to serialize other model use."""
+        return self._executor
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="micro-batcher")
+
+    async def stop(self) -> None:
+        """Stop scheduling and fail any queued requests."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        pending = [self._carry] if self._carry else []
+        self._carry = None
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for p in pending:
+            if not p.future.done():
+                p.future.set_exception(RuntimeError("batcher stopped"))
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def submit(self, prompt: str) -> Any:
+        """Queue `prompt` and wait for its result."""
+        if self._task is None or self._queue is None:
+            raise RuntimeError("batcher is not running; call start() first")
+        tokens = self.count_tokens(prompt) if self.count_tokens else 1
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        await self._queue.put(_Pending(prompt, tokens, future))
+        return await future
+
+    def _fits(self, batch: List[_Pending], longest: int, item: _Pending) -> bool:
+        if self.max_batch_tokens is None:
+            return True
+        width = max(longest, item.tokens) + self.max_new_tokens
+        return (len(batch) + 1) * width <= self.max_batch_tokens
+
+    async def _collect(self) -> List[_Pending]:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        first = self._carry or await self._queue.get()
+        self._carry = None
+        batch, longest = [first], first.tokens
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except asyncio.TimeoutError:
+                break
+            if not self._fits(batch, longest, item):
+                self._carry = item
+                break
+            batch.append(item)
+            longest = max(longest, item.tokens)
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnects) are not generated
+            batch = [p for p in batch if not p.future.done()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            self._queue_wait.extend(start - p.enqueued for p in batch)
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.generate_batch, [p.prompt for p in batch]
+                )
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"generate_batch returned {len(results)} results "
+                        f"for {len(batch)} prompts"
+                    )
+            except asyncio.CancelledError:
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(RuntimeError("batcher stopped"))
+                raise
+            except Exception as e:
+                self.failed_batches += 1
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+                continue
+            finally:
+                self.batches += 1
+                self._batch_sizes.append(len(batch))
+                self._batch_time.append(time.perf_counter() - start)
+            for p, result in zip(batch, results):
+                if not p.future.done():
+                    p.future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = list(self._batch_sizes)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "mean_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_batch_tokens": self.max_batch_tokens,
+            "max_new_tokens": self.max_new_tokens,
+            "queue_wait": latency_summary(self._queue_wait),
+            "batch_time": latency_summary(self._batch_time),
+        }
+
+
+def token_counter(tokenizer) -> Callable[[str], int]:
+    """`count_tokens` for `MicroBatcher` backed by a private tokenizer copy.
+
+    Counting runs on the event loop while the worker thread tokenizes and
+    pads with the serving tokenizer. HF fast tokenizers are not safe for
+    concurrent calls that change padding or truncation state ("Already
+    borrowed"), so the counter never shares the instance.
+    """
+    counter = copy.deepcopy(tokenizer)
+
+    def count(prompt: str) -> int:
+        return len(counter(prompt)["input_ids"])
+
+    return count
+
+
+def make_generate_batch(
+    model,
+    tokenizer,
+    *,
+    max_batch_size: int,
+    max_new_tokens: int = 128,
+    length_buckets: Optional[Sequence[int]] = None,
+    batch_buckets: Optional[Sequence[int]] = None,
+    **generate_kwargs: Any,
+) -> Callable[[List[str]], List[str]]:
+    """Blocking `prompts -> replies` over `BatchedGenerator` (new tokens only)."""
+    from src.generation import BatchedGenerator
+
+    generate_kwargs.setdefault("do_sample", False)
+    engine = BatchedGenerator(
+        tokenizer,
+        batch_size=max_batch_size,
+        length_buckets=length_buckets,
+        batch_buckets=batch_buckets,
+        return_full_text=False,
+        max_new_tokens=max_new_tokens,
+        **generate_kwargs,
+    )
+
+    def generate_batch(prompts: List[str]) -> List[str]:
+        run = engine.run(prompts, {"model": model})
+        return [row["model_response"] for row in run.rows]
+
+    return generate_batch
@@ -1,12 +1,187 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import json
 import os
-from typing import List, Union
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import Depends, FastAPI, Header, HTTPException, status
+from api.batching import MicroBatcher, make_generate_batch, token_counter
+from api.streaming import StreamMetrics, stream_generate
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from src.evaluation import (
+    DEFAULT_LENGTH_BUCKETS,
+    batch_size_buckets,
+    compile_for_inference,
+)
+from src.model_registry import get_registry
+from src.startup import StartupTimeline, warmup
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _env_quantization() -> Union[bool, str]:
+    value = os.getenv("SUPPORTBOT_QUANTIZATION", "").strip().lower()
+    if value in {"auto", "nf4", "int8-dynamic"}:
+        return value
+    return _env_flag("SUPPORTBOT_QUANTIZATION")
+
+
+def _env_buckets() -> List[int]:
+    raw = os.getenv("SUPPORTBOT_COMPILE_BUCKETS")
+    if not raw:
+        return list(DEFAULT_LENGTH_BUCKETS)
+    return [int(b) for b in raw.split(",") if b.strip()]
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+@dataclass
+class ServingModel:
+    model: Any
+    tokenizer: Any
+    timeline: StartupTimeline
+    length_buckets: Optional[List[int]] = None
+    batch_buckets: Optional[List[int]] = None
+
+
+def _model_source() -> Optional[Dict[str, Optional[str]]]:
+    """Weights to serve: a package from scripts/package_model.py, or a base model.
+
+    $SUPPORTBOT_PACKAGE_DIR wins over $SUPPORTBOT_BASE_MODEL (with optional
+    $SUPPORTBOT_PEFT_MODEL_PATH).
+    """
+    package_dir = os.getenv("SUPPORTBOT_PACKAGE_DIR")
+    if package_dir:
+        pkg = Path(package_dir)
+        with open(pkg / "package_info.json", encoding="utf-8") as f:
+            info = json.load(f)
+        tokenizer_dir = pkg / "tokenizer"
+        tokenizer_name = str(tokenizer_dir) if tokenizer_dir.is_dir() else None
+        if info.get("package_type") == "merged-weights":
+            return {
+                "base_model_name": str(pkg / "model"),
+                "peft_model_path": None,
+                "tokenizer_name": tokenizer_name or info["base_model"],
+            }
+        return {
+            "base_model_name": info["base_model"],
+            "peft_model_path": str(pkg / "adapter"),
+            "tokenizer_name": tokenizer_name,
+        }
+    base = os.getenv("SUPPORTBOT_BASE_MODEL")
+    if not base:
+        return None
+    return {
+        "base_model_name": base,
+        "peft_model_path": os.getenv("SUPPORTBOT_PEFT_MODEL_PATH") or None,
+        "tokenizer_name": None,
+    }
+
+
+def load_startup_model() -> Optional[ServingModel]:
+    """Load the model to serve (see `_model_source`) into the registry and time it.
+
+    Env: SUPPORTBOT_QUANTIZATION (1/auto, nf4 or int8-dynamic),
+    SUPPORTBOT_FAST_LOAD, SUPPORTBOT_PREFETCH_WEIGHTS, SUPPORTBOT_WARMUP
+    (default on), SUPPORTBOT_COMPILE (with SUPPORTBOT_COMPILE_BUCKETS and
+    SUPPORTBOT_COMPILE_CACHE_DIR), SUPPORTBOT_MAX_NEW_TOKENS and
+    SUPPORTBOT_STARTUP_PROFILE (JSON output path).
+    """
+    source = _model_source()
+    if source is None:
+        return None
+    timeline = StartupTimeline()
+    model, tokenizer = get_registry().get(
+        source["base_model_name"],
+        quantization=_env_quantization(),
+        peft_model_path=source["peft_model_path"],
+        fast_load=_env_flag("SUPPORTBOT_FAST_LOAD"),
+        prefetch=_env_flag("SUPPORTBOT_PREFETCH_WEIGHTS"),
+        tokenizer_name=source["tokenizer_name"],
+        timeline=timeline,
+    )
+    serving = ServingModel(model=model, tokenizer=tokenizer, timeline=timeline)
+    if _env_flag("SUPPORTBOT_COMPILE"):
+        compiled = compile_for_inference(
+            model,
+            tokenizer,
+            buckets=_env_buckets(),
+            # Batches are padded up to these row counts (1, 2, 4, ..., max)
+            batch_sizes=batch_size_buckets(_env_int("SUPPORTBOT_MAX_BATCH_SIZE", 8)),
+            max_new_tokens=_env_int("SUPPORTBOT_MAX_NEW_TOKENS", 128),
+            timeline=timeline,
+        )
+        if compiled["enabled"]:
+            serving.length_buckets = compiled["buckets"]
+            serving.batch_buckets = compiled["batch_sizes"]
+        else:
+            print(f"[api] torch.compile failed, serving eager: {compiled['error']}")
+    if _env_flag("SUPPORTBOT_WARMUP", True) and serving.length_buckets is None:
+        warmup(model, tokenizer, timeline)
+    print(f"[api] Ready in {timeline.total:.2f}s")
+    print(timeline.format())
+    profile = os.getenv("SUPPORTBOT_STARTUP_PROFILE")
+    if profile:
+        timeline.to_json(profile)
+    return serving
+
+
+def build_batcher(serving: ServingModel) -> MicroBatcher:
+    """Micro-batcher over the serving model.
 
-app = FastAPI(title="LLM SupportBot Inference API")
+    Env: SUPPORTBOT_MAX_BATCH_SIZE (8), SUPPORTBOT_BATCH_WAIT_MS (10),
+    SUPPORTBOT_MAX_BATCH_TOKENS (4096; padded prompt + new tokens per batch)
+    and SUPPORTBOT_MAX_NEW_TOKENS (128).
+    """
+    max_batch_size = _env_int("SUPPORTBOT_MAX_BATCH_SIZE", 8)
+    max_new_tokens = _env_int("SUPPORTBOT_MAX_NEW_TOKENS", 128)
+    tokenizer = serving.tokenizer
+    return MicroBatcher(
+        make_generate_batch(
+            serving.model,
+            tokenizer,
+            max_batch_size=max_batch_size,
+            max_new_tokens=max_new_tokens,
+            length_buckets=serving.length_buckets,
+            batch_buckets=serving.batch_buckets,
+        ),
+        max_batch_size=max_batch_size,
+        max_wait_ms=float(os.getenv("SUPPORTBOT_BATCH_WAIT_MS", "10")),
+        max_batch_tokens=_env_int("SUPPORTBOT_MAX_BATCH_TOKENS", 4096),
+        max_new_tokens=max_new_tokens,
+        count_tokens=token_counter(tokenizer),
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.serving = load_startup_model()
+    app.state.batcher = None
+    app.state.stream_metrics = StreamMetrics()
+    if app.state.serving is not None:
+        app.state.batcher = build_batcher(app.state.serving)
+        await app.state.batcher.start()
+    try:
+        yield
+    finally:
+        if app.state.batcher is not None:
+            await app.state.batcher.stop()
+
+
+app = FastAPI(title="LLM SupportBot Inference API", lifespan=lifespan)
 
 
 class GenerateRequest(BaseModel):
@@ -17,6 +192,10 @@ class GenerateResponse(BaseModel):
     generated_text: Union[str, List[str]]
 
 
+class GenerateStreamRequest(BaseModel):
+    prompt: str
+
+
 def require_api_key(
     x_api_key: str | None = Header(default=None, alias="X-API-Key")
 ) -> None:
@@ -34,18 +213,81 @@ def healthz() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/models", dependencies=[Depends(require_api_key)])
+def models() -> dict:
+    """Models resident in this process: load times, sizes and hit counts."""
+    return get_registry().report()
+
+
+@app.get("/startup", dependencies=[Depends(require_api_key)])
+def startup() -> dict:
+    """Per-phase startup timeline of the model loaded at boot, if any."""
+    serving = getattr(app.state, "serving", None)
+    if serving is None:
+        return {"time_to_ready": None, "phases": []}
+    return serving.timeline.report()
+
+
+@app.get("/metrics", dependencies=[Depends(require_api_key)])
+def metrics() -> dict:
+    """Micro-batching and streaming counters with latency percentiles."""
+    batcher = getattr(app.state, "batcher", None)
+    streams = getattr(app.state, "stream_metrics", None)
+    return {
+        "batching": batcher.stats() if batcher is not None else None,
+        "streaming": streams.stats() if streams is not None else None,
+    }
+
+
+def _require_batcher() -> MicroBatcher:
+    batcher = getattr(app.state, "batcher", None)
+    if batcher is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No model loaded; set SUPPORTBOT_PACKAGE_DIR or SUPPORTBOT_BASE_MODEL",
+        )
+    return batcher
+
+
 @app.post(
     "/generate",
     response_model=GenerateResponse,
     dependencies=[Depends(require_api_key)],
 )
-def generate(req: GenerateRequest) -> GenerateResponse:
-    # Placeholder generation logic; echo back prompt(s)
-    def _gen(p: str) -> str:
-        return f"placeholder response for: {p}"
-
+async def generate(req: GenerateRequest) -> GenerateResponse:
+    batcher = _require_batcher()
+    # Each prompt is queued separately, so a list request shares batches
+    # with concurrent callers instead of forming its own
+    prompts = req.prompt if isinstance(req.prompt, list) else [req.prompt]
+    outputs = await asyncio.gather(*(batcher.submit(p) for p in prompts))
     if isinstance(req.prompt, list):
-        outputs = [_gen(p) for p in req.prompt]
-        return GenerateResponse(generated_text=outputs)
-    else:
-        return GenerateResponse(generated_text=_gen(req.prompt))
+        return GenerateResponse(generated_text=list(outputs))
+    return GenerateResponse(generated_text=outputs[0])
+
+
+@app.post("/generate/stream", dependencies=[Depends(require_api_key)])
+async def generate_stream(
+    req: GenerateStreamRequest, request: Request
+) -> StreamingResponse:
+    """Stream one reply as Server-Sent Events; the final `done` event has TTFT.
+
+    Generation shares the batcher's worker thread. A client disconnect
+    stops generation at the next decode step.
+    """
+    batcher = _require_batcher()
+    serving = app.state.serving
+    events = stream_generate(
+        serving.model,
+        serving.tokenizer,
+        req.prompt,
+        executor=batcher.executor,
+        max_new_tokens=_env_int("SUPPORTBOT_MAX_NEW_TOKENS", 128),
+        length_buckets=serving.length_buckets,
+        metrics=app.state.stream_metrics,
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,226 @@
+"""Token streaming for the inference API (Server-Sent Events).
+
+`generate` runs on the model's worker thread with an `AsyncTextStreamer`,
+which decodes tokens incrementally as they are produced and hands text
+chunks to the event loop thread-safely. `stream_generate` turns those
+chunks into SSE frames:
+
+    event: token   data: {"text": "..."}
+    event: done    data: {"ttft": ..., "total_time": ..., "output_tokens": ...}
+    event: error   data: {"detail": "..."}
+
+When the client disconnects, the response generator is closed. A
+`CancelFlag` stopping criterion then ends `generate` at its next decode
+step, so no further tokens are computed for a client that is no longer
+listening.
+
+Like `api.batching`, nothing here imports torch or FastAPI.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Sequence,
+)
+
+from src.latency import TimingStreamer, latency_summary
+
+_DONE = object()
+
+
+def _criteria(cancel: "CancelFlag"):
+    transformers = sys.modules.get("transformers")
+    if hasattr(transformers, "StoppingCriteriaList"):
+        return transformers.StoppingCriteriaList([cancel])
+    return [cancel]
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class CancelFlag:
+    """`generate` stopping criterion that fires once `cancel()` is called."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self._event.is_set()
+
+
+class AsyncTextStreamer(TimingStreamer):
+    """`generate` streamer that forwards decoded text to an asyncio queue.
+
+    `put`/`end` run on the generation thread. Text is re-decoded from all
+    generated ids each step and only the new suffix is sent, so multi-token
+    characters are not split. A trailing U+FFFD (an incomplete UTF-8 sequence)
+    is held back until the next token completes it.
+    """
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop) -> None:
+        super().__init__()
+        self.tokenizer = tokenizer
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.token_ids: list = []
+        self._sent = 0
+
+    def _emit(self, item: Any) -> None:
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+
+    def put(self, value: Any) -> None:
+        super().put(value)
+        if self._puts == 1:  # the prompt
+            return
+        ids = value.tolist() if hasattr(value, "tolist") else list(value)
+        if ids and isinstance(ids[0], list):
+            ids = ids[0]  # batch of one
+        self.token_ids.extend(ids)
+        text = self.tokenizer.decode(self.token_ids, skip_special_tokens=True)
+        if text.endswith("\ufffd") or len(text) <= self._sent:
+            return
+        self._emit(text[self._sent :])
+        self._sent = len(text)
+
+    def end(self) -> None:
+        super().end()
+        self._emit(_DONE)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await self.queue.get()
+            if item is _DONE:
+                return
+            yield item
+
+
+class StreamMetrics:
+    """Counters and TTFT/duration percentiles over recent streams."""
+
+    def __init__(self, history: int = 1000) -> None:
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._ttft: Deque[float] = deque(maxlen=history)
+        self._total: Deque[float] = deque(maxlen=history)
+
+    def record(
+        self, outcome: str, ttft: Optional[float], total: Optional[float]
+    ) -> None:
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        if ttft is not None:
+            self._ttft.append(ttft)
+        if total is not None and outcome == "completed":
+            self._total.append(total)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "ttft": latency_summary(self._ttft),
+            "total_time": latency_summary(self._total),
+        }
+
+
+async def stream_generate(
+    model,
+    tokenizer,
+    prompt: str,
+    *,
+    executor: Optional[Executor] = None,
+    max_new_tokens: int = 128,
+    length_buckets: Optional[Sequence[int]] = None,
+    metrics: Optional[StreamMetrics] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    **generate_kwargs: Any,
+) -> AsyncIterator[str]:
+    """Yield SSE frames for one prompt while it is generated on `executor`.
+
+    Runs on the same executor as the micro-batcher, so streamed and batched
+    generation never use the model concurrently. Closing the generator (a
+    client disconnect) or `is_disconnected()` returning True cancels generation.
+    """
+    from src.evaluation import pad_to_bucket
+
+    loop = asyncio.get_running_loop()
+    streamer = AsyncTextStreamer(tokenizer, loop)
+    cancel = CancelFlag()
+    generate_kwargs.setdefault("do_sample", False)
+    if metrics is not None:
+        metrics.started += 1
+
+    def run() -> None:
+        torch = sys.modules.get("torch") or importlib.import_module("torch")
+        try:
+            if cancel.cancelled:
+                return
+            ids = tokenizer(prompt)["input_ids"]
+            inputs = pad_to_bucket(tokenizer, [ids], length_buckets)
+            inputs = {k: v.to(model.device) for k, v in inputs.items()}
+            with torch.inference_mode():
+                model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    stopping_criteria=_criteria(cancel),
+                    max_new_tokens=max_new_tokens,
+                    **generate_kwargs,
+                )
+        finally:
+            if streamer.end_time is None:
+                streamer.end()
+
+    future = loop.run_in_executor(executor, run)
+    # Cancelled streams never await the future; retrieve its outcome anyway
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    outcome = "cancelled"
+    try:
+        async for text in streamer:
+            yield sse_event("token", {"text": text})
+            if is_disconnected is not None and await is_disconnected():
+                return
+        try:
+            await future
+        except Exception as e:
+            outcome = "failed"
+            yield sse_event("error", {"detail": f"{type(e).__name__}: {e}"})
+            return
+        outcome = "completed"
+        yield sse_event(
+            "done",
+            {
+                "ttft": streamer.ttft,
+                "total_time": time.perf_counter() - streamer.start,
+                "output_tokens": len(streamer.token_ids),
+            },
+        )
+    finally:
+        if outcome != "completed":
+            cancel.cancel()
+        if metrics is not None:
+            metrics.record(outcome, streamer.ttft, time.perf_counter() - streamer.start)
@@ -6,8 +6,20 @@
 import argparse
 
 import torch
-from src.chunking import last_window_for_text
-from src.evaluation import load_model_and_tokenizer, load_peft_model
+from src.assisted import (
+    assisted_generate_kwargs,
+    compare_with_plain,
+    same_vocab,
+    summarize_comparisons,
+)
+from src.chunking import tail_window_for_text
+from src.evaluation import (
+    DEFAULT_LENGTH_BUCKETS,
+    compile_for_inference,
+    pad_to_bucket,
+)
+from src.model_registry import get_registry
+from src.startup import StartupTimeline, warmup
 
 
 def main():
@@ -19,7 +31,15 @@ def main():
         "--peft_model_path", type=str, help="Path to the PEFT model adapter."
     )
     parser.add_argument(
-        "--quantization", action="store_true", help="Enable quantization."
+        "--quantization",
+        nargs="?",
+        const="auto",
+        default=False,
+        choices=["auto", "nf4", "int8-dynamic"],
+        help=(
+            "Quantize weights: nf4 (CUDA + bitsandbytes), int8-dynamic (CPU) "
+            "or auto (bare flag) to pick nf4 when available, else int8-dynamic"
+        ),
     )
     parser.add_argument(
         "--chunking-strategy",
@@ -29,13 +49,130 @@ def main():
     )
     parser.add_argument("--max-input-length", type=int, default=512)
     parser.add_argument("--stride", type=int, default=128)
+    parser.add_argument(
+        "--assistant_model",
+        type=str,
+        default=None,
+        help="Draft model for assisted (speculative) greedy decoding",
+    )
+    parser.add_argument(
+        "--prompt_lookup_num_tokens",
+        type=int,
+        default=None,
+        help="Prompt-lookup (n-gram) assisted decoding with this many draft tokens",
+    )
+    parser.add_argument(
+        "--compare_plain",
+        action="store_true",
+        help="Also run plain greedy decoding and print speedup/acceptance/parity",
+    )
+    parser.add_argument(
+        "--fast_load",
+        action="store_true",
+        help="Load mmap'd safetensors with low_cpu_mem_usage (needs .safetensors)",
+    )
+    parser.add_argument(
+        "--prefetch_weights",
+        action="store_true",
+        help="Read weight shards into the page cache while the tokenizer loads",
+    )
+    parser.add_argument(
+        "--no_merge_cache",
+        action="store_true",
+        help="Always merge the adapter instead of reusing cached merged weights",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="torch.compile with a static KV cache; prompts padded to length buckets",
+    )
+    parser.add_argument(
+        "--compile_cache_dir",
+        type=str,
+        default=None,
+        help="Persistent inductor cache (default: results/compile_cache)",
+    )
+    parser.add_argument(
+        "--no_warmup",
+        action="store_true",
+        help="Skip the one-token warmup generation before the first prompt",
+    )
+    parser.add_argument(
+        "--startup_profile",
+        type=str,
+        default=None,
+        help="Write the startup timeline (per-phase seconds) to this JSON file",
+    )
 
     args = parser.parse_args()
 
-    model, tokenizer = load_model_and_tokenizer(args.base_model_name, args.quantization)
-    if args.peft_model_path:
-        model = load_peft_model(model, args.peft_model_path)
+    timeline = StartupTimeline()
+    registry = get_registry()
+    model, tokenizer = registry.get(
+        args.base_model_name,
+        quantization=args.quantization,
+        peft_model_path=args.peft_model_path,
+        fast_load=args.fast_load,
+        prefetch=args.prefetch_weights,
+        merge_cache=not args.no_merge_cache,
+        timeline=timeline,
+    )
+
+    assisted = {}
+    if args.assistant_model:
+        draft, draft_tokenizer = registry.get(
+            args.assistant_model, quantization=args.quantization
+        )
+        assisted = assisted_generate_kwargs(
+            assistant_model=draft,
+            prompt_lookup_num_tokens=args.prompt_lookup_num_tokens,
+            tokenizer=tokenizer,
+            assistant_tokenizer=(
+                None if same_vocab(tokenizer, draft_tokenizer) else draft_tokenizer
+            ),
+        )
+    elif args.prompt_lookup_num_tokens:
+        assisted = assisted_generate_kwargs(
+            prompt_lookup_num_tokens=args.prompt_lookup_num_tokens
+        )
+    # Assisted decoding is greedy; plain mode keeps the previous sampling args
+    gen_kwargs = (
+        {"max_new_tokens": 100, "do_sample": False}
+        if assisted
+        else {"max_new_tokens": 100, "temperature": 0.7}
+    )
 
+    buckets = None
+    if args.compile:
+        if assisted:
+            parser.error("--compile does not support assisted decoding")
+        buckets = [b for b in DEFAULT_LENGTH_BUCKETS if b < args.max_input_length] + [
+            args.max_input_length
+        ]
+        report = compile_for_inference(
+            model,
+            tokenizer,
+            buckets=buckets,
+            max_new_tokens=gen_kwargs["max_new_tokens"],
+            cache_dir=args.compile_cache_dir,
+            timeline=timeline,
+        )
+        if not report["enabled"]:
+            print(f"torch.compile failed, running eager: {report['error']}")
+            buckets = None
+    # Compilation already generated at every bucket; an unpadded warmup
+    # prompt would only add a graph for a shape never used again
+    if not args.no_warmup and buckets is None:
+        warmup(model, tokenizer, timeline)
+    for entry in registry.report()["entries"]:
+        print(
+            f"Loaded {entry['base_model_name']} in {entry['load_time']:.1f}s "
+            f"({entry['resident_mb']:.0f} MB resident)"
+        )
+    print(timeline.format())
+    if args.startup_profile:
+        timeline.to_json(args.startup_profile)
+        print(f"Startup profile saved to {args.startup_profile}")
     print("Model loaded. Type 'exit' to quit.")
     while True:
         prompt = input("Prompt: ")
@@ -43,7 +180,7 @@ def main():
             break
 
         if args.chunking_strategy == "sliding_window":
-            ids, mask = last_window_for_text(
+            ids, mask = tail_window_for_text(
                 tokenizer,
                 prompt,
                 max_length=args.max_input_length,
@@ -63,10 +200,38 @@ def main():
                 max_length=args.max_input_length,
             )
             inputs = {k: v.to(model.device) for k, v in inputs.items()}
+        if buckets:
+            # Left-pad to a warmed-up width so the compiled graphs are reused.
+            # Only real tokens are re-padded; the sliding-window tokenizer
+            # call may already have right-padded the prompt (mask 0).
+            ids = inputs["input_ids"][0].tolist()
+            mask = inputs["attention_mask"][0].tolist()
+            padded = pad_to_bucket(
+                tokenizer, [[t for t, m in zip(ids, mask) if m]], buckets
+            )
+            inputs = {k: v.to(model.device) for k, v in padded.items()}
         with torch.no_grad():
-            output = model.generate(**inputs, max_new_tokens=100, temperature=0.7)
+            if assisted and args.compare_plain:
+                item = compare_with_plain(
+                    model,
+                    inputs,
+                    generate_kwargs=gen_kwargs,
+                    assisted_kwargs=assisted,
+                    pad_id=tokenizer.pad_token_id,
+                )
+                output = item["output"]
+                stats = summarize_comparisons([item])
+            else:
+                output = model.generate(**inputs, **gen_kwargs, **assisted)
+                stats = None
         response = tokenizer.decode(output[0], skip_special_tokens=True)
         print(f"Response: {response}")
+        if stats is not None:
+            print(
+                f"[assisted] speedup {stats['speedup']:.2f}x, "
+                f"{stats['tokens_per_forward']:.2f} tokens/forward, "
+                f"parity {'ok' if not stats['parity_failures'] else 'MISMATCH'}"
+            )
 
 
 if __name__ == "__main__":
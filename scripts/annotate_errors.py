@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+"""
+Annotate an evaluation or production log with heuristic error types.
+
+Reads a CSV or JSONL file, classifies one response column in a single
+vectorized pass (see `src.eval_schema.classify_errors_batch`), adds an
+`error_type` column and prints per-type counts and rates.
+
+Example:
+  uv run scripts/annotate_errors.py results/eval_billing/results.csv \
+    --column peft_response --output results/eval_billing/annotated.csv
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+from src.eval_schema import classify_errors_batch, load_error_patterns
+
+
+def _read(path: Path) -> pd.DataFrame:
+    sfx = path.suffix.lower()
+    if sfx in {".jsonl", ".ndjson"}:
+        return pd.read_json(path, lines=True)
+    if sfx == ".csv":
+        return pd.read_csv(path)
+    raise SystemExit(f"unsupported input format: {sfx}")
+
+
+def _write(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() in {".jsonl", ".ndjson"}:
+        df.to_json(path, orient="records", lines=True, force_ascii=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Annotate responses with error types")
+    p.add_argument("input", type=Path, help="Results/log file (.csv or .jsonl)")
+    p.add_argument(
+        "--column", default="peft_response", help="Response column to classify"
+    )
+    p.add_argument(
+        "--patterns",
+        type=Path,
+        default=None,
+        help="YAML pattern packs (default: configs/error_patterns.yaml)",
+    )
+    p.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Annotated output (.csv/.jsonl); default: <input>.annotated<suffix>",
+    )
+    p.add_argument(
+        "--stats", type=Path, default=None, help="Write counts/rates JSON here"
+    )
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    df = _read(args.input)
+    if args.column not in df.columns:
+        raise SystemExit(f"column {args.column!r} not in {list(df.columns)}")
+
+    patterns = load_error_patterns(args.patterns)
+    start = time.perf_counter()
+    result = classify_errors_batch(df[args.column].tolist(), patterns)
+    elapsed = time.perf_counter() - start
+    df["error_type"] = result.labels.to_numpy()
+
+    output = args.output or args.input.with_name(
+        f"{args.input.stem}.annotated{args.input.suffix}"
+    )
+    _write(df, output)
+
+    n = len(df)
+    stats = {
+        "rows": n,
+        "counts": result.counts,
+        "rates": {k: (v / n if n else 0.0) for k, v in result.counts.items()},
+        "seconds": elapsed,
+    }
+    print(f"[annotate_errors] Classified {n} rows in {elapsed:.2f}s")
+    for k, v in result.counts.items():
+        print(f"[annotate_errors] {k}: {v} ({stats['rates'][k]:.1%})")
+    print(f"[annotate_errors] Annotated file saved to {output}")
+    if args.stats is not None:
+        args.stats.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        print(f"[annotate_errors] Stats saved to {args.stats}")
+
+
+if __name__ == "__main__":
+    main()
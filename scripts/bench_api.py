@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Throughput/latency benchmark for the API micro-batching scheduler.
+
+Fires `--requests` prompts at each `--concurrency` level and reports
+requests/s plus latency percentiles. Two targets:
+
+- in-process (default): loads the model and drives `api.batching.MicroBatcher`
+  directly, once per `--max_batch_sizes` value (1 = unbatched baseline);
+- `--url`: a running server's POST /generate, one prompt per request.
+
+Example:
+  uv run scripts/bench_api.py --base_model_name <model> \\
+    --evaluation_suite <suites dir> --concurrency 1 4 16 32 --max_batch_sizes 1 8
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from api.batching import MicroBatcher, make_generate_batch, token_counter
+from scripts.eval import _item_prompt, _resolve_suites
+from src.latency import latency_summary
+
+
+async def _drive(
+    send: Callable[[str], Awaitable[str]], prompts: List[str], concurrency: int
+) -> Dict[str, object]:
+    """Send every prompt with at most `concurrency` in flight."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(prompt: str) -> None:
+        async with sem:
+            start = time.perf_counter()
+            await send(prompt)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in prompts))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(prompts),
+        "wall_time": wall,
+        "requests_per_sec": len(prompts) / wall if wall else 0.0,
+        "latency": latency_summary(latencies),
+    }
+
+
+async def _bench_in_process(args, prompts: List[str]) -> List[Dict[str, object]]:
+    from src.model_registry import get_registry
+
+    model, tokenizer = get_registry().get(
+        args.base_model_name,
+        quantization=args.quantization,
+        peft_model_path=args.peft_model_path,
+    )
+    results = []
+    for max_batch_size in args.max_batch_sizes:
+        generate_batch = make_generate_batch(
+            model,
+            tokenizer,
+            max_batch_size=max_batch_size,
+            max_new_tokens=args.max_new_tokens,
+        )
+        generate_batch(prompts[:1])  # warmup outside the timed runs
+        for concurrency in args.concurrency:
+            batcher = MicroBatcher(
+                generate_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=args.max_wait_ms,
+                max_batch_tokens=args.max_batch_tokens,
+                max_new_tokens=args.max_new_tokens,
+                count_tokens=token_counter(tokenizer),
+            )
+            await batcher.start()
+            entry = await _drive(batcher.submit, prompts, concurrency)
+            stats = batcher.stats()
+            await batcher.stop()
+            entry.update(
+                max_batch_size=max_batch_size,
+                mean_batch_size=stats["mean_batch_size"],
+                queue_wait=stats["queue_wait"],
+            )
+            results.append(entry)
+            _print(entry)
+    return results
+
+
+async def _bench_url(args, prompts: List[str]) -> List[Dict[str, object]]:
+    url = args.url.rstrip("/") + "/generate"
+    # Blocking urllib calls run on a pool sized to the highest concurrency
+    pool = ThreadPoolExecutor(max_workers=max(args.concurrency))
+    loop = asyncio.get_running_loop()
+
+    def post(prompt: str) -> str:
+        req = urllib.request.Request(
+            url,
+            data=json.dumps({"prompt": prompt}).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-API-Key": args.api_key},
+        )
+        with urllib.request.urlopen(req, timeout=args.timeout) as resp:
+            return json.loads(resp.read())["generated_text"]
+
+    async def send(prompt: str) -> str:
+        return await loop.run_in_executor(pool, post, prompt)
+
+    results = []
+    for concurrency in args.concurrency:
+        entry = await _drive(send, prompts, concurrency)
+        results.append(entry)
+        _print(entry)
+    pool.shutdown()
+    return results
+
+
+def _print(entry: Dict[str, object]) -> None:
+    lat = entry["latency"]
+    mbs = entry.get("max_batch_size")
+    label = f"batch<={mbs} " if mbs is not None else ""
+    print(
+        f"[bench_api] {label}concurrency {entry['concurrency']:>3}: "
+        f"{entry['requests_per_sec']:.2f} req/s, p50 {lat.get('p50', 0):.3f}s, "
+        f"p90 {lat.get('p90', 0):.3f}s, p99 {lat.get('p99', 0):.3f}s"
+        + (
+            f", mean batch {entry['mean_batch_size']:.1f}"
+            if "mean_batch_size" in entry
+            else ""
+        )
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Benchmark API micro-batching")
+    p.add_argument(
+        "--evaluation_suite",
+        nargs="+",
+        required=True,
+        help="Suite .jsonl files and/or directories; prompts are cycled",
+    )
+    p.add_argument("--requests", type=int, default=64, help="Requests per level")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    p.add_argument("--url", default=None, help="Benchmark a running server instead")
+    p.add_argument("--api_key", default="devkey")
+    p.add_argument("--timeout", type=float, default=600.0)
+    p.add_argument("--base_model_name", default=None)
+    p.add_argument("--peft_model_path", default=None)
+    p.add_argument(
+        "--quantization",
+        nargs="?",
+        const="auto",
+        default=False,
+        choices=["auto", "nf4", "int8-dynamic"],
+    )
+    p.add_argument(
+        "--max_batch_sizes",
+        type=int,
+        nargs="+",
+        default=[1, 8],
+        help="In-process scheduler batch limits to compare (1 = unbatched)",
+    )
+    p.add_argument("--max_wait_ms", type=float, default=10.0)
+    p.add_argument("--max_batch_tokens", type=int, default=4096)
+    p.add_argument("--max_new_tokens", type=int, default=64)
+    p.add_argument(
+        "--output",
+        type=Path,
+        default=Path("results/api_bench.json"),
+        help="Where to write the JSON report",
+    )
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if args.url is None and not args.base_model_name:
+        raise SystemExit("Pass --base_model_name (in-process) or --url")
+    suite_prompts = []
+    for _, path in _resolve_suites(args.evaluation_suite):
+        with open(path, "r") as f:
+            suite_prompts.extend(
+                _item_prompt(json.loads(line)) for line in f if line.strip()
+            )
+    if not suite_prompts:
+        raise SystemExit("No prompts found in the evaluation suites")
+    prompts = [suite_prompts[i % len(suite_prompts)] for i in range(args.requests)]
+
+    bench = _bench_url if args.url else _bench_in_process
+    results = asyncio.run(bench(args, prompts))
+    report = {"target": args.url or "in-process", "results": results}
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench_api] Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Benchmark quantization backends on the eval suites.
+
+Loads the model once per variant (fp32, bf16, int8-dynamic and, with CUDA
+and bitsandbytes, nf4), generates greedily over the same prompts and
+reports latency percentiles, throughput, model size and output drift
+against the first variant.
+
+Example:
+  uv run scripts/bench_quantization.py --base_model_name <model> \\
+    --peft_model_path <adapter> --evaluation_suite <suites dir> --limit 64
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import time
+from pathlib import Path
+
+import torch
+from scripts.eval import _item_prompt, _resolve_suites
+from src.evaluation import (
+    load_model_and_tokenizer,
+    load_peft_model,
+    quantize_after_adapter,
+)
+from src.generation import BatchedGenerator
+from src.quantization import output_drift
+
+VARIANTS = {
+    # name: (dtype, quantization)
+    "fp32": ("float32", False),
+    "bf16": ("bfloat16", False),
+    "int8-dynamic": ("float32", "int8-dynamic"),
+    "nf4": ("bfloat16", "nf4"),
+}
+
+
+def _rss_mb() -> float:
+    """Current resident set size (Linux), or 0.0 where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _state_dict_mb(model) -> float:
+    # Serialized size counts int8 packed weights, which parameters() misses
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell() / (1024 * 1024)
+
+
+def _load(args, variant: str):
+    dtype, quantization = VARIANTS[variant]
+    model, tokenizer = load_model_and_tokenizer(
+        args.base_model_name,
+        quantization,
+        dtype=dtype,
+        defer_quantization=bool(args.peft_model_path),
+    )
+    if args.peft_model_path:
+        model = load_peft_model(model, args.peft_model_path, merge=True)
+        model = quantize_after_adapter(model, quantization)
+    return model.eval(), tokenizer
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Compare quantization backends")
+    p.add_argument("--base_model_name", required=True)
+    p.add_argument("--peft_model_path", default=None)
+    p.add_argument(
+        "--evaluation_suite",
+        nargs="+",
+        required=True,
+        help="Suite .jsonl files and/or directories of them",
+    )
+    p.add_argument("--limit", type=int, default=64, help="Prompts to benchmark")
+    p.add_argument("--batch_size", type=int, default=8)
+    p.add_argument("--max_new_tokens", type=int, default=64)
+    p.add_argument(
+        "--variants",
+        nargs="+",
+        default=["fp32", "bf16", "int8-dynamic"],
+        choices=list(VARIANTS),
+        help="Backends to compare; drift is measured against the first",
+    )
+    p.add_argument(
+        "--output",
+        type=Path,
+        default=Path("results/quantization_bench.json"),
+        help="Where to write the JSON report",
+    )
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    prompts = []
+    for _, path in _resolve_suites(args.evaluation_suite):
+        with open(path, "r") as f:
+            prompts.extend(_item_prompt(json.loads(line)) for line in f if line.strip())
+    prompts = prompts[: args.limit]
+    print(f"[bench_quantization] {len(prompts)} prompts, variants: {args.variants}")
+
+    report = {"prompts": len(prompts), "variants": {}}
+    reference = None
+    for variant in args.variants:
+        gc.collect()
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        model, tokenizer = _load(args, variant)
+        load_time = time.perf_counter() - start
+
+        engine = BatchedGenerator(
+            tokenizer,
+            batch_size=args.batch_size,
+            max_new_tokens=args.max_new_tokens,
+            do_sample=False,
+        )
+        run = engine.run(prompts, {variant: model}, seed=0)
+        responses = [row[f"{variant}_response"] for row in run.rows]
+        if reference is None:
+            reference = responses
+
+        entry = {
+            "load_time": load_time,
+            "rss_delta_mb": _rss_mb() - rss_before,
+            "state_dict_mb": _state_dict_mb(model),
+            "items_per_sec": run.summary[variant]["items_per_sec"],
+            "wall_time": run.summary[variant]["wall_time"],
+            "latency": run.summary["latency"][variant],
+            "drift": output_drift(reference, responses),
+        }
+        report["variants"][variant] = entry
+        lat = entry["latency"]["latency"]
+        print(
+            f"[bench_quantization] {variant:<13} p50 {lat['p50']:.3f}s "
+            f"p90 {lat['p90']:.3f}s  {entry['items_per_sec']:.2f} items/s  "
+            f"{entry['state_dict_mb']:.0f} MB  "
+            f"exact {entry['drift']['exact_match']:.1%}  "
+            f"sim {entry['drift']['similarity']:.3f}"
+        )
+        del model, tokenizer, engine, run
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench_quantization] Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
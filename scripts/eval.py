@@ -5,15 +5,364 @@
 
 import argparse
 import json
-import time
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import pandas as pd
-from src.eval_schema import ErrorType, classify_error
-from src.evaluation import load_model_and_tokenizer, load_peft_model
+from src.assisted import (
+    assisted_generate_kwargs,
+    compare_with_plain,
+    same_vocab,
+    summarize_comparisons,
+)
+from src.eval_schema import classify_errors_batch, load_error_patterns
+from src.evaluation import (
+    DEFAULT_LENGTH_BUCKETS,
+    adapter_fingerprint,
+    batch_size_buckets,
+    compile_for_inference,
+    quantization_backend,
+)
+from src.generation import BatchedGenerator, Variant, adapter_variants
+from src.generation_cache import GenerationCache, model_fingerprint
+from src.latency import latency_stats
+from src.model_registry import get_registry
+from src.parallel_eval import run_sharded, update_scaling_report
+from src.results_store import (
+    RESULTS_FILENAME,
+    ResultsWriter,
+    completed_ids,
+    read_results,
+    row_id,
+)
+from src.sampling import padding_stats, token_lengths
+from src.tokenization import _ensure_tokenizer
 from tqdm import tqdm
 
 
+def _item_prompt(item: dict) -> str:
+    # Support either flat {prompt: ...} or schema-like {inputs:{question,context?}}
+    if "prompt" in item:
+        return item["prompt"]
+    inputs = item.get("inputs", {})
+    return inputs.get("question") or inputs.get("prompt") or ""
+
+
+def _resolve_suites(paths: List[str]) -> List[Tuple[str, Path]]:
+    """Expand suite files/directories to (suite name, path) pairs."""
+    suites: List[Tuple[str, Path]] = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            found = sorted(path.glob("*.jsonl"))
+            if not found:
+                raise SystemExit(f"No *.jsonl suites under {path}")
+            suites.extend((f.stem, f) for f in found)
+        elif path.exists():
+            suites.append((path.stem, path))
+        else:
+            raise SystemExit(f"Evaluation suite not found: {path}")
+    names = [name for name, _ in suites]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise SystemExit(f"Duplicate suite names: {', '.join(dupes)}")
+    return suites
+
+
+def _write_outputs(
+    results: List[dict],
+    output_dir: Path,
+    *,
+    model_names: List[str],
+    batch_size: int,
+    has_peft: bool,
+    annotate_errors: bool,
+    label: Optional[str] = None,
+) -> None:
+    """Write results.csv, latency_stats.json and error_stats.json for `results`."""
+    prefix = f"[{label}] " if label else ""
+    latency = latency_stats(results, model_names)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / "results.csv"
+    df = pd.DataFrame(results)
+    df.to_csv(output_path, index=False)
+    print(f"{prefix}Results saved to {output_path}")
+
+    latency_path = output_dir / "latency_stats.json"
+    with open(latency_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "items": len(results),
+                "batch_size": batch_size,
+                "models": latency,
+            },
+            f,
+            indent=2,
+        )
+    for name, stats in latency.items():
+        ttft = stats["ttft"]
+        tps = stats["decode_tps"]
+        if ttft.get("count"):
+            print(
+                f"{prefix}[{name}] TTFT p50/p90/p99: {ttft['p50']:.3f}/{ttft['p90']:.3f}/"
+                f"{ttft['p99']:.3f}s, decode tokens/s p50: {tps.get('p50', 0):.1f}"
+            )
+    print(f"{prefix}Latency stats saved to {latency_path}")
+
+    # Calculate and print metrics
+    if has_peft:
+        if "winner" not in df.columns:
+            print(
+                "Winner column not found. Please add a 'winner' column with values 'base', 'peft', or 'tie'."
+            )
+        else:
+            win_rate = df["winner"].value_counts(normalize=True)
+            print(f"\n{prefix}Win Rate:")
+            print(win_rate)
+
+        if (
+            "base_hallucination" not in df.columns
+            or "peft_hallucination" not in df.columns
+        ):
+            print(
+                "Hallucination columns not found. Please add 'base_hallucination' and 'peft_hallucination' columns with boolean values."
+            )
+        else:
+            base_hallucination_rate = df["base_hallucination"].mean()
+            peft_hallucination_rate = df["peft_hallucination"].mean()
+
+            print(f"\n{prefix}Hallucination Rate:")
+            print(f"Base model: {base_hallucination_rate:.2%}")
+            print(f"PEFT model: {peft_hallucination_rate:.2%}")
+
+    # Error aggregates
+    if annotate_errors and "error_type" in df.columns:
+        agg = df["error_type"].value_counts(dropna=True, normalize=True).to_dict()
+        stats_path = output_dir / "error_stats.json"
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump({"rates": agg}, f, indent=2)
+        print(f"{prefix}Error stats saved to {stats_path}")
+
+
+def _run_in_process(args, prompts: List[str], on_batch, output_dir: Path) -> None:
+    """Load one model in this process and generate `prompts` in batches."""
+    # Attach the adapter unmerged: base generations run with the adapter
+    # disabled, so both columns come from one copy of the weights
+    registry = get_registry()
+    base_model, tokenizer = registry.get(
+        args.base_model_name,
+        quantization=args.quantization,
+        peft_model_path=args.peft_model_path,
+        merge=False,
+    )
+    models = {"base": base_model}
+    if args.peft_model_path:
+        models = adapter_variants(base_model)
+
+    # Run evaluation through the batched engine: prompts are tokenized once
+    # and grouped into length-sorted, left-padded micro-batches
+    generate_kwargs = {
+        "max_new_tokens": args.max_new_tokens,
+        "temperature": args.temperature,
+    }
+    assisted = _assisted_kwargs(args, tokenizer)
+    batch_size = args.batch_size
+    if assisted:
+        # Assisted decoding is greedy and runs one prompt per generate call
+        generate_kwargs = {"max_new_tokens": args.max_new_tokens, "do_sample": False}
+        if batch_size != 1:
+            print("Assisted decoding supports batch size 1; using --batch_size 1")
+            batch_size = 1
+    length_buckets = None
+    batch_buckets = None
+    if args.compile:
+        report = compile_for_inference(
+            base_model,
+            tokenizer,
+            buckets=args.compile_buckets,
+            batch_sizes=batch_size_buckets(batch_size),
+            max_new_tokens=args.max_new_tokens,
+            cache_dir=args.compile_cache_dir,
+        )
+        if report["enabled"]:
+            length_buckets = report["buckets"]
+            batch_buckets = report["batch_sizes"]
+            print(
+                f"Compiled with static KV cache in {report['warmup_seconds']:.1f}s "
+                f"(buckets {report['buckets']}, cache {report['cache_dir']})"
+            )
+        else:
+            print(f"torch.compile failed, running eager: {report['error']}")
+    engine = BatchedGenerator(
+        tokenizer,
+        batch_size=batch_size,
+        length_buckets=length_buckets,
+        batch_buckets=batch_buckets,
+        **generate_kwargs,
+        **assisted,
+    )
+
+    # Only cache misses are generated; the cache key covers weights (base
+    # revision + adapter content hash), prompt, decoding params and seed
+    cache = None
+    fingerprints = None
+    if not args.no_cache:
+        cache = GenerationCache(args.cache_dir)
+        base_fp = model_fingerprint(
+            args.base_model_name, base_model, quantization=args.quantization
+        )
+        fingerprints = {"base": base_fp}
+        if args.peft_model_path:
+            fingerprints["peft"] = model_fingerprint(
+                args.base_model_name,
+                base_model,
+                quantization=args.quantization,
+                adapter_fingerprint=adapter_fingerprint(args.peft_model_path),
+            )
+
+    plan = engine.plan(prompts)
+    if batch_size > 1:
+        in_order = [
+            list(range(i, min(i + batch_size, len(prompts))))
+            for i in range(0, len(prompts), batch_size)
+        ]
+        before = padding_stats(plan.lengths, in_order)["pad_fraction"]
+        after = padding_stats(plan.lengths, plan.batches)["pad_fraction"]
+        print(f"Prompt padding overhead: {before:.1%} (suite order) -> {after:.1%}")
+
+    run = engine.run(
+        prompts,
+        models,
+        plan=plan,
+        progress=tqdm,
+        cache=cache,
+        fingerprints=fingerprints,
+        seed=args.seed,
+        on_batch=on_batch,
+    )
+    for name in models:
+        stats = run.summary[name]
+        print(
+            f"[{name}] {stats['generated']} prompts generated in "
+            f"{stats['wall_time']:.1f}s ({stats['items_per_sec']:.2f} "
+            f"prompts/s, {run.summary['batches']} batches)"
+        )
+    if cache is not None:
+        report = run.summary["cache"]
+        print(
+            f"Generation cache: {report['hits']} hits, "
+            f"{report['misses']} misses ({report['hit_rate']:.1%}) "
+            f"at {report['path']}"
+        )
+        cache.close()
+
+    if assisted and args.assisted_compare > 0:
+        _compare_assisted(
+            args, models, tokenizer, prompts, generate_kwargs, assisted, output_dir
+        )
+
+
+def _assisted_kwargs(args, tokenizer) -> dict:
+    """generate kwargs for --assistant_model / --prompt_lookup_num_tokens."""
+    if not args.assistant_model:
+        return assisted_generate_kwargs(
+            prompt_lookup_num_tokens=args.prompt_lookup_num_tokens
+        )
+    draft, draft_tokenizer = get_registry().get(
+        args.assistant_model, quantization=args.quantization
+    )
+    return assisted_generate_kwargs(
+        assistant_model=draft,
+        prompt_lookup_num_tokens=args.prompt_lookup_num_tokens,
+        tokenizer=tokenizer,
+        assistant_tokenizer=(
+            None if same_vocab(tokenizer, draft_tokenizer) else draft_tokenizer
+        ),
+    )
+
+
+def _compare_assisted(
+    args, models, tokenizer, prompts, generate_kwargs, assisted, output_dir
+) -> None:
+    """Greedy plain vs assisted on a prompt sample: speedup, acceptance, parity."""
+    import torch
+
+    sample = prompts[: args.assisted_compare]
+    report = {"mode": "draft_model" if args.assistant_model else "prompt_lookup"}
+    for name, variant in models.items():
+        variant = variant if isinstance(variant, Variant) else Variant(variant)
+        items = []
+        for prompt in sample:
+            inputs = tokenizer(prompt, return_tensors="pt").to(variant.model.device)
+            with torch.inference_mode(), variant.context():
+                items.append(
+                    compare_with_plain(
+                        variant.model,
+                        dict(inputs),
+                        generate_kwargs=generate_kwargs,
+                        assisted_kwargs=assisted,
+                        pad_id=tokenizer.pad_token_id,
+                    )
+                )
+        report[name] = summarize_comparisons(items)
+        stats = report[name]
+        print(
+            f"[{name}] assisted vs plain on {stats['compared']} prompts: "
+            f"speedup {stats['speedup']:.2f}x, accepted {stats['accepted_fraction']:.1%} "
+            f"of tokens, parity failures {stats['parity_failures']}"
+        )
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / "assisted_stats.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Assisted decoding stats saved to {path}")
+
+
+def _run_workers(args, prompts: List[str], on_batch, output_dir: Path) -> None:
+    """Shard `prompts` over pinned worker processes, one replica each."""
+    lengths = token_lengths(_ensure_tokenizer(args.base_model_name), prompts)
+    job = {
+        "base_model_name": args.base_model_name,
+        "quantization": args.quantization,
+        "peft_model_path": args.peft_model_path,
+        "batch_size": args.batch_size,
+        "generate_kwargs": {
+            "max_new_tokens": args.max_new_tokens,
+            "temperature": args.temperature,
+        },
+        "cache_dir": None if args.no_cache else args.cache_dir,
+        "seed": args.seed,
+        "compile": (
+            {"buckets": args.compile_buckets, "cache_dir": args.compile_cache_dir}
+            if args.compile
+            else None
+        ),
+    }
+    with tqdm(total=len(prompts)) as bar:
+        report = run_sharded(
+            prompts,
+            lengths,
+            num_workers=args.num_workers,
+            job=job,
+            on_batch=on_batch,
+            progress=bar.update,
+        )
+    print(
+        f"[workers] {args.num_workers} workers x {report['threads_per_worker']} "
+        f"threads: {report['items']} prompts in {report['wall_time']:.1f}s "
+        f"({report['items_per_sec']:.2f} prompts/s)"
+    )
+    scaling_path = output_dir / "worker_scaling.json"
+    scaling = update_scaling_report(scaling_path, report)
+    for entry in scaling["scaling"]:
+        print(
+            f"[workers] n={entry['num_workers']}: {entry['items_per_sec']:.2f} "
+            f"prompts/s, speedup {entry['speedup']:.2f}x, "
+            f"efficiency {entry['efficiency']:.0%}"
+        )
+    print(f"Worker scaling report saved to {scaling_path}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Evaluate base and fine-tuned models.")
     parser.add_argument(
@@ -25,8 +374,9 @@ def main():
     parser.add_argument(
         "--evaluation_suite",
         type=str,
+        nargs="+",
         required=True,
-        help="Path to the evaluation suite (JSONL file).",
+        help="Evaluation suite JSONL file(s) or directories of *.jsonl suites.",
     )
     parser.add_argument(
         "--output_dir",
@@ -44,114 +394,194 @@ def main():
         "--temperature", type=float, default=0.7, help="Temperature for generation."
     )
     parser.add_argument(
-        "--quantization", action="store_true", help="Enable quantization."
+        "--quantization",
+        nargs="?",
+        const="auto",
+        default=False,
+        choices=["auto", "nf4", "int8-dynamic"],
+        help=(
+            "Quantize weights: nf4 (CUDA + bitsandbytes), int8-dynamic (CPU) "
+            "or auto (bare flag) to pick nf4 when available, else int8-dynamic"
+        ),
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=8,
+        help="Prompts per generate call; batches group prompts of similar length.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default="results/eval_cache",
+        help="Directory of the persistent generation cache (SQLite).",
+    )
+    parser.add_argument(
+        "--no_cache", action="store_true", help="Always regenerate every prompt."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed set before each generate call; part of the cache key.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=0,
+        help=(
+            "Spawn N pinned worker processes, each with a model replica "
+            "(CPU hosts); 0 runs in this process."
+        ),
+    )
+    parser.add_argument(
+        "--assistant_model",
+        type=str,
+        default=None,
+        help="Draft model for assisted (speculative) greedy decoding.",
+    )
+    parser.add_argument(
+        "--prompt_lookup_num_tokens",
+        type=int,
+        default=None,
+        help="Prompt-lookup (n-gram) assisted decoding with this many draft tokens.",
+    )
+    parser.add_argument(
+        "--assisted_compare",
+        type=int,
+        default=8,
+        help="Prompts re-run with plain greedy decoding to report speedup/parity.",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="torch.compile the model with a static KV cache and bucketed shapes",
+    )
+    parser.add_argument(
+        "--compile_buckets",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_LENGTH_BUCKETS),
+        help="Prompt widths (tokens) that batches are left-padded to under --compile",
+    )
+    parser.add_argument(
+        "--compile_cache_dir",
+        type=str,
+        default=None,
+        help="Persistent inductor cache (default: results/compile_cache)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to an existing results.jsonl and skip completed item ids.",
     )
     parser.add_argument(
         "--annotate_errors",
         action="store_true",
         help="Annotate responses with heuristic error types",
     )
-    args = parser.parse_args()
-
-    # Load base model and tokenizer
-    base_model, tokenizer = load_model_and_tokenizer(
-        args.base_model_name, args.quantization
+    parser.add_argument(
+        "--error_patterns",
+        type=str,
+        default=None,
+        help="YAML refusal/style pattern packs (default: configs/error_patterns.yaml)",
     )
+    args = parser.parse_args()
+    # Resolve "auto" once so registry keys, cache fingerprints and workers
+    # all see the backend actually used on this host
+    args.quantization = quantization_backend(args.quantization) or False
+    if args.quantization:
+        print(f"[eval] Quantization backend: {args.quantization}")
 
-    # Load PEFT model if adapter path is provided
-    peft_model = None
-    if args.peft_model_path:
-        peft_model = load_peft_model(base_model, args.peft_model_path)
-
-    # Load evaluation suite
-    with open(args.evaluation_suite, "r") as f:
-        evaluation_suite = [json.loads(line) for line in f]
-
-    # Run evaluation
-    results = []
-    for item in tqdm(evaluation_suite):
-        # Support either flat {prompt: ...} or schema-like {inputs:{question,context?}}
-        if "prompt" in item:
-            prompt = item["prompt"]
-        else:
-            inputs = item.get("inputs", {})
-            prompt = inputs.get("question") or inputs.get("prompt") or ""
-        inputs = tokenizer(prompt, return_tensors="pt").to(base_model.device)
-
-        # Generate from base model
-        start_time = time.time()
-        base_output = base_model.generate(
-            **inputs, max_new_tokens=args.max_new_tokens, temperature=args.temperature
+    # Load every suite; batches are planned over the union so suites share
+    # (and fill) micro-batches, and each row remembers its suite and id
+    suites = _resolve_suites(args.evaluation_suite)
+    evaluation_suite = []
+    item_keys = []
+    for suite_name, path in suites:
+        with open(path, "r") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        print(f"Loaded {len(items)} items from {path}")
+        evaluation_suite.extend(items)
+        item_keys.extend(
+            (suite_name, str(it.get("id", n))) for n, it in enumerate(items)
         )
-        base_latency = time.time() - start_time
-        base_response = tokenizer.decode(base_output[0], skip_special_tokens=True)
-
-        # Generate from PEFT model
-        peft_response = None
-        peft_latency = None
-        if peft_model:
-            start_time = time.time()
-            peft_output = peft_model.generate(
-                **inputs,
-                max_new_tokens=args.max_new_tokens,
-                temperature=args.temperature,
-            )
-            peft_latency = time.time() - start_time
-            peft_response = tokenizer.decode(peft_output[0], skip_special_tokens=True)
-
-        rec = {
-            "prompt": prompt,
-            "base_response": base_response,
-            "base_latency": base_latency,
-            "peft_response": peft_response,
-            "peft_latency": peft_latency,
-        }
-        if args.annotate_errors and peft_response is not None:
-            etype = classify_error(prompt, peft_response)
-            rec["error_type"] = etype.value if isinstance(etype, ErrorType) else None
-        results.append(rec)
-
-    # Save results
+
+    # Results are appended to results.jsonl as each batch finishes; --resume
+    # skips items already stored there
     output_dir = Path(args.output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / "results.csv"
-    df = pd.DataFrame(results)
-    df.to_csv(output_path, index=False)
-    print(f"Results saved to {output_path}")
+    results_path = output_dir / RESULTS_FILENAME
+    done = completed_ids(results_path) if args.resume else set()
+    pending = [n for n, key in enumerate(item_keys) if key not in done]
+    if done:
+        print(
+            f"Resuming: {len(item_keys) - len(pending)} of {len(item_keys)} items "
+            f"already in {results_path}"
+        )
 
-    # Calculate and print metrics
-    if args.peft_model_path:
-        if "winner" not in df.columns:
-            print(
-                "Winner column not found. Please add a 'winner' column with values 'base', 'peft', or 'tie'."
-            )
-        else:
-            win_rate = df["winner"].value_counts(normalize=True)
-            print("\nWin Rate:")
-            print(win_rate)
+    prompts = [_item_prompt(evaluation_suite[n]) for n in pending]
 
-        if (
-            "base_hallucination" not in df.columns
-            or "peft_hallucination" not in df.columns
-        ):
-            print(
-                "Hallucination columns not found. Please add 'base_hallucination' and 'peft_hallucination' columns with boolean values."
-            )
-        else:
-            base_hallucination_rate = df["base_hallucination"].mean()
-            peft_hallucination_rate = df["peft_hallucination"].mean()
+    def _store(indices, rows):
+        stored = []
+        for i, rec in zip(indices, rows):
+            suite_name, item_id = item_keys[pending[i]]
+            rec = {"suite": suite_name, "id": item_id, **rec}
+            rec.setdefault("peft_response", None)
+            rec.setdefault("peft_latency", None)
+            stored.append(rec)
+        writer.write(stored)
 
-            print("\nHallucination Rate:")
-            print(f"Base model: {base_hallucination_rate:.2%}")
-            print(f"PEFT model: {peft_hallucination_rate:.2%}")
+    if args.num_workers > 0 and (args.assistant_model or args.prompt_lookup_num_tokens):
+        raise SystemExit("Assisted decoding is not supported with --num_workers")
+    if args.compile and (args.assistant_model or args.prompt_lookup_num_tokens):
+        raise SystemExit(
+            "--compile (static KV cache) does not support assisted decoding"
+        )
+    model_names = ["base", "peft"] if args.peft_model_path else ["base"]
+    with ResultsWriter(results_path, resume=args.resume) as writer:
+        if prompts and args.num_workers > 0:
+            _run_workers(args, prompts, _store, output_dir)
+        elif prompts:
+            _run_in_process(args, prompts, _store, output_dir)
+    print(f"Streamed results saved to {results_path}")
 
-    # Error aggregates
-    if args.annotate_errors and "error_type" in df.columns:
-        agg = df["error_type"].value_counts(dropna=True, normalize=True).to_dict()
-        stats_path = output_dir / "error_stats.json"
-        with open(stats_path, "w", encoding="utf-8") as f:
-            json.dump({"rates": agg}, f, indent=2)
-        print(f"Error stats saved to {stats_path}")
+    # Summaries are computed from the stored file, in suite order
+    order = {key: n for n, key in enumerate(item_keys)}
+    results = sorted(
+        (r for r in read_results(results_path) if row_id(r) in order),
+        key=lambda r: order[row_id(r)],
+    )
+
+    # Error types for the whole result set in one vectorized pass
+    if args.annotate_errors:
+        patterns = load_error_patterns(args.error_patterns)
+        annotated = [r for r in results if r.get("peft_response") is not None]
+        labels = classify_errors_batch(
+            [r["peft_response"] for r in annotated], patterns
+        ).labels
+        for rec, label in zip(annotated, labels):
+            rec["error_type"] = label
+
+    # Save combined results, then one directory per suite
+    _write_outputs(
+        results,
+        output_dir,
+        model_names=model_names,
+        batch_size=args.batch_size,
+        has_peft=bool(args.peft_model_path),
+        annotate_errors=args.annotate_errors,
+    )
+    if len(suites) > 1:
+        for suite_name, _ in suites:
+            _write_outputs(
+                [r for r in results if r["suite"] == suite_name],
+                output_dir / suite_name,
+                model_names=model_names,
+                batch_size=args.batch_size,
+                has_peft=bool(args.peft_model_path),
+                annotate_errors=args.annotate_errors,
+                label=suite_name,
+            )
 
 
 if __name__ == "__main__":
@@ -8,11 +8,17 @@ Pipeline:
 2) Validate dataset (schema + simple PII + tag vocab optional)
 3) Deterministic split into train/val/test
 4) Tokenize each split with an HF tokenizer
-5) Write outputs under the specified output directory
+5) Build training-ready SFT examples (prompt tokens masked in labels)
+6) Write outputs under the specified output directory
 
 Outputs:
 - <out_dir>/splits/{train,val,test}.jsonl          # raw DataRecord JSONL
 - <out_dir>/tokenized/{train,val,test}.jsonl       # token ids per split
+- <out_dir>/sft/{train,val,test}/                  # Arrow input_ids/labels/length
+- <out_dir>/sft/meta.json                          # tokenizer id + max_length
+
+The Arrow splits are memory-mapped by `train_lora.py --tokenized-dir`, so
+training skips re-tokenization.
 """
 
 import argparse
@@ -27,7 +33,12 @@ from src.parsers import (
     load_jsonl_records,
 )
 from src.split import split_records
-from src.tokenization import tokenize_pairs
+from src.tokenization import (
+    IGNORE_INDEX,
+    _ensure_tokenizer,
+    tokenize_pairs,
+    tokenize_sft_examples,
+)
 
 
 def _load_any(path: Path) -> List[DataRecord]:
@@ -51,7 +62,7 @@ def _dump_jsonl_records(records: Sequence[DataRecord], out_path: Path) -> None:
 
 def _dump_tokenized(
     records: Sequence[DataRecord],
-    model_id: str,
+    tokenizer,
     out_path: Path,
     *,
     max_length: int,
@@ -60,7 +71,7 @@ def _dump_tokenized(
 ) -> None:
     toks = tokenize_pairs(
         list(records),
-        model_id,
+        tokenizer,
         max_length=max_length,
         padding=padding,
         truncation=truncation,
@@ -79,6 +90,35 @@ def _dump_tokenized(
             f.write("\n")
 
 
+def _dump_sft_dataset(
+    records: Sequence[DataRecord],
+    tokenizer,
+    out_dir: Path,
+    *,
+    max_length: int,
+) -> int:
+    """Write unpadded input_ids/labels (+ length) as an Arrow dataset.
+
+    Rows with no supervised label (every label IGNORE_INDEX) are left out;
+    returns how many were dropped.
+    """
+    from datasets import Dataset  # lazy import; heavy dependency
+
+    ex = tokenize_sft_examples(list(records), tokenizer, max_length=max_length)
+    keep = [i for i, lab in enumerate(ex.labels) if any(t != IGNORE_INDEX for t in lab)]
+    ds = Dataset.from_dict(
+        {
+            "id": [records[i].id for i in keep],
+            "input_ids": [ex.input_ids[i] for i in keep],
+            "labels": [ex.labels[i] for i in keep],
+            "length": [len(ex.input_ids[i]) for i in keep],
+        }
+    )
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    ds.save_to_disk(str(out_dir))
+    return len(ex.labels) - len(keep)
+
+
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(
         description="Orchestrate data ingestion, validation, split, and tokenization"
@@ -135,6 +175,11 @@ def parse_args() -> argparse.Namespace:
         choices=["True", "False", "longest_first", "only_first", "only_second"],
         help="Truncation strategy per HF tokenizers",
     )
+    p.add_argument(
+        "--no-sft-dataset",
+        action="store_true",
+        help="Skip writing the pre-tokenized SFT Arrow splits under <out_dir>/sft",
+    )
 
     return p.parse_args()
 
@@ -181,6 +226,7 @@ def main() -> None:
     out_dir = args.output_dir
     raw_dir = out_dir / "splits"
     tok_dir = out_dir / "tokenized"
+    sft_dir = out_dir / "sft"
 
     print(f"[prepare_data] Writing raw splits to {raw_dir}")
     _dump_jsonl_records(splits.train, raw_dir / "train.jsonl")
@@ -188,9 +234,10 @@ def main() -> None:
     _dump_jsonl_records(splits.test, raw_dir / "test.jsonl")
 
     print(f"[prepare_data] Tokenizing splits with tokenizer '{args.model}'…")
+    tokenizer = _ensure_tokenizer(args.model)
     _dump_tokenized(
         splits.train,
-        args.model,
+        tokenizer,
         tok_dir / "train.jsonl",
         max_length=args.max_length,
         padding=padding,
@@ -198,7 +245,7 @@ def main() -> None:
     )
     _dump_tokenized(
         splits.val,
-        args.model,
+        tokenizer,
         tok_dir / "val.jsonl",
         max_length=args.max_length,
         padding=padding,
@@ -206,13 +253,40 @@ def main() -> None:
     )
     _dump_tokenized(
         splits.test,
-        args.model,
+        tokenizer,
         tok_dir / "test.jsonl",
         max_length=args.max_length,
         padding=padding,
         truncation=truncation,
     )
 
+    if not args.no_sft_dataset:
+        print(f"[prepare_data] Writing pre-tokenized SFT splits to {sft_dir}")
+        dropped = {}
+        for name, recs in (
+            ("train", splits.train),
+            ("val", splits.val),
+            ("test", splits.test),
+        ):
+            dropped[name] = _dump_sft_dataset(
+                recs, tokenizer, sft_dir / name, max_length=args.max_length
+            )
+            if dropped[name]:
+                print(
+                    f"[prepare_data] Dropped {dropped[name]} {name} rows with no "
+                    "supervised answer tokens"
+                )
+        with open(sft_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "tokenizer": args.model,
+                    "max_length": args.max_length,
+                    "dropped_unsupervised": dropped,
+                },
+                f,
+                indent=2,
+            )
+
     print("[prepare_data] Done.")
 
 
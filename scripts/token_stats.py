@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+"""
+Token-length statistics and truncation report.
+
+Tokenizes prompts and answers of each split once (no truncation, no padding)
+and reports, per split:
+- prompt / answer / combined length percentiles
+- records and tokens lost to truncation at each candidate --max-lengths value
+- projected row counts for tokenize_dataset.py's sliding_window strategy
+
+Writes JSON (--output) and prints a text histogram of combined lengths.
+
+Example:
+  uv run scripts/token_stats.py data/processed/splits \
+    --model mistralai/Mistral-7B-Instruct-v0.3 \
+    --max-lengths 256 512 1024 --stride 128 \
+    --output results/token_stats.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.models import DataRecord
+from src.parsers import load_csv_records, load_json_records, load_jsonl_records
+from src.sampling import token_lengths
+from src.token_stats import split_report, text_histogram
+from src.tokenization import _ensure_tokenizer, default_pair_template
+
+
+def _load(path: Path) -> List[DataRecord]:
+    sfx = path.suffix.lower()
+    if sfx in {".jsonl", ".ndjson"}:
+        return load_jsonl_records(str(path))
+    if sfx == ".json":
+        return load_json_records(str(path))
+    if sfx == ".csv":
+        return load_csv_records(str(path))
+    raise SystemExit(f"unsupported input format: {sfx}")
+
+
+def _resolve_inputs(inputs: List[Path]) -> List[Tuple[str, Path]]:
+    """Expand directories to their train/val/test JSONL splits."""
+    out: List[Tuple[str, Path]] = []
+    for path in inputs:
+        if path.is_dir():
+            found = [path / f"{n}.jsonl" for n in ("train", "val", "test")]
+            found = [f for f in found if f.exists()]
+            if not found:
+                raise SystemExit(f"no train/val/test.jsonl under {path}")
+            out.extend((f.stem, f) for f in found)
+        elif path.exists():
+            out.append((path.stem, path))
+        else:
+            raise SystemExit(f"input not found: {path}")
+    return out
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description="Token-length percentiles, truncation loss and sliding-window projections"
+    )
+    p.add_argument(
+        "inputs",
+        type=Path,
+        nargs="+",
+        help="Dataset files (.jsonl/.json/.csv) or split directories",
+    )
+    p.add_argument("--model", required=True, help="HF model id for the tokenizer")
+    p.add_argument(
+        "--max-lengths",
+        type=int,
+        nargs="+",
+        default=[256, 512, 1024, 2048],
+        help="Candidate max_length values to evaluate",
+    )
+    p.add_argument(
+        "--stride",
+        type=int,
+        default=128,
+        help="Overlap used for sliding_window row projections",
+    )
+    p.add_argument("--output", type=Path, default=None, help="Write JSON report here")
+    p.add_argument(
+        "--histogram-width", type=int, default=40, help="Width of histogram bars"
+    )
+    return p.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    tok = _ensure_tokenizer(args.model)
+
+    report: Dict[str, object] = {
+        "tokenizer": args.model,
+        "stride": args.stride,
+        "splits": {},
+    }
+    for name, path in _resolve_inputs(args.inputs):
+        records = _load(path)
+        pairs = [default_pair_template(r) for r in records]
+        prompt_lengths = token_lengths(tok, [p for p, _ in pairs])
+        answer_lengths = token_lengths(tok, [a for _, a in pairs])
+        report["splits"][name] = split_report(  # type: ignore[index]
+            prompt_lengths,
+            answer_lengths,
+            max_lengths=args.max_lengths,
+            stride=args.stride,
+        )
+        print(
+            text_histogram(
+                [p + a for p, a in zip(prompt_lengths, answer_lengths)],
+                width=args.histogram_width,
+                title=f"[{name}] combined prompt+answer tokens ({len(records)} records)",
+            )
+        )
+        print()
+
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[token_stats] Report saved to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,8 @@ from pathlib import Path
 from typing import List
 
 from src import tokenization as tokmod
-from src.chunking import chunk_ids_sliding_window
+from src.chunking import chunk_prompt_answer_joint, joint_budget, windows_from_offsets
+from src.dedup import RowDeduper
 from src.models import DataRecord
 from src.parsers import load_csv_records, load_json_records, load_jsonl_records
 from src.tokenization import tokenize_pairs
@@ -23,6 +24,10 @@ def _load(path: Path) -> List[DataRecord]:
     raise SystemExit(f"unsupported input format: {sfx}")
 
 
+def _real_tokens(ids: List[int], mask: List[int]) -> List[int]:
+    return [t for t, m in zip(ids, mask) if m]
+
+
 def main() -> None:
     p = argparse.ArgumentParser(
         description="Tokenize dataset into prompt/answer token ids"
@@ -50,14 +55,29 @@ def main() -> None:
     p.add_argument(
         "--chunking-strategy",
         default="truncate",
-        choices=["truncate", "sliding_window"],
-        help="Handle over-length inputs by truncation (default) or sliding window",
+        choices=["truncate", "sliding_window", "boundary_window"],
+        help=(
+            "Handle over-length inputs by truncation (default), sliding window, or "
+            "sentence/turn-boundary aligned windows (fast tokenizers only)"
+        ),
     )
     p.add_argument(
         "--stride",
         type=int,
         default=128,
-        help="Overlap size when using sliding_window",
+        help="Overlap between prompt-context windows when using sliding_window",
+    )
+    p.add_argument(
+        "--boundary-overlap",
+        type=int,
+        default=0,
+        help="boundary_window: max overlap in tokens, taken as whole sentences/turns",
+    )
+    p.add_argument(
+        "--dedup",
+        default="count",
+        choices=["off", "count", "drop"],
+        help="Detect token-identical rows across records: report only (count) or drop them",
     )
     args = p.parse_args()
 
@@ -74,6 +94,31 @@ def main() -> None:
     )
 
     records = _load(args.input)
+    stats = {"records": len(records), "rows": 0, "real_tokens": 0, "pad_tokens": 0}
+    deduper = RowDeduper() if args.dedup != "off" else None
+
+    def _write_row(f, row: dict) -> None:
+        if deduper is not None:
+            # Hash real tokens only, so padding differences do not hide repeats
+            is_new = deduper.add(
+                _real_tokens(row["prompt_input_ids"], row["prompt_attention_mask"]),
+                _real_tokens(row["answer_input_ids"], row["answer_attention_mask"]),
+            )
+            if not is_new and args.dedup == "drop":
+                return
+        real = sum(row["prompt_attention_mask"]) + sum(row["answer_attention_mask"])
+        total = len(row["prompt_input_ids"]) + len(row["answer_input_ids"])
+        stats["rows"] += 1
+        stats["real_tokens"] += real
+        stats["pad_tokens"] += total - real
+        f.write(json.dumps(row, ensure_ascii=False))
+        f.write("\n")
+
+    def _summary() -> str:
+        out = dict(stats)
+        if deduper is not None:
+            out["dedup"] = dict(deduper.report(), mode=args.dedup)
+        return json.dumps(out)
 
     if args.chunking_strategy == "truncate":
         toks = tokenize_pairs(
@@ -93,46 +138,93 @@ def main() -> None:
                     "answer_input_ids": toks.answer_input_ids[i],
                     "answer_attention_mask": toks.answer_attention_mask[i],
                 }
-                f.write(json.dumps(row, ensure_ascii=False))
-                f.write("\n")
+                _write_row(f, row)
+        print(_summary())
         return
 
-    # sliding_window path: produce multiple rows per record as needed
+    # Windowed paths: prompt context and answer share one max_length budget.
+    # The context is windowed; the answer stays intact on every row.
     tok = tokmod._ensure_tokenizer(args.model)  # reuse lazy-loading helper
+    pad_id = getattr(tok, "pad_token_id", None) or 0
+    pad_rows = padding in (True, "max_length")
+    pairs = [tokmod.default_pair_template(rec) for rec in records]
+    enc_a = tok(
+        [a for _, a in pairs], padding=False, truncation=False, return_tensors=None
+    )
     args.output.parent.mkdir(parents=True, exist_ok=True)
-    with args.output.open("w", encoding="utf-8", newline="\n") as f:
-        for rec in records:
-            # Compose text pairs
-            from src.tokenization import default_pair_template
 
-            prompt_text, answer_text = default_pair_template(rec)
-            enc_p = tok(
-                [prompt_text], padding=False, truncation=False, return_tensors=None
-            )
-            enc_a = tok(
-                [answer_text], padding=False, truncation=False, return_tensors=None
-            )
-            prompt_ids = list(enc_p["input_ids"][0])
-            answer_ids = list(enc_a["input_ids"][0])
-            # Window both sides independently
-            p_chunks, p_masks = chunk_ids_sliding_window(
-                prompt_ids, max_length=args.max_length, stride=args.stride, pad_id=tok.pad_token_id or 0  # type: ignore[attr-defined]
-            )
-            a_chunks, a_masks = chunk_ids_sliding_window(
-                answer_ids, max_length=args.max_length, stride=args.stride, pad_id=tok.pad_token_id or 0  # type: ignore[attr-defined]
+    if args.chunking_strategy == "boundary_window":
+        # Windows start/end on sentence or dialogue-turn breaks; char spans
+        # trace every row back to the prompt text.
+        enc_p = tok(
+            [p for p, _ in pairs],
+            padding=False,
+            truncation=False,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_tensors=None,
+        )
+        if "offset_mapping" not in enc_p:
+            raise SystemExit("boundary_window requires a fast tokenizer (offsets)")
+        with args.output.open("w", encoding="utf-8", newline="\n") as f:
+            for rec, (prompt_text, _), prompt_ids, offsets, answer_ids in zip(
+                records,
+                pairs,
+                enc_p["input_ids"],
+                enc_p["offset_mapping"],
+                enc_a["input_ids"],
+            ):
+                budget, kept = joint_budget(
+                    len(prompt_ids), len(answer_ids), max_length=args.max_length
+                )
+                answer = list(answer_ids)[:kept]
+                windows = windows_from_offsets(
+                    prompt_text,
+                    prompt_ids,
+                    offsets,
+                    max_length=budget,
+                    overlap=args.boundary_overlap,
+                )
+                for i, w in enumerate(windows):
+                    pad = args.max_length - len(w.input_ids) - len(answer)
+                    pad = pad if pad_rows else 0
+                    row = {
+                        "id": f"{rec.id}#chunk{i+1}",
+                        "prompt_input_ids": w.input_ids,
+                        "prompt_attention_mask": w.attention_mask,
+                        "prompt_char_span": [w.char_start, w.char_end],
+                        "answer_input_ids": answer + [pad_id] * pad,
+                        "answer_attention_mask": [1] * len(answer) + [0] * pad,
+                    }
+                    _write_row(f, row)
+        print(_summary())
+        return
+
+    enc_p = tok(
+        [p for p, _ in pairs], padding=False, truncation=False, return_tensors=None
+    )
+    with args.output.open("w", encoding="utf-8", newline="\n") as f:
+        for rec, prompt_ids, answer_ids in zip(
+            records, enc_p["input_ids"], enc_a["input_ids"]
+        ):
+            chunks = chunk_prompt_answer_joint(
+                list(prompt_ids),
+                list(answer_ids),
+                max_length=args.max_length,
+                stride=args.stride,
+                pad_id=pad_id,
+                pad_to_max_length=pad_rows,
             )
-            # Emit rows per-chunk, aligning counts by max of both (repeat last when shorter)
-            n = max(len(p_chunks), len(a_chunks))
-            for i in range(n):
+            for i in range(len(chunks.prompt_input_ids)):
                 row = {
                     "id": f"{rec.id}#chunk{i+1}",
-                    "prompt_input_ids": p_chunks[min(i, len(p_chunks) - 1)],
-                    "prompt_attention_mask": p_masks[min(i, len(p_masks) - 1)],
-                    "answer_input_ids": a_chunks[min(i, len(a_chunks) - 1)],
-                    "answer_attention_mask": a_masks[min(i, len(a_masks) - 1)],
+                    "prompt_input_ids": chunks.prompt_input_ids[i],
+                    "prompt_attention_mask": chunks.prompt_attention_mask[i],
+                    "answer_input_ids": chunks.answer_input_ids[i],
+                    "answer_attention_mask": chunks.answer_attention_mask[i],
                 }
-                f.write(json.dumps(row, ensure_ascii=False))
-                f.write("\n")
+                _write_row(f, row)
+    print(_summary())
 
 
 if __name__ == "__main__":
@@ -6,6 +6,9 @@ LoRA SFT training script with bitsandbytes quantization.
 Features
 - Loads raw split JSONL produced by scripts/prepare_data.py (train/val)
 - Formats each record into prompt + completion for TRL SFTTrainer
+- Optional sequence packing of tokenized SFT examples (--packing)
+- Optional pre-tokenized SFT splits from prepare_data (--tokenized-dir)
+- Optional length-grouped batching for SFT and DPO (--group-by-length)
 - Loads base model with 4-bit/8-bit quantization (bitsandbytes)
 - Applies PEFT LoRA adapters (configurable target modules)
 - Deterministic seeds and checkpointing
@@ -15,12 +18,24 @@ Features
 import argparse
 import json
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, Iterable, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Tuple
 
 import yaml
 from src.models import DataRecord
+from src.packing import (
+    PackedCollator,
+    pack_examples,
+    pack_row,
+    packing_report,
+    plan_rows,
+)
 from src.parsers import load_jsonl_records, load_preference_jsonl
-from src.tokenization import default_pair_template
+from src.sampling import LengthGroupedSampler, padding_report, token_lengths
+from src.tokenization import (
+    IGNORE_INDEX,
+    default_pair_template,
+    tokenize_sft_examples,
+)
 
 if TYPE_CHECKING:
     # Optional imports for type checking and IDEs only.
@@ -51,6 +66,155 @@ def _records_to_prompt_completion(records: Iterable[DataRecord]) -> "Dataset":
     return Dataset.from_dict({"prompt": prompts, "completion": completions})
 
 
+def _packed_dataset(packed) -> "Dataset":
+    from datasets import Dataset
+
+    return Dataset.from_dict(
+        {
+            "input_ids": packed.input_ids,
+            "labels": packed.labels,
+            "position_ids": packed.position_ids,
+            "seq_lengths": packed.seq_lengths,
+        }
+    )
+
+
+def _pack_tokenized(
+    ds: "Dataset",
+    tokenizer,
+    *,
+    max_length: int,
+    cache_file: Path | None = None,
+    batch_size: int = 256,
+) -> Tuple["Dataset", Dict[str, Any]]:
+    """Pack a tokenized (memory-mapped) split into full rows and report efficiency.
+
+    Only per-example lengths are read up front. Rows are assembled in
+    batches with `Dataset.map`, and with `cache_file` the packed split is
+    written to Arrow and stays memory-mapped as well.
+    """
+    if "length" in ds.column_names:
+        lengths = ds["length"]
+    else:
+        lengths = ds.map(
+            lambda b: {"length": [len(x) for x in b["input_ids"]]},
+            batched=True,
+            remove_columns=ds.column_names,
+        )["length"]
+    source = ds.select_columns(["input_ids", "labels"])
+    pad_id = tokenizer.pad_token_id or 0
+
+    def build(batch: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        flat = [m for members in batch["members"] for m in members]
+        rows = source[flat]
+        out: Dict[str, List[Any]] = {
+            "input_ids": [],
+            "labels": [],
+            "position_ids": [],
+            "seq_lengths": [],
+        }
+        start = 0
+        for members in batch["members"]:
+            end = start + len(members)
+            ids, labs, pos, lens = pack_row(
+                rows["input_ids"][start:end],
+                rows["labels"][start:end],
+                max_length=max_length,
+                pad_id=pad_id,
+            )
+            out["input_ids"].append(ids)
+            out["labels"].append(labs)
+            out["position_ids"].append(pos)
+            out["seq_lengths"].append(lens)
+            start = end
+        return out
+
+    from datasets import Dataset
+
+    plan = plan_rows(lengths, max_length)
+    map_kwargs: Dict[str, Any] = {}
+    if cache_file is not None:
+        Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+        map_kwargs = {"cache_file_name": str(cache_file), "load_from_cache_file": False}
+    packed = Dataset.from_dict({"members": plan}).map(
+        build,
+        batched=True,
+        batch_size=batch_size,
+        remove_columns=["members"],
+        **map_kwargs,
+    )
+    report = packing_report(lengths, len(plan), max_length=max_length)
+    return packed, report
+
+
+def _records_to_packed(
+    records: Iterable[DataRecord], tokenizer, *, max_length: int
+) -> Tuple["Dataset", Dict[str, Any]]:
+    """Tokenize records with prompt-masked labels and pack into full rows."""
+    examples = tokenize_sft_examples(list(records), tokenizer, max_length=max_length)
+    packed = pack_examples(
+        examples.input_ids,
+        examples.labels,
+        max_length=max_length,
+        pad_id=tokenizer.pad_token_id or 0,
+    )
+    lengths = [len(x) for x in examples.input_ids]
+    return _packed_dataset(packed), packing_report(
+        lengths, packed, max_length=max_length
+    )
+
+
+def _load_pretokenized(
+    tokenized_dir: Path, model_id: str | None = None, max_length: int | None = None
+) -> Tuple["Dataset", "Dataset"]:
+    """Load Arrow SFT splits written by prepare_data (memory-mapped, no re-tokenization).
+
+    Splits are truncated at tokenization time, so a `max_length` different
+    from the one recorded in meta.json is an error rather than a silent
+    change of the training sequence length. Splits written before
+    prepare_data dropped rows without supervised labels are filtered here.
+    """
+    meta_path = tokenized_dir / "meta.json"
+    meta: Dict[str, Any] = {}
+    if meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        prepared = meta.get("max_length")
+        if max_length is not None and prepared is not None and prepared != max_length:
+            raise SystemExit(
+                f"pre-tokenized splits in {tokenized_dir} were prepared with "
+                f"--max-length {prepared}, but training uses --max-length {max_length}; "
+                "re-run prepare_data with the same --max-length"
+            )
+        if model_id and meta.get("tokenizer") not in (None, model_id):
+            print(
+                f"[train_lora] Warning: splits were tokenized with '{meta.get('tokenizer')}', "
+                f"training model is '{model_id}'."
+            )
+    train_dir = tokenized_dir / "train"
+    val_dir = tokenized_dir / "val"
+    if not train_dir.exists():
+        raise SystemExit(f"missing pre-tokenized train split: {train_dir}")
+    if not val_dir.exists():
+        raise SystemExit(f"missing pre-tokenized val split: {val_dir}")
+    from datasets import load_from_disk
+
+    splits = [load_from_disk(str(train_dir)), load_from_disk(str(val_dir))]
+    if "dropped_unsupervised" not in meta:
+        for i, ds in enumerate(splits):
+            kept = ds.filter(
+                lambda labels: any(t != IGNORE_INDEX for t in labels),
+                input_columns="labels",
+            )
+            if len(kept) < len(ds):
+                print(
+                    f"[train_lora] Skipping {len(ds) - len(kept)} pre-tokenized rows "
+                    "with no supervised answer tokens"
+                )
+            splits[i] = kept
+    return splits[0], splits[1]
+
+
 def _bitsandbytes_config(
     quant: str, *, compute_dtype: str, quant_type: str, double_quant: bool
 ) -> "BitsAndBytesConfig" | None:
@@ -108,6 +272,79 @@ def _infer_lora_targets_from_model(model) -> List[str]:
     return []
 
 
+def _dataset_token_lengths(ds: "Dataset", tokenizer, *, recipe: str) -> List[int]:
+    """Per-example token lengths used to group batches.
+
+    Pre-tokenized datasets carry them already; raw SFT/DPO text is measured
+    with one batched tokenizer call per column (DPO: prompt + longer reply).
+    """
+    cols = set(ds.column_names)
+    if "length" in cols:
+        return [int(x) for x in ds["length"]]
+    if "input_ids" in cols:
+        return [len(x) for x in ds["input_ids"]]
+    if recipe == "dpo":
+        prompt = token_lengths(tokenizer, ds["prompt"])
+        chosen = token_lengths(tokenizer, ds["chosen"])
+        rejected = token_lengths(tokenizer, ds["rejected"])
+        return [p + max(c, r) for p, c, r in zip(prompt, chosen, rejected)]
+    return token_lengths(
+        tokenizer, [p + c for p, c in zip(ds["prompt"], ds["completion"])]
+    )
+
+
+def _length_grouped_trainer(
+    trainer_cls,
+    train_lengths: List[int],
+    eval_lengths: List[int],
+    *,
+    window_batches: int,
+    seed: int,
+):
+    """Subclass a (TRL/HF) trainer so its dataloaders use length-grouped samplers.
+
+    Falls back to the stock sampler when the trainer changed the dataset size
+    (e.g., filtering), since precomputed lengths would no longer line up.
+    """
+
+    class _LengthGrouped(trainer_cls):  # type: ignore[misc, valid-type]
+        def _get_train_sampler(self, *a, **kw):
+            if self.train_dataset is None or len(self.train_dataset) != len(
+                train_lengths
+            ):
+                return super()._get_train_sampler(*a, **kw)
+            return LengthGroupedSampler(
+                train_lengths,
+                self.args.per_device_train_batch_size,
+                shuffle=True,
+                window_batches=window_batches,
+                seed=seed,
+            )
+
+        def _get_eval_sampler(self, eval_dataset, *a, **kw):
+            if eval_dataset is None or len(eval_dataset) != len(eval_lengths):
+                return super()._get_eval_sampler(eval_dataset, *a, **kw)
+            return LengthGroupedSampler(
+                eval_lengths, self.args.per_device_eval_batch_size, shuffle=False
+            )
+
+    _LengthGrouped.__name__ = f"LengthGrouped{trainer_cls.__name__}"
+    return _LengthGrouped
+
+
+def _training_arguments_kwargs(base_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Filter/rename trainer kwargs for the installed TrainingArguments."""
+    from dataclasses import fields as dc_fields
+
+    from transformers import TrainingArguments
+
+    allowed = set(f.name for f in dc_fields(TrainingArguments))
+    kwargs = dict(base_kwargs)
+    if "evaluation_strategy" not in allowed and "eval_strategy" in allowed:
+        kwargs["eval_strategy"] = kwargs.pop("evaluation_strategy")
+    return {k: v for k, v in kwargs.items() if k in allowed}
+
+
 def parse_args() -> argparse.Namespace:
     """Parse CLI args with optional YAML config defaults.
 
@@ -151,6 +388,15 @@ def parse_args() -> argparse.Namespace:
         required=False,
         help="Training output directory for checkpoints",
     )
+    p.add_argument(
+        "--tokenized-dir",
+        type=Path,
+        default=None,
+        help=(
+            "SFT only: directory with pre-tokenized Arrow splits (prepare_data's <out>/sft). "
+            "Loaded memory-mapped; replaces --splits-dir for SFT."
+        ),
+    )
 
     # Recipe selection
     p.add_argument(
@@ -162,7 +408,10 @@ def parse_args() -> argparse.Namespace:
     # DPO-specific options
     p.add_argument("--beta", type=float, default=0.1, help="DPO beta parameter")
     p.add_argument(
-        "--max-length", type=int, default=512, help="Max combined sequence length (DPO)"
+        "--max-length",
+        type=int,
+        default=512,
+        help="Max combined sequence length (DPO; SFT row length with --packing)",
     )
     p.add_argument(
         "--max-prompt-length", type=int, default=256, help="Max prompt length (DPO)"
@@ -180,6 +429,35 @@ def parse_args() -> argparse.Namespace:
         help="Optional explicit path to DPO val JSONL {prompt,chosen,rejected}",
     )
 
+    # SFT packing
+    p.add_argument(
+        "--packing",
+        action="store_true",
+        help="Pack several tokenized SFT examples into each --max-length row",
+    )
+    p.add_argument(
+        "--attn-implementation",
+        default=None,
+        help=(
+            "Optional attention backend passed to from_pretrained (e.g., flash_attention_2). "
+            "With --packing, flash_attention_2 separates examples via position_ids; "
+            "other backends get a block-diagonal attention mask."
+        ),
+    )
+
+    # Length-grouped batching
+    p.add_argument(
+        "--group-by-length",
+        action="store_true",
+        help="Batch examples of similar token length together (SFT and DPO)",
+    )
+    p.add_argument(
+        "--length-window-batches",
+        type=int,
+        default=50,
+        help="Shuffle window for --group-by-length, in batches (smaller = more random)",
+    )
+
     # Quantization
     p.add_argument(
         "--quant",
@@ -376,7 +654,9 @@ def main() -> None:
             pass
 
     # Validate required arguments when running as a CLI
-    if not args.model or not args.splits_dir or not args.output_dir:
+    is_dpo = str(args.recipe).lower() == "dpo"
+    tokenized_dir = None if is_dpo else getattr(args, "tokenized_dir", None)
+    if not args.model or not args.output_dir or not (args.splits_dir or tokenized_dir):
         raise SystemExit("--model, --splits-dir, and --output-dir are required")
 
     print("[train_lora] Loading splits…")
@@ -391,6 +671,13 @@ def main() -> None:
         train_ds = load_preference_jsonl(dpo_train)
         eval_ds = load_preference_jsonl(dpo_val)
         print(f"[train_lora] DPO Train: {len(train_ds)}  Val: {len(eval_ds)}")
+    elif tokenized_dir is not None:
+        train_ds, eval_ds = _load_pretokenized(
+            Path(tokenized_dir), args.model, int(args.max_length)
+        )
+        print(
+            f"[train_lora] SFT pre-tokenized Train: {len(train_ds)}  Val: {len(eval_ds)}"
+        )
     else:
         train_path = args.splits_dir / "train.jsonl"
         val_path = args.splits_dir / "val.jsonl"
@@ -411,6 +698,76 @@ def main() -> None:
         tokenizer.pad_token = tokenizer.eos_token
     tokenizer.padding_side = "right"
 
+    packing = bool(getattr(args, "packing", False)) and not is_dpo
+    if packing:
+        print("[train_lora] Packing SFT examples…")
+        if tokenized_dir is not None:
+            packed_dir = Path(args.output_dir) / "packed"
+            train_ds, report = _pack_tokenized(
+                train_ds,
+                tokenizer,
+                max_length=int(args.max_length),
+                cache_file=packed_dir / "train.arrow",
+            )
+            eval_ds, _ = _pack_tokenized(
+                eval_ds,
+                tokenizer,
+                max_length=int(args.max_length),
+                cache_file=packed_dir / "val.arrow",
+            )
+        else:
+            train_ds, report = _records_to_packed(
+                train_records, tokenizer, max_length=int(args.max_length)
+            )
+            eval_ds, _ = _records_to_packed(
+                val_records, tokenizer, max_length=int(args.max_length)
+            )
+        print("[train_lora] Packing report:")
+        print(json.dumps(report, indent=2))
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+        with open(
+            Path(args.output_dir) / "packing_report.json", "w", encoding="utf-8"
+        ) as f:
+            json.dump(report, f, indent=2)
+        if getattr(args, "attn_implementation", None) != "flash_attention_2":
+            print(
+                "[train_lora] Packed rows use a block-diagonal attention mask; "
+                "--attn-implementation flash_attention_2 uses position_ids instead."
+            )
+
+    group_by_length = bool(getattr(args, "group_by_length", False)) and not packing
+    if group_by_length:
+        print("[train_lora] Computing token lengths for length-grouped batching…")
+        recipe = str(args.recipe).lower()
+        train_lengths = _dataset_token_lengths(train_ds, tokenizer, recipe=recipe)
+        eval_lengths = _dataset_token_lengths(eval_ds, tokenizer, recipe=recipe)
+        grouping_report = padding_report(
+            train_lengths,
+            int(args.per_device_train_batch_size),
+            window_batches=int(args.length_window_batches),
+            seed=int(args.seed),
+        )
+        print("[train_lora] Padding overhead (train, before/after grouping):")
+        print(json.dumps(grouping_report, indent=2))
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+        with open(
+            Path(args.output_dir) / "length_grouping_report.json",
+            "w",
+            encoding="utf-8",
+        ) as f:
+            json.dump(grouping_report, f, indent=2)
+
+    def _trainer_cls(cls):
+        if not group_by_length:
+            return cls
+        return _length_grouped_trainer(
+            cls,
+            train_lengths,
+            eval_lengths,
+            window_batches=int(args.length_window_batches),
+            seed=int(args.seed),
+        )
+
     print("[train_lora] Configuring quantization…")
     bnb_cfg = _bitsandbytes_config(
         args.quant,
@@ -420,17 +777,12 @@ def main() -> None:
     )
 
     print("[train_lora] Loading base model…")
-    if bnb_cfg is None:
-        model = AutoModelForCausalLM.from_pretrained(
-            args.model, device_map="auto", torch_dtype="auto"
-        )
-    else:
-        model = AutoModelForCausalLM.from_pretrained(
-            args.model,
-            device_map="auto",
-            torch_dtype="auto",
-            quantization_config=bnb_cfg,
-        )
+    model_kwargs: Dict[str, Any] = {"device_map": "auto", "torch_dtype": "auto"}
+    if getattr(args, "attn_implementation", None):
+        model_kwargs["attn_implementation"] = args.attn_implementation
+    if bnb_cfg is not None:
+        model_kwargs["quantization_config"] = bnb_cfg
+    model = AutoModelForCausalLM.from_pretrained(args.model, **model_kwargs)
 
     # Apply LoRA via PEFT
     print("[train_lora] Applying LoRA adapters…")
@@ -569,7 +921,32 @@ def main() -> None:
             if "model_ref" in params:
                 trainer_kwargs["model_ref"] = ref_model
 
-        trainer = DPOTrainer(**trainer_kwargs)
+        trainer = _trainer_cls(DPOTrainer)(**trainer_kwargs)
+    elif packing or tokenized_dir is not None:
+        # Rows are already tokenized with prompt-masked labels, so a plain
+        # Trainer consumes them directly. Packed rows are equal-length; others
+        # are padded per batch (labels with IGNORE_INDEX).
+        from transformers import DataCollatorForSeq2Seq, Trainer, TrainingArguments
+
+        if packing:
+            collator = PackedCollator(
+                block_mask=getattr(args, "attn_implementation", None)
+                != "flash_attention_2",
+                dtype=getattr(model, "dtype", None),
+            )
+            # Keep seq_lengths, which the model's forward does not take
+            base_kwargs["remove_unused_columns"] = False
+        else:
+            collator = DataCollatorForSeq2Seq(
+                tokenizer, padding=True, label_pad_token_id=IGNORE_INDEX
+            )
+        trainer = _trainer_cls(Trainer)(
+            model=model,
+            args=TrainingArguments(**_training_arguments_kwargs(base_kwargs)),
+            train_dataset=train_ds,
+            eval_dataset=eval_ds,
+            data_collator=collator,
+        )
     else:
         # SFT path (default)
         from trl import SFTConfig, SFTTrainer
@@ -615,7 +992,7 @@ def main() -> None:
             trainer_kwargs["tokenizer"] = tokenizer
         if "peft_config" in params and not hasattr(model, "peft_config"):
             trainer_kwargs["peft_config"] = lora_cfg
-        trainer = SFTTrainer(**trainer_kwargs)
+        trainer = _trainer_cls(SFTTrainer)(**trainer_kwargs)
 
     print(f"[train_lora] Starting training ({args.recipe.upper()})…")
     trainer.train(
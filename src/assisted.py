@@ -0,0 +1,133 @@
+"""Assisted (speculative) decoding helpers for eval and demo.
+
+Two `transformers` modes are supported:
+
+- draft model: `generate(..., assistant_model=draft)`
+- prompt lookup: `generate(..., prompt_lookup_num_tokens=k)` proposes n-gram
+  continuations copied from the prompt, which suits answers that quote the
+  ticket context
+
+Both verify candidates with the target model, so greedy outputs must match
+plain decoding exactly. `compare_with_plain` checks that and measures the
+speedup. Acceptance is derived from target forward calls: every call that
+accepts drafts emits more than one token.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from src.latency import new_token_counts
+
+
+def assisted_generate_kwargs(
+    *,
+    assistant_model=None,
+    prompt_lookup_num_tokens: Optional[int] = None,
+    tokenizer=None,
+    assistant_tokenizer=None,
+) -> Dict[str, Any]:
+    """`generate` kwargs for the chosen mode (empty when neither is set)."""
+    if assistant_model is not None and prompt_lookup_num_tokens:
+        raise ValueError("Use either an assistant model or prompt lookup, not both")
+    if assistant_model is not None:
+        kwargs: Dict[str, Any] = {"assistant_model": assistant_model}
+        if assistant_tokenizer is not None and tokenizer is not None:
+            # Universal assisted decoding: draft and target vocabularies differ
+            kwargs.update(tokenizer=tokenizer, assistant_tokenizer=assistant_tokenizer)
+        return kwargs
+    if prompt_lookup_num_tokens:
+        if prompt_lookup_num_tokens <= 0:
+            raise ValueError("prompt_lookup_num_tokens must be > 0")
+        return {"prompt_lookup_num_tokens": int(prompt_lookup_num_tokens)}
+    return {}
+
+
+def same_vocab(tokenizer, other) -> bool:
+    return tokenizer.get_vocab() == other.get_vocab()
+
+
+@contextlib.contextmanager
+def count_forward_calls(model) -> Iterator[List[int]]:
+    """Count `model` forward passes; yields a one-element list with the count."""
+    counter = [0]
+
+    def _hook(module, args, output):
+        counter[0] += 1
+
+    # PeftModel.generate delegates to the wrapped model, so hook that one
+    target = model.get_base_model() if hasattr(model, "get_base_model") else model
+    handle = target.register_forward_hook(_hook)
+    try:
+        yield counter
+    finally:
+        handle.remove()
+
+
+def _run(model, inputs: Dict[str, Any], kwargs: Dict[str, Any]):
+    with count_forward_calls(model) as calls:
+        start = time.perf_counter()
+        output = model.generate(**inputs, **kwargs)
+        elapsed = time.perf_counter() - start
+    return output, elapsed, calls[0]
+
+
+def compare_with_plain(
+    model,
+    inputs: Dict[str, Any],
+    *,
+    generate_kwargs: Dict[str, Any],
+    assisted_kwargs: Dict[str, Any],
+    pad_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Greedy plain vs assisted generation of one prompt (batch size 1).
+
+    Returns timing, target forward counts, token parity and the assisted
+    `output` ids.
+    """
+    greedy = {**generate_kwargs, "do_sample": False}
+    greedy.pop("temperature", None)
+    plain, plain_time, plain_calls = _run(model, inputs, greedy)
+    assisted, assisted_time, assisted_calls = _run(
+        model, inputs, {**greedy, **assisted_kwargs}
+    )
+    ids = inputs["input_ids"]
+    width = ids.shape[-1] if hasattr(ids, "shape") else len(ids[0])
+    new_tokens = new_token_counts(assisted, width, pad_id)[0]
+    rows = [o.tolist() if hasattr(o, "tolist") else list(o) for o in (plain, assisted)]
+    return {
+        "new_tokens": new_tokens,
+        "plain_time": plain_time,
+        "assisted_time": assisted_time,
+        "plain_forward_calls": plain_calls,
+        "assisted_forward_calls": assisted_calls,
+        "parity": rows[0] == rows[1],
+        "output": assisted,
+    }
+
+
+def summarize_comparisons(items: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate speedup, acceptance and parity over compared prompts.
+
+    `accepted_fraction` is the share of generated tokens that came from
+    accepted drafts, i.e. 1 - target forward calls / generated tokens.
+    """
+    n = len(items)
+    if not n:
+        return {"compared": 0}
+    plain = sum(i["plain_time"] for i in items)
+    assisted = sum(i["assisted_time"] for i in items)
+    tokens = sum(i["new_tokens"] for i in items)
+    calls = sum(i["assisted_forward_calls"] for i in items)
+    return {
+        "compared": n,
+        "parity_failures": sum(1 for i in items if not i["parity"]),
+        "speedup": plain / assisted if assisted else 0.0,
+        "plain_time": plain,
+        "assisted_time": assisted,
+        "new_tokens": tokens,
+        "tokens_per_forward": tokens / calls if calls else 0.0,
+        "accepted_fraction": max(0.0, 1 - calls / tokens) if tokens else 0.0,
+    }
@@ -1,6 +1,22 @@
 from __future__ import annotations
 
-from typing import List, Sequence, Tuple
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+IntOrArray = Union[int, np.ndarray]
+
+_WHITESPACE = re.compile(r"\s")
+# Unit starts: after sentence-final punctuation + whitespace, after newlines,
+# and at dialogue-turn markers ("User:", "Agent:", ...).
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+_TURN_START = re.compile(
+    r"^[ \t]*(?:user|customer|agent|support|assistant|system)[ \t]*:",
+    re.IGNORECASE | re.MULTILINE,
+)
 
 
 def sliding_windows(length: int, max_length: int, stride: int) -> List[Tuple[int, int]]:
@@ -32,23 +48,215 @@ def sliding_windows(length: int, max_length: int, stride: int) -> List[Tuple[int
     return windows
 
 
+def num_sliding_windows(
+    length: IntOrArray, *, max_length: int, stride: int
+) -> IntOrArray:
+    """Closed-form window count matching `sliding_windows` (scalar or array).
+
+    Grid windows start at k * step while start + max_length < length, plus the
+    end-aligned tail: 1 if length <= max_length else ceil((length - max_length) / step) + 1.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    if stride < 0:
+        raise ValueError("stride must be >= 0")
+    step = max(max_length - stride, 1)
+    arr = np.asarray(length, dtype=np.int64)
+    over = np.maximum(arr - max_length, 0)
+    counts = np.where(arr <= max_length, 1, -(-over // step) + 1)
+    return int(counts) if counts.ndim == 0 else counts
+
+
+def sliding_window_array(
+    ids: Union[Sequence[int], np.ndarray],
+    *,
+    max_length: int,
+    stride: int,
+    pad_id: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """NumPy variant of `chunk_ids_sliding_window`; returns (windows, masks).
+
+    Windows over sequences longer than `max_length` are a read-only strided
+    view of `ids` (no per-window copies). When the end-aligned tail does not
+    fall on the step grid it is appended as one extra row, which materializes
+    the result once. Only sequences shorter than `max_length` need padding,
+    so there is at most a single padded row. Masks are computed by
+    broadcasting window lengths against a position range.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    if stride < 0:
+        raise ValueError("stride must be >= 0")
+    arr = np.asarray(ids)
+    if arr.dtype.kind not in "iu":
+        arr = arr.astype(np.int64)
+    n = arr.shape[0]
+    positions = np.arange(max_length)
+    if n <= max_length:
+        windows = np.full((1, max_length), pad_id, dtype=arr.dtype)
+        windows[0, :n] = arr
+        masks = (positions[None, :] < n).astype(np.int64)
+        return windows, masks
+
+    count = num_sliding_windows(n, max_length=max_length, stride=stride)
+    step = max(max_length - stride, 1)
+    itemsize = arr.strides[0]
+    tail_start = n - max_length
+    if tail_start % step == 0:
+        windows = as_strided(
+            arr,
+            shape=(count, max_length),
+            strides=(itemsize * step, itemsize),
+            writeable=False,
+        )
+    else:
+        grid = as_strided(
+            arr,
+            shape=(count - 1, max_length),
+            strides=(itemsize * step, itemsize),
+            writeable=False,
+        )
+        windows = np.concatenate([grid, arr[None, tail_start:]], axis=0)
+    masks = np.broadcast_to(np.ones(max_length, dtype=np.int64), windows.shape)
+    return windows, masks
+
+
+def chunk_batch_sliding_window(
+    sequences: Sequence[Union[Sequence[int], np.ndarray]],
+    *,
+    max_length: int,
+    stride: int,
+    pad_id: int = 0,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Window many sequences at once with a single vectorized gather.
+
+    Returns (windows, masks, owner) where `owner[i]` is the index of the
+    source sequence of window row i. Rows follow input order, and each
+    sequence's windows match `sliding_window_array`.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    lengths = np.fromiter((len(s) for s in sequences), dtype=np.int64)
+    if lengths.size == 0:
+        empty = np.zeros((0, max_length), dtype=np.int64)
+        return empty, empty.copy(), np.zeros(0, dtype=np.int64)
+    flat = np.concatenate(
+        [np.asarray(s, dtype=np.int64) for s in sequences] + [np.array([pad_id])]
+    )
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    counts = num_sliding_windows(lengths, max_length=max_length, stride=stride)
+    owner = np.repeat(np.arange(lengths.size), counts)
+    first_row = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    k = np.arange(owner.size) - first_row[owner]
+    step = max(max_length - stride, 1)
+    own_len = lengths[owner]
+    is_tail = (k == counts[owner] - 1) & (own_len > max_length)
+    starts = np.where(is_tail, own_len - max_length, k * step)
+    valid = np.minimum(own_len, max_length)
+
+    positions = np.arange(max_length)
+    masks = (positions[None, :] < valid[:, None]).astype(np.int64)
+    gather = offsets[owner][:, None] + starts[:, None] + positions[None, :]
+    gather = np.where(masks.astype(bool), gather, flat.size - 1)
+    # Padding positions gather the trailing pad_id sentinel appended to `flat`
+    return flat[gather], masks, owner
+
+
 def chunk_ids_sliding_window(
     ids: Sequence[int], *, max_length: int, stride: int, pad_id: int = 0
 ) -> Tuple[List[List[int]], List[List[int]]]:
     """Split token id sequence into overlapping, padded windows + attention masks.
 
     Returns (chunks, masks) where each chunk is length max_length and mask has 1 for
-    real tokens and 0 for padding.
+    real tokens and 0 for padding. Thin list wrapper over `sliding_window_array`.
+    """
+    windows, masks = sliding_window_array(
+        ids, max_length=max_length, stride=stride, pad_id=pad_id
+    )
+    return windows.tolist(), masks.tolist()
+
+
+@dataclass
+class JointChunks:
+    """Rows produced by `chunk_prompt_answer_joint` (same fields as TokenizedPairs)."""
+
+    prompt_input_ids: List[List[int]] = field(default_factory=list)
+    prompt_attention_mask: List[List[int]] = field(default_factory=list)
+    answer_input_ids: List[List[int]] = field(default_factory=list)
+    answer_attention_mask: List[List[int]] = field(default_factory=list)
+
+
+def joint_budget(
+    prompt_length: IntOrArray, answer_length: IntOrArray, *, max_length: int
+) -> Tuple[IntOrArray, IntOrArray]:
+    """Split one `max_length` budget into (prompt_budget, kept_answer_length).
+
+    An answer shorter than `max_length` is kept whole and the prompt gets the
+    remaining `max_length - answer_length` tokens. Only an answer that alone
+    fills the budget is truncated, leaving min(prompt_length, max_length // 2)
+    prompt tokens (and at least one). Works on scalars or arrays.
+    """
+    p = np.asarray(prompt_length, dtype=np.int64)
+    a = np.asarray(answer_length, dtype=np.int64)
+    reserve = np.maximum(np.minimum(p, max_length // 2), 1)
+    kept = np.where(a < max_length, a, max_length - reserve)
+    budget = max_length - kept
+    if budget.ndim == 0:
+        return int(budget), int(kept)
+    return budget, kept
+
+
+def num_joint_windows(
+    prompt_length: IntOrArray,
+    answer_length: IntOrArray,
+    *,
+    max_length: int,
+    stride: int,
+) -> IntOrArray:
+    """Closed-form row count of `chunk_prompt_answer_joint` (scalar or array)."""
+    budget, _ = joint_budget(prompt_length, answer_length, max_length=max_length)
+    p = np.asarray(prompt_length, dtype=np.int64)
+    budget = np.asarray(budget, dtype=np.int64)
+    step = np.maximum(budget - np.minimum(stride, budget - 1), 1)
+    over = np.maximum(p - budget, 0)
+    counts = np.where(p <= budget, 1, -(-over // step) + 1)
+    return int(counts) if counts.ndim == 0 else counts
+
+
+def chunk_prompt_answer_joint(
+    prompt_ids: Sequence[int],
+    answer_ids: Sequence[int],
+    *,
+    max_length: int,
+    stride: int,
+    pad_id: int = 0,
+    pad_to_max_length: bool = True,
+) -> JointChunks:
+    """Window the prompt context so prompt + answer fit one `max_length` budget.
+
+    The (possibly truncated, see `joint_budget`) answer is repeated intact on
+    every row; only the prompt is windowed, with `stride` overlap capped below
+    the prompt budget. Each prompt window appears once, so rows never repeat.
+    With `pad_to_max_length`, padding goes after the answer so the combined
+    prompt + answer sequence is exactly `max_length` tokens.
     """
-    win_bounds = sliding_windows(len(ids), max_length=max_length, stride=stride)
-    chunks: List[List[int]] = []
-    masks: List[List[int]] = []
-    for s, e in win_bounds:
-        window = list(ids[s:e])
-        pad = max(0, max_length - len(window))
-        chunks.append(window + [pad_id] * pad)
-        masks.append([1] * len(window) + [0] * pad)
-    return chunks, masks
+    if max_length <= 1:
+        raise ValueError("max_length must be > 1")
+    if stride < 0:
+        raise ValueError("stride must be >= 0")
+    budget, kept = joint_budget(len(prompt_ids), len(answer_ids), max_length=max_length)
+    answer = list(answer_ids[:kept])
+    out = JointChunks()
+    for s, e in sliding_windows(
+        len(prompt_ids), max_length=budget, stride=min(stride, budget - 1)
+    ):
+        prompt = list(prompt_ids[s:e])
+        pad = max_length - len(prompt) - len(answer) if pad_to_max_length else 0
+        out.prompt_input_ids.append(prompt)
+        out.prompt_attention_mask.append([1] * len(prompt))
+        out.answer_input_ids.append(answer + [pad_id] * pad)
+        out.answer_attention_mask.append([1] * len(answer) + [0] * pad)
+    return out
 
 
 def last_window_for_text(
@@ -65,3 +273,161 @@ def last_window_for_text(
         ids, max_length=max_length, stride=stride, pad_id=pad_id
     )
     return chunks[-1], masks[-1]
+
+
+def tail_window_for_text(
+    tokenizer,
+    text: str,
+    *,
+    max_length: int,
+    stride: int,
+    initial_chars: int | None = None,
+    guard_tokens: int = 8,
+) -> Tuple[List[int], List[int]]:
+    """Like `last_window_for_text`, but tokenizes only the tail of `text`.
+
+    Encodes growing character suffixes (starting at ~4 chars/token and
+    doubling), each cut snapped forward to a whitespace boundary, until the
+    suffix yields `max_length + guard_tokens` ids. The first `guard_tokens`
+    ids absorb tokenization effects at the cut (partial words, a prefix
+    BOS), so the returned window matches the full-text path. When the suffix
+    would cover the whole text, this falls back to `last_window_for_text`.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    n_chars = max(int(initial_chars or max_length * 4), 1)
+    while n_chars < len(text):
+        # Snap the cut to just after the next whitespace so the first word is whole
+        ws = _WHITESPACE.search(text, len(text) - n_chars - 1)
+        start = ws.end() if ws else len(text)
+        enc = tokenizer(
+            [text[start:]], padding=False, truncation=False, return_tensors=None
+        )
+        ids = list(enc["input_ids"][0])
+        if len(ids) >= max_length + guard_tokens:
+            return ids[-max_length:], [1] * max_length
+        n_chars *= 2
+    return last_window_for_text(tokenizer, text, max_length=max_length, stride=stride)
+
+
+@dataclass
+class TextWindow:
+    """One boundary-aligned window with its token and character spans."""
+
+    input_ids: List[int]
+    attention_mask: List[int]
+    token_start: int
+    token_end: int
+    char_start: int
+    char_end: int
+
+
+def text_boundaries(text: str) -> List[int]:
+    """Character offsets where a sentence, line or dialogue turn starts."""
+    marks = {m.end() for m in _SENTENCE_BREAK.finditer(text)}
+    marks.update(m.start() for m in _TURN_START.finditer(text))
+    return sorted(c for c in marks if 0 < c < len(text))
+
+
+def boundary_token_windows(
+    boundaries: Sequence[int], length: int, *, max_length: int, overlap: int = 0
+) -> List[Tuple[int, int]]:
+    """Greedy token windows that end (and start) on boundary token indices.
+
+    Each window ends at the last boundary within `max_length` tokens of its
+    start, or is cut hard when no boundary fits. The next window starts at
+    the window end, or with `overlap` > 0 at the earliest boundary inside
+    the last `overlap` tokens, so windows only overlap by whole units.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    if overlap < 0:
+        raise ValueError("overlap must be >= 0")
+    b = np.unique(np.asarray(boundaries, dtype=np.int64))
+    windows: List[Tuple[int, int]] = []
+    start = 0
+    while True:
+        limit = start + max_length
+        if limit >= length:
+            windows.append((start, length))
+            return windows
+        # last boundary in (start, limit]
+        i = int(np.searchsorted(b, limit, side="right")) - 1
+        end = int(b[i]) if i >= 0 and b[i] > start else limit
+        windows.append((start, end))
+        nxt = end
+        if overlap > 0:
+            j = int(np.searchsorted(b, max(end - overlap, start + 1), side="left"))
+            if j < b.size and b[j] < end:
+                nxt = int(b[j])
+        start = nxt
+
+
+def windows_from_offsets(
+    text: str,
+    ids: Sequence[int],
+    offsets: Sequence[Sequence[int]],
+    *,
+    max_length: int,
+    overlap: int = 0,
+    pad_id: int | None = None,
+) -> List[TextWindow]:
+    """Boundary-aligned windows from an existing encoding of `text`.
+
+    `offsets` is the tokenizer's (char_start, char_end) per id. With
+    `pad_id`, windows are right-padded to `max_length`.
+    """
+    ids = list(ids)
+    offs = np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+    # Token index at which each character boundary starts
+    b_tokens = np.searchsorted(offs[:, 0], text_boundaries(text), side="left")
+    out: List[TextWindow] = []
+    for s, e in boundary_token_windows(
+        b_tokens, len(ids), max_length=max_length, overlap=overlap
+    ):
+        window = ids[s:e]
+        pad = max_length - len(window) if pad_id is not None else 0
+        out.append(
+            TextWindow(
+                input_ids=window + [pad_id] * pad,
+                attention_mask=[1] * len(window) + [0] * pad,
+                token_start=s,
+                token_end=e,
+                char_start=int(offs[s, 0]) if e > s else 0,
+                char_end=int(offs[e - 1, 1]) if e > s else 0,
+            )
+        )
+    return out
+
+
+def chunk_text_on_boundaries(
+    tokenizer,
+    text: str,
+    *,
+    max_length: int,
+    overlap: int = 0,
+    pad_id: int | None = None,
+) -> List[TextWindow]:
+    """Tokenize `text` and window it on sentence/turn boundaries.
+
+    Requires a fast tokenizer (offset mappings). Special tokens are not
+    added, so every id maps back to `text[char_start:char_end]`.
+    """
+    enc = tokenizer(
+        [text],
+        padding=False,
+        truncation=False,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_tensors=None,
+    )
+    if "offset_mapping" not in enc:
+        raise ValueError("boundary chunking needs a fast tokenizer with offsets")
+    return windows_from_offsets(
+        text,
+        enc["input_ids"][0],
+        enc["offset_mapping"][0],
+        max_length=max_length,
+        overlap=overlap,
+        pad_id=pad_id,
+    )
@@ -0,0 +1,53 @@
+"""Exact-duplicate detection for tokenized rows.
+
+Support threads quote earlier messages, so windows from different records (and
+overlapping windows of one record) can be token-identical. `RowDeduper`
+keeps only a 64-bit BLAKE2b digest per distinct row, so memory stays small
+even for millions of windows.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from array import array
+from typing import Dict, Sequence, Set
+
+
+def row_digest(*parts: Sequence[int]) -> int:
+    """64-bit digest of one or more token id sequences (length-delimited)."""
+    h = hashlib.blake2b(digest_size=8)
+    for ids in parts:
+        h.update(len(ids).to_bytes(8, "little"))
+        h.update(array("q", ids).tobytes())
+    return int.from_bytes(h.digest(), "little")
+
+
+class RowDeduper:
+    """Track seen rows and count exact repeats (rows and real tokens)."""
+
+    def __init__(self) -> None:
+        self._seen: Set[int] = set()
+        self.rows = 0
+        self.duplicate_rows = 0
+        self.duplicate_tokens = 0
+
+    def add(self, *parts: Sequence[int]) -> bool:
+        """Record a row; returns True if it was not seen before."""
+        self.rows += 1
+        key = row_digest(*parts)
+        if key in self._seen:
+            self.duplicate_rows += 1
+            self.duplicate_tokens += sum(len(p) for p in parts)
+            return False
+        self._seen.add(key)
+        return True
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "rows_checked": self.rows,
+            "duplicate_rows": self.duplicate_rows,
+            "duplicate_tokens": self.duplicate_tokens,
+            "duplicate_row_fraction": (
+                self.duplicate_rows / self.rows if self.rows else 0.0
+            ),
+        }
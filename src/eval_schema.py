@@ -1,7 +1,15 @@
 from __future__ import annotations
 
+import re
+import warnings
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_ERROR_PATTERNS = (
+    Path(__file__).resolve().parents[1] / "configs" / "error_patterns.yaml"
+)
 
 
 class ErrorType(str, Enum):
@@ -30,3 +38,134 @@ def classify_error(prompt: str, response: str) -> Optional[ErrorType]:
         return ErrorType.STYLE
     # Hallucination detection would need references; skip here
     return None
+
+
+@dataclass
+class PatternPack:
+    """Literal substrings and raw regexes that flag one error type."""
+
+    substrings: List[str] = field(default_factory=list)
+    regex: List[str] = field(default_factory=list)
+
+    def compile(self) -> Optional[re.Pattern]:
+        """One alternation over every entry, or None for an empty pack."""
+        parts = [re.escape(s) for s in self.substrings] + list(self.regex)
+        return re.compile("|".join(f"(?:{p})" for p in parts)) if parts else None
+
+
+@dataclass
+class ErrorPatterns:
+    """Refusal and style pattern packs (defaults mirror `classify_error`)."""
+
+    refusal: PatternPack = field(
+        default_factory=lambda: PatternPack(
+            substrings=["i can't", "cannot", "not able to", "sorry, i can't"]
+        )
+    )
+    style: PatternPack = field(default_factory=PatternPack)
+    style_max_words: int = 2
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ErrorPatterns":
+        refusal = data.get("refusal") or {}
+        style = data.get("style") or {}
+        return cls(
+            refusal=PatternPack(
+                substrings=list(refusal.get("substrings") or []),
+                regex=list(refusal.get("regex") or []),
+            ),
+            style=PatternPack(
+                substrings=list(style.get("substrings") or []),
+                regex=list(style.get("regex") or []),
+            ),
+            style_max_words=int(style.get("max_words", 2)),
+        )
+
+
+def load_error_patterns(path: Optional[str | Path] = None) -> ErrorPatterns:
+    """Load pattern packs from YAML (default: configs/error_patterns.yaml)."""
+    path = Path(path) if path is not None else DEFAULT_ERROR_PATTERNS
+    if not path.exists():
+        if path == DEFAULT_ERROR_PATTERNS:
+            return ErrorPatterns()
+        raise FileNotFoundError(f"Error pattern file not found: {path}")
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        return ErrorPatterns.from_dict(yaml.safe_load(f) or {})
+
+
+@dataclass
+class BatchErrors:
+    """Per-row labels plus per-type boolean masks and counts."""
+
+    labels: Any  # pandas Series of ErrorType values (None when no error)
+    masks: Dict[str, Any]  # ErrorType value -> pandas boolean Series
+    counts: Dict[str, int]
+
+
+def _contains(text, pattern: re.Pattern):
+    # User regexes may contain capture groups; only the match matters here
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return text.str.contains(pattern, regex=True)
+
+
+def classify_errors_batch(
+    responses: Iterable[Optional[str]],
+    patterns: Optional[ErrorPatterns] = None,
+) -> BatchErrors:
+    """Classify a whole column of responses in vectorized pandas passes.
+
+    Same precedence as `classify_error`: empty -> OTHER, then REFUSAL, then
+    STYLE. Each pack is a single compiled alternation, so a row is scanned
+    once per pack instead of once per pattern.
+    """
+    import numpy as np
+    import pandas as pd
+
+    patterns = patterns or load_error_patterns()
+    # Lower/strip and word counts use Python's str methods, exactly as
+    # `classify_error` does. The pandas string dtype (Arrow-backed in pandas
+    # 3) has different whitespace rules for \xa0, \u3000 and \x1c-\x1f.
+    text = pd.Series(
+        [("" if r is None else str(r)).lower().strip() for r in responses],
+        dtype=object,
+    )
+
+    empty = text.str.len() == 0
+    refusal_re = patterns.refusal.compile()
+    refusal = (
+        _contains(text, refusal_re)
+        if refusal_re is not None
+        else pd.Series(False, index=text.index)
+    )
+    k = patterns.style_max_words
+    words = pd.Series([len(t.split()) for t in text], index=text.index)
+    style = (words <= k) & ~empty
+    style_re = patterns.style.compile()
+    if style_re is not None:
+        style |= _contains(text, style_re)
+
+    refusal &= ~empty
+    style &= ~empty & ~refusal
+    labels = pd.Series(
+        np.select(
+            [empty.to_numpy(), refusal.to_numpy(), style.to_numpy()],
+            [ErrorType.OTHER.value, ErrorType.REFUSAL.value, ErrorType.STYLE.value],
+            default=None,
+        ),
+        index=text.index,
+        dtype=object,
+    )
+
+    masks = {
+        ErrorType.OTHER.value: empty,
+        ErrorType.REFUSAL.value: refusal,
+        ErrorType.STYLE.value: style,
+    }
+    return BatchErrors(
+        labels=labels,
+        masks=masks,
+        counts={k: int(m.sum()) for k, m in masks.items()},
+    )
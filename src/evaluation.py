@@ -6,33 +6,79 @@ dependencies inside call-sites, so tests can stub/mocks libs easily.
 
 from __future__ import annotations
 
+import contextlib
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+DEFAULT_LENGTH_BUCKETS = (64, 128, 256, 512)
+COMPILE_CACHE_ENV = "SUPPORTBOT_COMPILE_CACHE_DIR"
+DEFAULT_COMPILE_CACHE_DIR = "results/compile_cache"
+
 
 def _quantization_supported() -> bool:
     """Best-effort check for 4-bit quantization support.
 
     Returns True if both transformers' BitsAndBytesConfig and the bitsandbytes
-    runtime are importable; otherwise False. This avoids surfacing cryptic
-    runtime errors when users pass --quantization without the backend installed.
+    runtime are importable and a CUDA device is visible; otherwise False.
+    Hosts without them use CPU dynamic int8 instead (see `quantization_backend`).
     """
     try:
         # transformers exposes BitsAndBytesConfig at top-level in recent versions
         import importlib
+        import sys
 
         importlib.import_module("bitsandbytes")
         importlib.import_module("transformers")
+        torch = sys.modules.get("torch") or importlib.import_module("torch")
+        cuda = getattr(torch, "cuda", None)
         # If transformers is present, BitsAndBytesConfig is typically available; if not,
         # we'll still return True and let model loading raise a clearer error.
-        return True
+        return bool(cuda is not None and cuda.is_available())
     except Exception:
         return False
 
 
-def load_model_and_tokenizer(base_model_name: str, quantization: bool = False):
+def quantization_backend(quantization) -> Optional[str]:
+    """Resolve a `quantization` flag (bool, "auto", "nf4", "int8-dynamic")."""
+    from src.quantization import resolve_quantization
+
+    return resolve_quantization(
+        quantization, nf4_supported=bool(quantization) and _quantization_supported()
+    )
+
+
+def load_model_and_tokenizer(
+    base_model_name: str,
+    quantization: Union[bool, str] = False,
+    dtype: Optional[str] = "bfloat16",
+    *,
+    fast_load: bool = False,
+    prefetch: bool = False,
+    defer_quantization: bool = False,
+    tokenizer_name: Optional[str] = None,
+    timeline=None,
+):
     """Load a causal LM model and tokenizer for inference.
 
-    - Uses device_map='auto' and bfloat16 when available.
-    - If `quantization` is True and the environment supports it, configures
-      4-bit NF4 quantization with bfloat16 compute.
+    - Uses device_map='auto' and `dtype` (a torch dtype name, default
+      bfloat16) when available; None keeps the checkpoint's dtype.
+    - `quantization` resolves to a backend via `quantization_backend`: with
+      CUDA and bitsandbytes, 4-bit NF4 with bfloat16 compute; otherwise
+      dynamic int8 on CPU Linear layers (weights load in float32 first).
+      `defer_quantization` leaves an int8 model in float32 so an adapter can
+      be attached before calling `src.quantization.quantize_dynamic_int8`.
+    - `fast_load` requests memory-mapped safetensors with
+      `low_cpu_mem_usage`, so weights are materialized once, in place,
+      instead of being read into a random-initialized model.
+    - `prefetch` reads local safetensors shards into the page cache on a
+      background thread while the tokenizer loads.
+    - `tokenizer_name` loads the tokenizer from another path (packaged
+      models keep it next to, not inside, the weights directory).
+    - `timeline` (a `src.startup.StartupTimeline`) records the tokenizer and
+      weight-read phases.
 
     Returns a tuple (model, tokenizer).
     """
@@ -53,17 +99,29 @@ def load_model_and_tokenizer(base_model_name: str, quantization: bool = False):
     AutoTokenizer = getattr(transformers, "AutoTokenizer")
     AutoModelForCausalLM = getattr(transformers, "AutoModelForCausalLM")
 
-    tokenizer = AutoTokenizer.from_pretrained(base_model_name)
+    from src.startup import optional_phase, prefetch_weights
 
-    dtype = getattr(torch, "bfloat16", None)
+    prefetcher = prefetch_weights(base_model_name) if prefetch else None
+    with optional_phase(timeline, "tokenizer"):
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name or base_model_name)
+
+    backend = quantization_backend(quantization)
+    dtype = getattr(torch, dtype, None) if dtype else None
     # Build kwargs for model loading
     model_kwargs = {
         "device_map": "auto",
     }
+    if backend == "int8-dynamic":
+        # Dynamic int8 kernels take float32 activations and run on CPU only
+        dtype = getattr(torch, "float32", None)
+        model_kwargs["device_map"] = "cpu"
     if dtype is not None:
         model_kwargs["torch_dtype"] = dtype
+    if fast_load:
+        model_kwargs["low_cpu_mem_usage"] = True
+        model_kwargs["use_safetensors"] = True
 
-    if quantization and _quantization_supported():
+    if backend == "nf4":
         # Try to build a BitsAndBytesConfig for 4-bit NF4
         BitsAndBytesConfig = getattr(transformers, "BitsAndBytesConfig", None)
         if BitsAndBytesConfig is not None:
@@ -76,14 +134,25 @@ def load_model_and_tokenizer(base_model_name: str, quantization: bool = False):
 
     # Load model weights from pretrained checkpoint. Support either
     # class-with-"from_pretrained" or a callable factory (for tests).
-    if hasattr(AutoModelForCausalLM, "from_pretrained"):
-        model = AutoModelForCausalLM.from_pretrained(base_model_name, **model_kwargs)
-    elif callable(AutoModelForCausalLM):
-        model = AutoModelForCausalLM(base_model_name, **model_kwargs)  # type: ignore[misc]
-    else:
-        raise TypeError(
-            "AutoModelForCausalLM is neither a factory nor exposes from_pretrained"
-        )
+    with optional_phase(timeline, "weights", prefetch=prefetcher is not None):
+        if prefetcher is not None:
+            prefetcher.join()
+        if hasattr(AutoModelForCausalLM, "from_pretrained"):
+            model = AutoModelForCausalLM.from_pretrained(
+                base_model_name, **model_kwargs
+            )
+        elif callable(AutoModelForCausalLM):
+            model = AutoModelForCausalLM(base_model_name, **model_kwargs)  # type: ignore[misc]
+        else:
+            raise TypeError(
+                "AutoModelForCausalLM is neither a factory nor exposes from_pretrained"
+            )
+
+    if backend == "int8-dynamic" and not defer_quantization:
+        from src.quantization import quantize_dynamic_int8
+
+        with optional_phase(timeline, "quantize", backend=backend):
+            quantize_dynamic_int8(model)
 
     # Ensure pad token exists to allow batching/generation convenience
     if (
@@ -95,11 +164,15 @@ def load_model_and_tokenizer(base_model_name: str, quantization: bool = False):
     return model, tokenizer
 
 
-def load_peft_model(model, peft_model_path: str):
+def load_peft_model(model, peft_model_path: str, merge: bool = True, timeline=None):
     """Utility to load a PEFT adapter and merge it into a base model.
 
     This will require the optional `peft` package. On success, returns a model
     with LoRA (or other) weights merged via `merge_and_unload()`.
+
+    With `merge=False` the adapter stays attached and the `PeftModel` is
+    returned as-is, so callers can toggle it with `disable_adapter()` and
+    compare base and adapter outputs from one copy of the weights.
     """
     try:
         import sys
@@ -115,6 +188,235 @@ def load_peft_model(model, peft_model_path: str):
             "PEFT is not installed. Please `pip install peft` to use adapters."
         ) from e
 
-    peft_model = PeftModel.from_pretrained(model, peft_model_path)
-    merged = peft_model.merge_and_unload()
+    from src.startup import optional_phase
+
+    with optional_phase(timeline, "peft_attach"):
+        peft_model = PeftModel.from_pretrained(model, peft_model_path)
+    if not merge:
+        return peft_model
+    with optional_phase(timeline, "peft_merge"):
+        merged = peft_model.merge_and_unload()
     return merged
+
+
+def quantize_after_adapter(model, quantization, timeline=None):
+    """Apply deferred CPU int8 quantization once an adapter is attached.
+
+    Pairs with `load_model_and_tokenizer(..., defer_quantization=True)`;
+    a no-op for NF4 (applied at load time) and full precision.
+    """
+    if quantization_backend(quantization) != "int8-dynamic":
+        return model
+    from src.quantization import quantize_dynamic_int8
+    from src.startup import optional_phase
+
+    with optional_phase(timeline, "quantize", backend="int8-dynamic"):
+        return quantize_dynamic_int8(model)
+
+
+def bucket_length(length: int, buckets: Sequence[int]) -> int:
+    """Smallest bucket >= `length`; longer inputs round up to a multiple of the largest."""
+    for b in sorted(buckets):
+        if length <= b:
+            return b
+    top = max(buckets)
+    return -(-length // top) * top
+
+
+def batch_size_buckets(max_batch_size: int) -> List[int]:
+    """Powers of two below `max_batch_size`, plus `max_batch_size` itself.
+
+    Padding a batch's row count up to one of these (see `BatchedGenerator`)
+    bounds wasted rows to under half while a compiled model only needs
+    warming at log2(max) + 1 batch sizes.
+    """
+    if max_batch_size <= 0:
+        raise ValueError("max_batch_size must be > 0")
+    sizes = []
+    n = 1
+    while n < max_batch_size:
+        sizes.append(n)
+        n *= 2
+    return sizes + [max_batch_size]
+
+
+def pad_to_bucket(
+    tokenizer,
+    input_ids: List[List[int]],
+    buckets: Optional[Sequence[int]] = None,
+    return_tensors: str = "pt",
+):
+    """Left-pad a batch to its length bucket (to its longest row without buckets).
+
+    Bucketed widths keep the set of input shapes small, so a compiled model
+    reuses a handful of graphs instead of recompiling per prompt length. The
+    tokenizer's own `padding_side` is restored afterwards, since the same
+    tokenizer may also serve right-padded training or scoring code.
+    """
+    features = {"input_ids": input_ids}
+    kwargs = {}
+    if buckets:
+        width = bucket_length(max(len(r) for r in input_ids), buckets)
+        kwargs = {"padding": "max_length", "max_length": width}
+    side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+    try:
+        return tokenizer.pad(features, return_tensors=return_tensors, **kwargs)
+    finally:
+        tokenizer.padding_side = side
+
+
+def enable_compile_cache(cache_dir: Optional[str] = None) -> Path:
+    """Point inductor's on-disk caches at `cache_dir` so graphs survive restarts.
+
+    Defaults to $SUPPORTBOT_COMPILE_CACHE_DIR, then results/compile_cache.
+    """
+    path = Path(cache_dir or os.getenv(COMPILE_CACHE_ENV) or DEFAULT_COMPILE_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(path.resolve())
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+    return path
+
+
+def compile_for_inference(
+    model,
+    tokenizer,
+    *,
+    buckets: Sequence[int] = DEFAULT_LENGTH_BUCKETS,
+    batch_sizes: Sequence[int] = (1,),
+    max_new_tokens: int = 64,
+    cache_dir: Optional[str] = None,
+    mode: Optional[str] = None,
+    timeline=None,
+) -> Dict[str, Any]:
+    """Opt-in `torch.compile` of the forward pass with a static KV cache.
+
+    A static cache fixes the KV tensors at `input width + max_new_tokens`,
+    so with inputs padded to `buckets` (see `pad_to_bucket`) and row counts
+    padded to `batch_sizes` (see `batch_size_buckets`) every decode step
+    hits an already-compiled graph. Each (batch size, bucket) pair is
+    generated once here so compilation happens at load time, not on the
+    first request. On a PeftModel the underlying transformers model is
+    compiled and warmed with the adapter both enabled and disabled, since
+    `disable_adapter()` changes the traced graph.
+
+    Any failure during compilation or warmup restores the eager forward and
+    the previous cache setting. Returns a report whose `enabled` is False
+    and `error` set in that case. A compile failure later, on a shape that
+    was not warmed, reverts to eager the same way and reruns that forward
+    eagerly; the report is updated in place with `fallback` set.
+    """
+    import importlib
+    import sys
+    import warnings
+
+    from src.startup import optional_phase
+
+    torch = sys.modules.get("torch") or importlib.import_module("torch")
+    target = model.get_base_model() if hasattr(model, "get_base_model") else model
+    gen_config = getattr(target, "generation_config", None)
+    previous_cache = getattr(gen_config, "cache_implementation", None)
+    had_forward = "forward" in vars(target)
+    eager_forward = target.forward
+    contexts = [contextlib.nullcontext]
+    if hasattr(model, "disable_adapter"):
+        contexts.append(model.disable_adapter)
+    report: Dict[str, Any] = {
+        "enabled": False,
+        "buckets": sorted(buckets),
+        "batch_sizes": sorted(batch_sizes),
+        "adapter_variants": len(contexts),
+        "max_new_tokens": max_new_tokens,
+        "cache_dir": None,
+        "mode": mode,
+        "error": None,
+        "fallback": None,
+    }
+
+    def restore() -> None:
+        if had_forward:
+            target.forward = eager_forward
+        else:
+            vars(target).pop("forward", None)
+        if gen_config is not None:
+            gen_config.cache_implementation = previous_cache
+
+    warming = True
+
+    def guarded_forward(*args, **kwargs):
+        try:
+            return compiled(*args, **kwargs)
+        except Exception as e:
+            if warming:
+                raise
+            restore()
+            report.update(
+                enabled=False, error=f"{type(e).__name__}: {e}", fallback="runtime"
+            )
+            warnings.warn(
+                f"compiled forward failed, reverting to eager: {report['error']}",
+                RuntimeWarning,
+            )
+            return eager_forward(*args, **kwargs)
+
+    start = time.perf_counter()
+    with optional_phase(timeline, "compile_warmup") as entry:
+        try:
+            report["cache_dir"] = str(enable_compile_cache(cache_dir))
+            if mode is None:
+                cuda = getattr(torch, "cuda", None)
+                mode = "reduce-overhead" if cuda and cuda.is_available() else "default"
+                report["mode"] = mode
+            if gen_config is not None:
+                gen_config.cache_implementation = "static"
+            compiled = torch.compile(eager_forward, mode=mode, fullgraph=True)
+            target.forward = guarded_forward
+
+            token_id = getattr(tokenizer, "eos_token_id", None) or 0
+            for context in contexts:
+                for batch_size in report["batch_sizes"]:
+                    for width in report["buckets"]:
+                        ids = torch.full(
+                            (batch_size, width),
+                            token_id,
+                            dtype=torch.long,
+                            device=model.device,
+                        )
+                        with torch.inference_mode(), context():
+                            model.generate(
+                                input_ids=ids,
+                                attention_mask=torch.ones_like(ids),
+                                max_new_tokens=max_new_tokens,
+                                min_new_tokens=min(2, max_new_tokens),
+                                do_sample=False,
+                            )
+            report["enabled"] = True
+        except Exception as e:
+            restore()
+            report["error"] = f"{type(e).__name__}: {e}"
+        warming = False
+        report["warmup_seconds"] = time.perf_counter() - start
+        entry.update(enabled=report["enabled"], error=report["error"])
+    return report
+
+
+def adapter_fingerprint(peft_model_path: str) -> str:
+    """SHA-256 over an adapter directory's file names and contents.
+
+    Identifies adapter weights by content rather than path, so retraining
+    into the same directory yields a new fingerprint.
+    """
+    root = Path(peft_model_path)
+    files = (
+        [root] if root.is_file() else sorted(p for p in root.rglob("*") if p.is_file())
+    )
+    if not files:
+        raise FileNotFoundError(f"No adapter files found under {peft_model_path}")
+    h = hashlib.sha256()
+    for path in files:
+        h.update(str(path.relative_to(root) if path != root else path.name).encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
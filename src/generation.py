@@ -0,0 +1,313 @@
+"""Batched generation engine for evaluation.
+
+Prompts are tokenized once (one batched call), grouped into length-sorted
+micro-batches, left-padded per batch and generated together. Results come
+back in the original prompt order with both an amortized per-item latency
+and the wall time of the batch they ran in.
+
+Heavy dependencies (torch) are imported inside call-sites, mirroring
+`src/evaluation.py`.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from src.evaluation import bucket_length, pad_to_bucket
+from src.generation_cache import GenerationCache, cache_key
+from src.latency import (
+    LATENCY_FIELDS,
+    TimingStreamer,
+    latency_stats,
+    new_token_counts,
+)
+from src.sampling import length_grouped_batches, padding_stats
+
+# Assisted decoding verifies every draft with the target model, so these
+# change speed but not greedy outputs; keep them out of cache keys
+_OUTPUT_NEUTRAL_KWARGS = frozenset(
+    {"assistant_model", "assistant_tokenizer", "tokenizer", "prompt_lookup_num_tokens"}
+)
+
+
+@dataclass
+class GenerationPlan:
+    """Tokenized prompts and their length-sorted micro-batches."""
+
+    input_ids: List[List[int]]
+    batches: List[List[int]]
+
+    @property
+    def lengths(self) -> List[int]:
+        return [len(x) for x in self.input_ids]
+
+
+@dataclass
+class GenerationRun:
+    """Per-item rows (original order) plus suite-level timing summary."""
+
+    rows: List[Dict[str, Any]]
+    summary: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Variant:
+    """A model plus the context it must generate under (e.g. adapter off)."""
+
+    model: Any
+    context: Callable[[], ContextManager] = contextlib.nullcontext
+
+
+def adapter_variants(peft_model) -> Dict[str, Variant]:
+    """Base and adapter variants of one unmerged `PeftModel`.
+
+    "base" runs under `peft_model.disable_adapter()`, so both columns come
+    from a single copy of the base weights.
+    """
+    return {
+        "base": Variant(peft_model, peft_model.disable_adapter),
+        "peft": Variant(peft_model),
+    }
+
+
+@dataclass
+class BatchTiming:
+    """Wall time, time to first token and generated tokens of one batch."""
+
+    elapsed: float
+    ttft: Optional[float]
+    output_tokens: List[int]
+
+    def decode_tps(self, row: int) -> Optional[float]:
+        if self.ttft is None or self.elapsed <= self.ttft:
+            return None
+        return self.output_tokens[row] / (self.elapsed - self.ttft)
+
+
+def _torch():
+    import importlib
+    import sys
+
+    return sys.modules.get("torch") or importlib.import_module("torch")
+
+
+class BatchedGenerator:
+    """Run `generate` over many prompts in length-sorted, left-padded batches."""
+
+    def __init__(
+        self,
+        tokenizer,
+        /,
+        *,
+        batch_size: int = 8,
+        length_buckets: Optional[Sequence[int]] = None,
+        batch_buckets: Optional[Sequence[int]] = None,
+        return_full_text: bool = True,
+        **generate_kwargs: Any,
+    ) -> None:
+        if batch_size <= 0:
+            raise ValueError("batch_size must be > 0")
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        # Pad batches to these widths so a compiled model sees few shapes
+        self.length_buckets = length_buckets
+        # Pad row counts to these sizes (repeating the last row; the extra
+        # outputs are dropped) so a compiled model sees only warmed batch sizes
+        self.batch_buckets = batch_buckets
+        # False decodes only the new tokens (API replies), True prompt + reply
+        self.return_full_text = return_full_text
+        self.generate_kwargs = generate_kwargs
+
+    @property
+    def cache_params(self) -> Dict[str, Any]:
+        """Generation params that can change outputs (the cache key part)."""
+        params = {
+            k: v
+            for k, v in self.generate_kwargs.items()
+            if k not in _OUTPUT_NEUTRAL_KWARGS
+        }
+        if not self.return_full_text:
+            params["return_full_text"] = False
+        return params
+
+    def _samples(self, model: Any) -> bool:
+        """True when `generate` samples (its outputs then depend on batching)."""
+        do_sample = self.generate_kwargs.get("do_sample")
+        if do_sample is None:
+            config = getattr(model, "generation_config", None)
+            do_sample = getattr(config, "do_sample", False)
+        return bool(do_sample)
+
+    def plan(self, prompts: Sequence[str]) -> GenerationPlan:
+        enc = self.tokenizer(
+            list(prompts), padding=False, truncation=False, return_tensors=None
+        )
+        input_ids = [list(x) for x in enc["input_ids"]]
+        batches = length_grouped_batches(
+            [len(x) for x in input_ids], self.batch_size, shuffle=False
+        )
+        return GenerationPlan(input_ids=input_ids, batches=batches)
+
+    def _collate(self, plan: GenerationPlan, batch: Sequence[int], device):
+        rows = [plan.input_ids[i] for i in batch]
+        if self.batch_buckets:
+            rows += [rows[-1]] * (
+                bucket_length(len(rows), self.batch_buckets) - len(rows)
+            )
+        padded = pad_to_bucket(self.tokenizer, rows, self.length_buckets)
+        return {k: v.to(device) for k, v in padded.items()}
+
+    def _generate(
+        self,
+        variant: Variant,
+        plan: GenerationPlan,
+        batch: Sequence[int],
+        seed: Optional[int] = None,
+    ) -> Tuple[List[str], BatchTiming]:
+        torch = _torch()
+        inputs = self._collate(plan, batch, variant.model.device)
+        if seed is not None:
+            torch.manual_seed(seed)
+        ids = inputs["input_ids"]
+        width = ids.shape[-1] if hasattr(ids, "shape") else len(ids[0])
+        streamer = TimingStreamer()
+        with torch.inference_mode(), variant.context():
+            output = variant.model.generate(
+                **inputs, streamer=streamer, **self.generate_kwargs
+            )
+        elapsed = time.perf_counter() - streamer.start
+        output = output[: len(batch)]  # drop batch-bucket filler rows
+        timing = BatchTiming(
+            elapsed=elapsed,
+            ttft=streamer.ttft,
+            output_tokens=new_token_counts(
+                output, width, getattr(self.tokenizer, "pad_token_id", None)
+            ),
+        )
+        if not self.return_full_text:
+            output = [row[width:] for row in output]
+        texts = self.tokenizer.batch_decode(output, skip_special_tokens=True)
+        return texts, timing
+
+    def run(
+        self,
+        prompts: Sequence[str],
+        models: Mapping[str, Any],
+        *,
+        plan: Optional[GenerationPlan] = None,
+        progress: Optional[Callable[[Iterable], Iterable]] = None,
+        cache: Optional[GenerationCache] = None,
+        fingerprints: Optional[Mapping[str, str]] = None,
+        seed: Optional[int] = None,
+        on_batch: Optional[Callable[[List[int], List[Dict[str, Any]]], None]] = None,
+    ) -> GenerationRun:
+        """Generate every prompt with every named model.
+
+        `models` values are models or `Variant`s; every batch is generated
+        once per entry before moving on to the next batch. Rows carry
+        `prompt`, `batch_id`, `batch_size` and, per model name,
+        `<name>_response`, `<name>_latency` (batch wall time / batch size)
+        and `<name>_batch_time`, plus `<name>_ttft` (batch time to first
+        token), `<name>_input_tokens`, `<name>_output_tokens` and
+        `<name>_decode_tps` (row tokens / post-prefill batch time).
+
+        With a `cache`, `fingerprints[name]` identifies each model's weights;
+        only cache misses are generated (hits get `<name>_cached=True` and no
+        latency), and fresh responses are written back. The cache is only
+        used for models that decode deterministically: a sampled response
+        depends on the seed's RNG stream across the whole batch, so it cannot
+        be reproduced per prompt and is neither read nor stored.
+
+        `on_batch(indices, rows)` is called as each batch completes; its rows
+        are then released, so `run.rows` only keeps rows when it is unset.
+        Their latency columns are kept so `summary["latency"]` still covers
+        every row.
+        """
+        if cache is not None and not fingerprints:
+            raise ValueError("fingerprints are required when a cache is given")
+        plan = plan or self.plan(prompts)
+        rows: List[Optional[Dict[str, Any]]] = [{"prompt": p} for p in prompts]
+        totals = {name: 0.0 for name in models}
+        generated = {name: 0 for name in models}
+        timing_keys = [f"{n}_{f}" for n in models for f in LATENCY_FIELDS]
+        timed: List[Dict[str, Any]] = []
+        batches: Iterable = plan.batches
+        if progress is not None:
+            batches = progress(plan.batches)
+
+        for batch_id, batch in enumerate(batches):
+            for name, entry in models.items():
+                variant = entry if isinstance(entry, Variant) else Variant(entry)
+                todo = list(batch)
+                keys: Dict[int, str] = {}
+                cached = cache is not None and not self._samples(variant.model)
+                if cached:
+                    keys = {
+                        i: cache_key(
+                            fingerprints[name], prompts[i], self.cache_params, seed
+                        )
+                        for i in batch
+                    }
+                    hits = cache.get_many([keys[i] for i in batch])
+                    todo = [i for i in batch if keys[i] not in hits]
+                    for i in batch:
+                        rows[i][f"{name}_cached"] = i not in todo
+                        if i not in todo:
+                            rows[i][f"{name}_response"] = hits[keys[i]]
+                            rows[i][f"{name}_latency"] = None
+                            rows[i][f"{name}_batch_time"] = None
+                if not todo:
+                    continue
+                texts, timing = self._generate(variant, plan, todo, seed)
+                totals[name] += timing.elapsed
+                generated[name] += len(todo)
+                for j, idx in enumerate(todo):
+                    rows[idx][f"{name}_response"] = texts[j]
+                    rows[idx][f"{name}_latency"] = timing.elapsed / len(todo)
+                    rows[idx][f"{name}_batch_time"] = timing.elapsed
+                    rows[idx][f"{name}_ttft"] = timing.ttft
+                    rows[idx][f"{name}_input_tokens"] = plan.lengths[idx]
+                    rows[idx][f"{name}_output_tokens"] = timing.output_tokens[j]
+                    rows[idx][f"{name}_decode_tps"] = timing.decode_tps(j)
+                if cached:
+                    cache.put_many((keys[i], texts[j]) for j, i in enumerate(todo))
+            for idx in batch:
+                rows[idx]["batch_id"] = batch_id
+                rows[idx]["batch_size"] = len(batch)
+            if on_batch is not None:
+                on_batch(list(batch), [rows[i] for i in batch])
+                for idx in batch:
+                    timed.append({k: rows[idx].get(k) for k in timing_keys})
+                    rows[idx] = None
+
+        summary: Dict[str, Any] = {
+            "items": len(prompts),
+            "batch_size": self.batch_size,
+            "batches": len(plan.batches),
+            "prompt_padding": padding_stats(plan.lengths, plan.batches),
+        }
+        for name, total in totals.items():
+            summary[name] = {
+                "generated": generated[name],
+                "wall_time": total,
+                "items_per_sec": generated[name] / total if total else 0.0,
+            }
+        rows = [r for r in rows if r is not None]
+        summary["latency"] = latency_stats(rows + timed, models)
+        if cache is not None:
+            summary["cache"] = cache.report()
+        return GenerationRun(rows=rows, summary=summary)
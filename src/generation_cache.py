@@ -0,0 +1,125 @@
+"""Persistent cache of generated responses for repeated evaluation runs.
+
+Entries live in one SQLite file and are keyed by a SHA-256 over
+(model/adapter fingerprint, prompt, generation params, seed), so any change
+to the weights, decoding settings or seed is a cache miss rather than a
+stale hit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple, Union
+
+from src.merge_cache import local_revision
+
+CACHE_FILENAME = "generations.sqlite"
+
+
+def model_fingerprint(
+    base_model_name: str,
+    model=None,
+    *,
+    quantization: Union[bool, str] = False,
+    adapter_fingerprint: Optional[str] = None,
+) -> str:
+    """Fingerprint of the weights a response was generated with.
+
+    Uses the hub commit hash recorded on `model.config`, or for a local
+    checkpoint directory (which has none) a stat fingerprint of its files,
+    so an updated checkpoint under the same name does not reuse old entries.
+    """
+    revision = getattr(getattr(model, "config", None), "_commit_hash", None)
+    if revision is None and Path(base_model_name).is_dir():
+        revision = local_revision(base_model_name)
+    payload = {
+        "base": base_model_name,
+        "revision": revision,
+        # A backend name ("nf4", "int8-dynamic") keeps their outputs apart
+        "quantization": (
+            quantization if isinstance(quantization, str) else bool(quantization)
+        ),
+        "adapter": adapter_fingerprint,
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def cache_key(
+    fingerprint: str,
+    prompt: str,
+    params: Mapping[str, Any],
+    seed: Optional[int],
+) -> str:
+    payload = json.dumps(
+        {"model": fingerprint, "prompt": prompt, "params": params, "seed": seed},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """SQLite-backed `key -> response` store with hit/miss counters."""
+
+    def __init__(self, path: Path | str) -> None:
+        path = Path(path)
+        if path.suffix != ".sqlite":
+            path = path / CACHE_FILENAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(str(path), timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        """Look up `keys`; counts every key as a hit or a miss."""
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), 500):
+            chunk = unique[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, response FROM generations WHERE key IN ({marks})",
+                chunk,
+            )
+            found.update(rows.fetchall())
+        hits = sum(1 for k in keys if k in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO generations (key, response, created) "
+            "VALUES (?, ?, ?)",
+            [(k, v, now) for k, v in items],
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0])
+
+    def report(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self) -> None:
+        self._conn.close()
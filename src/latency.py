@@ -0,0 +1,84 @@
+"""Generation latency instrumentation.
+
+`TimingStreamer` implements the `transformers` streamer protocol
+(`put`/`end`). `generate` first puts the prompt ids and then one step of
+new tokens per decode iteration, so the time of the second `put` marks the
+first generated token (end of prefill). That separates time-to-first-token
+from decode throughput without changing how `generate` runs.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class TimingStreamer:
+    """Record when the first generated token and the end of generation arrive."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self._puts = 0
+
+    def put(self, value: Any) -> None:
+        self._puts += 1
+        # The first put is the prompt itself
+        if self._puts == 2:
+            self.first_token_time = time.perf_counter()
+
+    def end(self) -> None:
+        self.end_time = time.perf_counter()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start
+
+
+def new_token_counts(
+    output: Any, prompt_width: int, pad_id: Optional[int]
+) -> List[int]:
+    """Generated tokens per row, excluding padding after EOS.
+
+    With `pad_token = eos_token` (set by `load_model_and_tokenizer`) the EOS
+    itself is not counted either.
+    """
+    rows = output.tolist() if hasattr(output, "tolist") else output
+    return [sum(1 for t in row[prompt_width:] if t != pad_id) for row in rows]
+
+
+def latency_summary(values: Iterable[Optional[float]]) -> Dict[str, float]:
+    """p50/p90/p99, mean and count of the non-missing values."""
+    arr = np.asarray([v for v in values if v is not None], dtype=np.float64)
+    if arr.size == 0:
+        return {"count": 0}
+    out = {
+        f"p{q}": float(v)
+        for q, v in zip(LATENCY_PERCENTILES, np.percentile(arr, LATENCY_PERCENTILES))
+    }
+    out["mean"] = float(arr.mean())
+    out["count"] = int(arr.size)
+    return out
+
+
+LATENCY_FIELDS = ("latency", "ttft", "decode_tps", "input_tokens", "output_tokens")
+
+
+def latency_stats(
+    rows: Sequence[Dict[str, Any]], names: Iterable[str]
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per-model percentile summaries of the instrumented row columns."""
+    return {
+        name: {
+            field: latency_summary(r.get(f"{name}_{field}") for r in rows)
+            for field in LATENCY_FIELDS
+        }
+        for name in names
+    }
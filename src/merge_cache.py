@@ -0,0 +1,310 @@
+"""On-disk cache of merged (base + adapter) weights.
+
+`merge_and_unload()` rewrites every adapted Linear layer, which takes
+seconds to minutes for 7B models on CPU. The merged result is stored once
+as safetensors (plus tokenizer files) under a key of base model revision,
+adapter content hash and dtype, and later loads read it directly with the
+fast-load path instead of loading the base, attaching and merging.
+
+A JSON manifest records per-file SHA-256 digests and sizes; a cached entry
+that fails verification is discarded and rebuilt. Lookups from the
+environment check sizes only by default, since re-hashing a 7B checkpoint
+on every startup costs much of what the cache saves. Total size is bounded by
+evicting least-recently-used entries.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+MERGE_CACHE_DIR_ENV = "SUPPORTBOT_MERGE_CACHE_DIR"
+MERGE_CACHE_MB_ENV = "SUPPORTBOT_MERGE_CACHE_MB"
+MERGE_CACHE_VERIFY_ENV = "SUPPORTBOT_MERGE_CACHE_VERIFY"
+DEFAULT_MERGE_CACHE_DIR = "results/merge_cache"
+DEFAULT_MAX_MB = 32 * 1024  # about two 7B merges in bfloat16
+MANIFEST = "manifest.json"
+
+_HASH_BLOCK = 16 * 1024 * 1024
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(_HASH_BLOCK):
+            h.update(block)
+    return h.hexdigest()
+
+
+def local_revision(path: str | Path) -> str:
+    """Stat fingerprint of a local checkpoint directory.
+
+    Local directories have no commit hash, so file names, sizes and mtimes
+    stand in for one; rewriting the checkpoint changes the revision.
+    """
+    path = Path(path)
+    h = hashlib.sha256()
+    for f in sorted(p for p in path.rglob("*") if p.is_file()):
+        st = f.stat()
+        h.update(f"{f.relative_to(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return "local-" + h.hexdigest()[:16]
+
+
+def base_revision(base_model_name: str) -> str:
+    """Commit hash of a hub checkpoint, or `local_revision` of a local dir."""
+    if Path(base_model_name).is_dir():
+        return local_revision(base_model_name)
+    import importlib
+    import sys
+
+    transformers = sys.modules.get("transformers") or importlib.import_module(
+        "transformers"
+    )
+    config = transformers.AutoConfig.from_pretrained(base_model_name)
+    return getattr(config, "_commit_hash", None) or "unknown"
+
+
+def merge_key(
+    base_model_name: str, revision: str, adapter: str, dtype: Optional[str]
+) -> str:
+    payload = json.dumps(
+        [base_model_name, revision, adapter, dtype or "auto"], separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class MergeCache:
+    """Directory of merged checkpoints plus a manifest, bounded by `max_bytes`.
+
+    `verify="sha256"` re-hashes every file on lookup; `"size"` only checks
+    file sizes, trading integrity for a faster hit on very large models.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = DEFAULT_MERGE_CACHE_DIR,
+        *,
+        max_bytes: Optional[int] = DEFAULT_MAX_MB * 1024 * 1024,
+        verify: str = "sha256",
+    ) -> None:
+        if verify not in {"sha256", "size"}:
+            raise ValueError(f"verify must be 'sha256' or 'size', got {verify!r}")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.hits = 0
+        self.misses = 0
+        self.corrupt = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialize manifest updates across threads and, on POSIX, processes."""
+        with self._lock, open(self.root / ".lock", "a") as fh:
+            try:
+                import fcntl
+
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            except ImportError:
+                pass
+            yield
+
+    def _read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.root / MANIFEST, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        tmp = self.root / (MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, self.root / MANIFEST)
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key
+
+    def _verify(self, key: str, entry: Dict[str, Any]) -> bool:
+        path = self.path_for(key)
+        for name, meta in entry.get("files", {}).items():
+            f = path / name
+            if not f.is_file() or f.stat().st_size != meta["bytes"]:
+                return False
+            if self.verify == "sha256" and _sha256_file(f) != meta["sha256"]:
+                return False
+        return bool(entry.get("files"))
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Verified checkpoint directory for `key`, or None (corrupt entries are dropped)."""
+        with self._locked():
+            manifest = self._read_manifest()
+            entry = manifest.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if not self._verify(key, entry):
+                self.corrupt += 1
+                self.misses += 1
+                manifest.pop(key)
+                shutil.rmtree(self.path_for(key), ignore_errors=True)
+                self._write_manifest(manifest)
+                return None
+            entry["last_used"] = time.time()
+            self._write_manifest(manifest)
+            self.hits += 1
+            return self.path_for(key)
+
+    def store(self, key: str, model, tokenizer, **meta: Any) -> Path:
+        """Save `model` as safetensors (and `tokenizer`) under `key`."""
+        tmp = Path(tempfile.mkdtemp(prefix=f".{key}.", dir=self.root))
+        try:
+            model.save_pretrained(tmp, safe_serialization=True)
+            if tokenizer is not None:
+                tokenizer.save_pretrained(tmp)
+            files = {
+                str(f.relative_to(tmp)): {
+                    "bytes": f.stat().st_size,
+                    "sha256": _sha256_file(f),
+                }
+                for f in sorted(tmp.rglob("*"))
+                if f.is_file()
+            }
+            with self._locked():
+                final = self.path_for(key)
+                shutil.rmtree(final, ignore_errors=True)
+                os.replace(tmp, final)
+                manifest = self._read_manifest()
+                now = time.time()
+                manifest[key] = {
+                    **meta,
+                    "files": files,
+                    "bytes": sum(m["bytes"] for m in files.values()),
+                    "created": now,
+                    "last_used": now,
+                }
+                self._enforce_budget(manifest, keep=key)
+                self._write_manifest(manifest)
+            return final
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _enforce_budget(self, manifest: Dict[str, Dict[str, Any]], keep: str) -> None:
+        if self.max_bytes is None:
+            return
+        by_age = sorted(manifest, key=lambda k: manifest[k]["last_used"])
+        total = sum(e["bytes"] for e in manifest.values())
+        for key in by_age:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= manifest.pop(key)["bytes"]
+            shutil.rmtree(self.path_for(key), ignore_errors=True)
+            self.evictions += 1
+
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._read_manifest().values())
+
+    def __len__(self) -> int:
+        return len(self._read_manifest())
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "dir": str(self.root),
+            "entries": len(self),
+            "total_mb": self.total_bytes() / (1024 * 1024),
+            "max_mb": self.max_bytes / (1024 * 1024) if self.max_bytes else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "corrupt": self.corrupt,
+            "evictions": self.evictions,
+        }
+
+
+def merge_cache_from_env() -> Optional[MergeCache]:
+    """Cache at $SUPPORTBOT_MERGE_CACHE_DIR; None if that is set to an empty string.
+
+    $SUPPORTBOT_MERGE_CACHE_VERIFY picks the lookup check: "size" (default)
+    or "sha256" for a full re-hash of every file.
+    """
+    root = os.getenv(MERGE_CACHE_DIR_ENV, DEFAULT_MERGE_CACHE_DIR)
+    if not root:
+        return None
+    mb = os.getenv(MERGE_CACHE_MB_ENV)
+    max_mb = float(mb) if mb else DEFAULT_MAX_MB
+    verify = os.getenv(MERGE_CACHE_VERIFY_ENV) or "size"
+    return MergeCache(root, max_bytes=int(max_mb * 1024 * 1024), verify=verify)
+
+
+def load_merged(
+    base_model_name: str,
+    peft_model_path: str,
+    *,
+    cache: MergeCache,
+    adapter: Optional[str] = None,
+    dtype: Optional[str] = "bfloat16",
+    fast_load: bool = False,
+    prefetch: bool = False,
+    tokenizer_name: Optional[str] = None,
+    timeline=None,
+):
+    """Load base + adapter merged, reading/writing the merged-weight cache.
+
+    Returns `(model, tokenizer, hit)`. A hit loads the cached safetensors
+    with the fast-load path and skips PEFT entirely.
+    """
+    from src.evaluation import (
+        adapter_fingerprint,
+        load_model_and_tokenizer,
+        load_peft_model,
+    )
+    from src.startup import optional_phase
+
+    adapter = adapter or adapter_fingerprint(peft_model_path)
+    revision = base_revision(base_model_name)
+    key = merge_key(base_model_name, revision, adapter, dtype)
+    with optional_phase(timeline, "merge_cache_lookup", key=key):
+        cached = cache.lookup(key)
+    if cached is not None:
+        model, tokenizer = load_model_and_tokenizer(
+            str(cached),
+            False,
+            dtype=dtype,
+            fast_load=True,
+            prefetch=prefetch,
+            timeline=timeline,
+        )
+        return model, tokenizer, True
+
+    model, tokenizer = load_model_and_tokenizer(
+        base_model_name,
+        False,
+        dtype=dtype,
+        fast_load=fast_load,
+        prefetch=prefetch,
+        tokenizer_name=tokenizer_name,
+        timeline=timeline,
+    )
+    model = load_peft_model(model, peft_model_path, merge=True, timeline=timeline)
+    with optional_phase(timeline, "merge_cache_store", key=key):
+        cache.store(
+            key,
+            model,
+            tokenizer,
+            base_model_name=base_model_name,
+            revision=revision,
+            adapter=adapter,
+            dtype=dtype,
+        )
+    return model, tokenizer, False
@@ -0,0 +1,315 @@
+"""In-process model registry shared by eval, demo and the API.
+
+Loaded (model, tokenizer) pairs are cached under
+`(base model, quantization, adapter content hash, dtype, merged)`. A
+repeated request returns the resident instance instead of re-reading
+weights. A memory budget is enforced with least-recently-used eviction,
+ahead of a load when the checkpoint size can be estimated.
+
+Entries never share base weights. `PeftModel.from_pretrained` injects
+adapter layers into the base modules, and merging rewrites them, so an
+adapter entry loads its own base copy.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+MEMORY_BUDGET_ENV = "SUPPORTBOT_MODEL_MEMORY_MB"
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    base_model_name: str
+    quantization: Union[bool, str] = False
+    adapter: Optional[str] = None  # adapter content fingerprint
+    dtype: Optional[str] = "bfloat16"
+    merged: bool = True
+
+
+@dataclass
+class RegistryEntry:
+    key: ModelKey
+    model: Any
+    tokenizer: Any
+    load_time: float
+    resident_bytes: int
+    hits: int = 0
+
+
+def _nbytes(t) -> int:
+    return t.numel() * t.element_size() if t is not None else 0
+
+
+def resident_bytes(model) -> int:
+    """Bytes held by a torch module's weights (0 if unknown).
+
+    Counts parameters and buffers, plus the int8 weights and biases that
+    dynamically quantized Linear layers keep in `_packed_params`, which are
+    neither.
+    """
+    total = 0
+    for attr in ("parameters", "buffers"):
+        fn = getattr(model, attr, None)
+        if fn is None:
+            continue
+        for t in fn():
+            total += _nbytes(t)
+    for module in getattr(model, "modules", lambda: ())():
+        packed = getattr(module, "_packed_params", None)
+        if hasattr(packed, "_weight_bias"):
+            total += sum(_nbytes(t) for t in packed._weight_bias())
+    return total
+
+
+def estimate_bytes(key: ModelKey, peft_model_path: Optional[str] = None) -> int:
+    """Pre-load size guess: the checkpoint's local safetensors bytes (0 if unknown).
+
+    Quantized loads end up smaller than this, so the guess errs towards
+    evicting early rather than overshooting the budget.
+    """
+    from src.startup import safetensors_files
+
+    return sum(f.stat().st_size for f in safetensors_files(key.base_model_name))
+
+
+def _default_loader(
+    key: ModelKey,
+    peft_model_path: Optional[str],
+    *,
+    fast_load: bool = False,
+    prefetch: bool = False,
+    merge_cache: bool = True,
+    tokenizer_name: Optional[str] = None,
+    timeline=None,
+):
+    from src.evaluation import (
+        load_model_and_tokenizer,
+        load_peft_model,
+        quantize_after_adapter,
+    )
+
+    # Merged adapters come from the on-disk merge cache when possible;
+    # 4-bit bases are skipped because their merges cannot be saved losslessly.
+    if peft_model_path and key.merged and not key.quantization and merge_cache:
+        from src.merge_cache import load_merged, merge_cache_from_env
+
+        cache = merge_cache_from_env()
+        if cache is not None:
+            model, tokenizer, _ = load_merged(
+                key.base_model_name,
+                peft_model_path,
+                cache=cache,
+                adapter=key.adapter,
+                dtype=key.dtype,
+                fast_load=fast_load,
+                prefetch=prefetch,
+                tokenizer_name=tokenizer_name,
+                timeline=timeline,
+            )
+            return model, tokenizer
+
+    model, tokenizer = load_model_and_tokenizer(
+        key.base_model_name,
+        key.quantization,
+        dtype=key.dtype,
+        fast_load=fast_load,
+        prefetch=prefetch,
+        defer_quantization=bool(peft_model_path),
+        tokenizer_name=tokenizer_name,
+        timeline=timeline,
+    )
+    if peft_model_path:
+        model = load_peft_model(
+            model, peft_model_path, merge=key.merged, timeline=timeline
+        )
+        quantize_after_adapter(model, key.quantization, timeline=timeline)
+    return model, tokenizer
+
+
+class ModelRegistry:
+    """LRU cache of loaded models bounded by `memory_budget_bytes`.
+
+    On a miss, entries are evicted to make room for `estimator`'s size guess
+    before the loader runs, so the old and new weights do not overlap in
+    memory. When the guess is 0 (no local checkpoint files) the budget only
+    holds once the load finishes. The newest entry is always kept, even if
+    it alone exceeds the budget.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: Optional[int] = None,
+        *,
+        loader: Callable[..., Tuple[Any, Any]] = _default_loader,
+        estimator: Callable[[ModelKey, Optional[str]], int] = estimate_bytes,
+    ) -> None:
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loader = loader
+        self._estimator = estimator
+        self._entries: "OrderedDict[ModelKey, RegistryEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def key_for(
+        self,
+        base_model_name: str,
+        *,
+        quantization: Union[bool, str] = False,
+        peft_model_path: Optional[str] = None,
+        dtype: Optional[str] = "bfloat16",
+        merge: bool = True,
+    ) -> ModelKey:
+        adapter = None
+        if peft_model_path:
+            from src.evaluation import adapter_fingerprint
+
+            adapter = adapter_fingerprint(peft_model_path)
+        return ModelKey(
+            base_model_name=base_model_name,
+            quantization=(
+                quantization if isinstance(quantization, str) else bool(quantization)
+            ),
+            adapter=adapter,
+            dtype=dtype,
+            merged=bool(merge) if adapter else True,
+        )
+
+    def get(
+        self,
+        base_model_name: str,
+        *,
+        quantization: Union[bool, str] = False,
+        peft_model_path: Optional[str] = None,
+        dtype: Optional[str] = "bfloat16",
+        merge: bool = True,
+        fast_load: bool = False,
+        prefetch: bool = False,
+        merge_cache: bool = True,
+        tokenizer_name: Optional[str] = None,
+        timeline=None,
+    ) -> Tuple[Any, Any]:
+        """Return a resident (model, tokenizer), loading it on a miss.
+
+        `fast_load`, `prefetch`, `merge_cache`, `tokenizer_name` and
+        `timeline` only affect how a miss is loaded, not which weights are
+        loaded, so they are not part of the key.
+        """
+        key = self.key_for(
+            base_model_name,
+            quantization=quantization,
+            peft_model_path=peft_model_path,
+            dtype=dtype,
+            merge=merge,
+        )
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.hits += 1
+                self._entries.move_to_end(key)
+                return entry.model, entry.tokenizer
+
+            if self.memory_budget_bytes is not None:
+                self._enforce_budget(reserve=self._estimator(key, peft_model_path))
+            start = time.perf_counter()
+            model, tokenizer = self._loader(
+                key,
+                peft_model_path,
+                fast_load=fast_load,
+                prefetch=prefetch,
+                merge_cache=merge_cache,
+                tokenizer_name=tokenizer_name,
+                timeline=timeline,
+            )
+            entry = RegistryEntry(
+                key=key,
+                model=model,
+                tokenizer=tokenizer,
+                load_time=time.perf_counter() - start,
+                resident_bytes=resident_bytes(model),
+            )
+            self._entries[key] = entry
+            self._enforce_budget()
+            return model, tokenizer
+
+    @property
+    def resident_total(self) -> int:
+        return sum(e.resident_bytes for e in self._entries.values())
+
+    def _enforce_budget(self, reserve: int = 0) -> None:
+        """Evict LRU entries until `reserve` more bytes fit the budget.
+
+        Without a reservation the newest entry is never evicted.
+        """
+        if self.memory_budget_bytes is None:
+            return
+        keep = 0 if reserve else 1
+        while (
+            len(self._entries) > keep
+            and self.resident_total + reserve > self.memory_budget_bytes
+        ):
+            key = next(iter(self._entries))
+            self.evict(key)
+
+    def evict(self, key: ModelKey) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return
+            self.evictions += 1
+        gc.collect()
+        # Only touch torch if a model was ever loaded through it
+        cuda = getattr(sys.modules.get("torch"), "cuda", None)
+        if cuda is not None and cuda.is_available():
+            cuda.empty_cache()
+
+    def clear(self) -> None:
+        for key in list(self._entries):
+            self.evict(key)
+
+    def __contains__(self, key: ModelKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def report(self) -> Dict[str, Any]:
+        mb = 1024 * 1024
+        return {
+            "memory_budget_mb": (
+                self.memory_budget_bytes / mb if self.memory_budget_bytes else None
+            ),
+            "resident_mb": self.resident_total / mb,
+            "evictions": self.evictions,
+            "entries": [
+                {
+                    "base_model_name": e.key.base_model_name,
+                    "quantization": e.key.quantization,
+                    "adapter": e.key.adapter,
+                    "dtype": e.key.dtype,
+                    "merged": e.key.merged,
+                    "load_time": e.load_time,
+                    "resident_mb": e.resident_bytes / mb,
+                    "hits": e.hits,
+                }
+                for e in self._entries.values()
+            ],
+        }
+
+
+_REGISTRY: Optional[ModelRegistry] = None
+
+
+def get_registry() -> ModelRegistry:
+    """Process-wide registry; budget from $SUPPORTBOT_MODEL_MEMORY_MB if set."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        budget = os.getenv(MEMORY_BUDGET_ENV)
+        _REGISTRY = ModelRegistry(int(float(budget) * 1024 * 1024) if budget else None)
+    return _REGISTRY
@@ -0,0 +1,231 @@
+"""Sequence packing for SFT training.
+
+Short support Q&A pairs leave most of a fixed-length row as padding. Packing
+concatenates several tokenized examples into rows of exactly `max_length`
+tokens, keeping example boundaries explicit:
+
+- `position_ids` restart at 0 for every example, which flash-attention
+  kernels use to keep attention within each example.
+- the first label of every example is masked so the loss never predicts
+  across a boundary.
+- `seq_lengths` per row let `PackedCollator` build a 4D block-diagonal
+  attention mask for sdpa/eager attention, which ignore `position_ids`
+  resets and would otherwise attend across examples.
+"""
+
+from __future__ import annotations
+
+import bisect
+import importlib
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+from src.tokenization import IGNORE_INDEX
+
+
+@dataclass
+class PackedSequences:
+    input_ids: List[List[int]]
+    labels: List[List[int]]
+    position_ids: List[List[int]]
+    seq_lengths: List[List[int]]
+
+
+def _assign_bins(lengths: Sequence[int], max_length: int) -> List[List[int]]:
+    """Best-fit decreasing bin assignment; returns example indices per row.
+
+    Examples are visited longest first (ties by original index, so the
+    result is deterministic) and placed into the open row with the smallest
+    remaining capacity that still fits.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    bins: List[List[int]] = []
+    # Sorted (remaining_capacity, bin_index) pairs for open rows
+    free: List[Tuple[int, int]] = []
+    for i in order:
+        n = lengths[i]
+        pos = bisect.bisect_left(free, (n, -1))
+        if pos < len(free):
+            remaining, b = free.pop(pos)
+        else:
+            remaining, b = max_length, len(bins)
+            bins.append([])
+        bins[b].append(i)
+        remaining -= n
+        if remaining > 0:
+            bisect.insort(free, (remaining, b))
+    return bins
+
+
+def plan_rows(lengths: Sequence[int], max_length: int) -> List[List[int]]:
+    """Example indices of every packed row, in original order within a row.
+
+    Lengths are clipped to `max_length` (examples are truncated when packed)
+    and empty examples are dropped.
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    clipped = [min(int(n), max_length) for n in lengths]
+    rows = []
+    for members in _assign_bins(clipped, max_length):
+        members = sorted(m for m in members if clipped[m] > 0)
+        if members:
+            rows.append(members)
+    return rows
+
+
+def pack_row(
+    input_ids: Sequence[Sequence[int]],
+    labels: Sequence[Sequence[int]],
+    *,
+    max_length: int,
+    pad_id: int = 0,
+) -> Tuple[List[int], List[int], List[int], List[int]]:
+    """Concatenate one row's examples into `(input_ids, labels, position_ids, seq_lengths)`."""
+    row_ids: List[int] = []
+    row_labels: List[int] = []
+    row_pos: List[int] = []
+    seq_lengths: List[int] = []
+    for k, (ids, labs) in enumerate(zip(input_ids, labels)):
+        if len(ids) != len(labs):
+            raise ValueError("input_ids and labels differ in length")
+        ids, labs = list(ids)[:max_length], list(labs)[:max_length]
+        if k > 0:
+            labs[0] = IGNORE_INDEX
+        row_ids.extend(ids)
+        row_labels.extend(labs)
+        row_pos.extend(range(len(ids)))
+        seq_lengths.append(len(ids))
+    if len(row_ids) > max_length:
+        raise ValueError("examples do not fit in one row")
+    pad = max_length - len(row_ids)
+    row_ids.extend([pad_id] * pad)
+    row_labels.extend([IGNORE_INDEX] * pad)
+    row_pos.extend(range(pad))
+    return row_ids, row_labels, row_pos, seq_lengths
+
+
+def pack_examples(
+    input_ids: Sequence[Sequence[int]],
+    labels: Sequence[Sequence[int]],
+    *,
+    max_length: int,
+    pad_id: int = 0,
+) -> PackedSequences:
+    """Pack variable-length examples into rows of exactly `max_length` tokens.
+
+    Examples longer than `max_length` are right-truncated. Rows are filled
+    with best-fit decreasing; any remaining tail is padded with `pad_id`
+    (label IGNORE_INDEX).
+    """
+    if max_length <= 0:
+        raise ValueError("max_length must be > 0")
+    if len(input_ids) != len(labels):
+        raise ValueError("input_ids and labels must have the same length")
+    for i, (a, b) in enumerate(zip(input_ids, labels)):
+        if len(a) != len(b):
+            raise ValueError(f"example {i}: input_ids and labels differ in length")
+
+    out = PackedSequences(input_ids=[], labels=[], position_ids=[], seq_lengths=[])
+    for members in plan_rows([len(x) for x in input_ids], max_length):
+        ids, labs, pos, lens = pack_row(
+            [input_ids[m] for m in members],
+            [labels[m] for m in members],
+            max_length=max_length,
+            pad_id=pad_id,
+        )
+        out.input_ids.append(ids)
+        out.labels.append(labs)
+        out.position_ids.append(pos)
+        out.seq_lengths.append(lens)
+    return out
+
+
+def segment_ids(seq_lengths: Sequence[int], max_length: int) -> List[int]:
+    """Example index of every position in a packed row; padding is -1."""
+    seg: List[int] = []
+    for k, n in enumerate(seq_lengths):
+        seg.extend([k] * n)
+    return seg + [-1] * (max_length - len(seg))
+
+
+def block_diagonal_mask(
+    seq_lengths: Sequence[Sequence[int]], max_length: int, dtype: Any = None
+):
+    """Causal block-diagonal 4D mask `(batch, 1, L, L)` for packed rows.
+
+    Token i attends to token j only when both belong to the same example and
+    j <= i. The mask is additive (0 = attend, dtype minimum = blocked), the
+    form transformers uses as-is for a custom 4D `attention_mask`. Padding
+    positions attend only to themselves so no softmax row is empty.
+    """
+    torch = sys.modules.get("torch") or importlib.import_module("torch")
+    dtype = dtype or torch.float32
+    seg = torch.tensor([segment_ids(lens, max_length) for lens in seq_lengths])
+    same = seg[:, :, None] == seg[:, None, :]
+    causal = torch.ones(max_length, max_length, dtype=torch.bool).tril()
+    allowed = (same & causal & (seg >= 0)[:, :, None]) | torch.eye(
+        max_length, dtype=torch.bool
+    )
+    mask = torch.zeros(allowed.shape, dtype=dtype)
+    mask.masked_fill_(~allowed, torch.finfo(dtype).min)
+    return mask[:, None, :, :]
+
+
+class PackedCollator:
+    """Stack packed rows into tensors for a plain `Trainer`.
+
+    With `block_mask=True` (any attention backend except flash_attention_2)
+    the batch carries a `block_diagonal_mask` built from each row's
+    `seq_lengths`; `dtype` should match the model's compute dtype, since
+    sdpa rejects a float mask of another dtype. With `block_mask=False` the
+    `position_ids` resets alone separate examples.
+    """
+
+    def __init__(self, *, block_mask: bool = True, dtype: Any = None) -> None:
+        self.block_mask = block_mask
+        self.dtype = dtype
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, Any]:
+        torch = sys.modules.get("torch") or importlib.import_module("torch")
+        batch = {
+            key: torch.tensor([f[key] for f in features], dtype=torch.long)
+            for key in ("input_ids", "labels", "position_ids")
+        }
+        if self.block_mask:
+            batch["attention_mask"] = block_diagonal_mask(
+                [f["seq_lengths"] for f in features],
+                batch["input_ids"].shape[1],
+                self.dtype,
+            )
+        return batch
+
+
+def packing_report(
+    lengths: Sequence[int], packed: Union[PackedSequences, int], *, max_length: int
+) -> Dict[str, float]:
+    """Summarize packing efficiency against one padded row per example.
+
+    `packed` is the packed result or just its row count. Compute per step is
+    proportional to rows * max_length, so the expected gain in useful
+    tokens/sec equals the reduction in row count.
+    """
+    n = len(lengths)
+    real_tokens = sum(min(int(x), max_length) for x in lengths)
+    rows = packed if isinstance(packed, int) else len(packed.input_ids)
+    unpacked_capacity = n * max_length
+    packed_capacity = rows * max_length
+    return {
+        "num_examples": n,
+        "max_length": max_length,
+        "real_tokens": real_tokens,
+        "rows_unpacked": n,
+        "rows_packed": rows,
+        "efficiency_unpacked": (
+            real_tokens / unpacked_capacity if unpacked_capacity else 0.0
+        ),
+        "efficiency_packed": real_tokens / packed_capacity if packed_capacity else 0.0,
+        "avg_examples_per_row": n / rows if rows else 0.0,
+        "expected_tokens_per_sec_gain": n / rows if rows else 1.0,
+    }
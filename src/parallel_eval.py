@@ -0,0 +1,303 @@
+"""Multi-process CPU evaluation with one pinned model replica per worker.
+
+A single `generate` loop does not saturate a many-core host: intra-op
+parallelism tails off for small models. Running N replicas, each pinned to a
+disjoint core set with a matching `torch.set_num_threads`, keeps every core
+busy. The suite is dealt out by token length, so shards carry similar work,
+and rows stream back to the parent, which owns the results file.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_sets(
+    num_workers: int, cores: Optional[Sequence[int]] = None
+) -> List[List[int]]:
+    """Split `cores` into `num_workers` disjoint, contiguous, near-equal sets."""
+    cores = list(cores if cores is not None else available_cores())
+    if num_workers <= 0:
+        raise ValueError("num_workers must be > 0")
+    if num_workers > len(cores):
+        raise ValueError(
+            f"num_workers={num_workers} exceeds {len(cores)} available cores"
+        )
+    base, extra = divmod(len(cores), num_workers)
+    sets, start = [], 0
+    for w in range(num_workers):
+        size = base + (1 if w < extra else 0)
+        sets.append(cores[start : start + size])
+        start += size
+    return sets
+
+
+def shard_by_length(lengths: Sequence[int], num_workers: int) -> List[List[int]]:
+    """Deal indices out in descending length order, snaking across workers.
+
+    Alternating the dealing direction each round gives every shard a similar
+    token total; shards stay length-sorted, so each worker's length-grouped
+    batches pad as little as the single-process run.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    shards: List[List[int]] = [[] for _ in range(num_workers)]
+    for pos, idx in enumerate(order):
+        rnd, slot = divmod(pos, num_workers)
+        shards[slot if rnd % 2 == 0 else num_workers - 1 - slot].append(idx)
+    return shards
+
+
+def pin_worker(cores: Sequence[int]) -> None:
+    """Pin this process to `cores` and size torch's thread pools to match."""
+    import importlib
+    import sys
+
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, set(cores))
+    torch = sys.modules.get("torch") or importlib.import_module("torch")
+    torch.set_num_threads(len(cores))
+    if hasattr(torch, "set_num_interop_threads"):
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already set once in this process
+
+
+def _worker_main(
+    worker_id: int,
+    cores: List[int],
+    indices: List[int],
+    prompts: List[str],
+    job: Dict[str, Any],
+    queue,
+) -> None:
+    """Spawned worker: load a replica, generate its shard, stream rows back."""
+    try:
+        pin_worker(cores)
+        if not prompts:
+            queue.put(("done", worker_id, {"items": 0, "cores": list(cores)}))
+            return
+        from src.evaluation import (
+            adapter_fingerprint,
+            batch_size_buckets,
+            compile_for_inference,
+            load_model_and_tokenizer,
+            load_peft_model,
+            quantize_after_adapter,
+        )
+        from src.generation import BatchedGenerator, adapter_variants
+        from src.generation_cache import GenerationCache, model_fingerprint
+
+        start = time.perf_counter()
+        model, tokenizer = load_model_and_tokenizer(
+            job["base_model_name"],
+            job.get("quantization", False),
+            defer_quantization=bool(job.get("peft_model_path")),
+        )
+        models: Dict[str, Any] = {"base": model}
+        top = model
+        fingerprints = {
+            "base": model_fingerprint(
+                job["base_model_name"], model, quantization=job.get("quantization")
+            )
+        }
+        if job.get("peft_model_path"):
+            top = quantize_after_adapter(
+                load_peft_model(model, job["peft_model_path"], merge=False),
+                job.get("quantization"),
+            )
+            models = adapter_variants(top)
+            fingerprints["peft"] = model_fingerprint(
+                job["base_model_name"],
+                model,
+                quantization=job.get("quantization"),
+                adapter_fingerprint=adapter_fingerprint(job["peft_model_path"]),
+            )
+        load_time = time.perf_counter() - start
+
+        cache = GenerationCache(job["cache_dir"]) if job.get("cache_dir") else None
+        compiled = None
+        if job.get("compile"):
+            # Workers share the inductor cache dir, so restarts reuse graphs
+            compiled = compile_for_inference(
+                top,
+                tokenizer,
+                buckets=job["compile"]["buckets"],
+                batch_sizes=batch_size_buckets(job["batch_size"]),
+                max_new_tokens=job["generate_kwargs"].get("max_new_tokens", 64),
+                cache_dir=job["compile"].get("cache_dir"),
+            )
+        engine = BatchedGenerator(
+            tokenizer,
+            batch_size=job["batch_size"],
+            length_buckets=(
+                compiled["buckets"] if compiled and compiled["enabled"] else None
+            ),
+            batch_buckets=(
+                compiled["batch_sizes"] if compiled and compiled["enabled"] else None
+            ),
+            **job["generate_kwargs"],
+        )
+        run = engine.run(
+            prompts,
+            models,
+            cache=cache,
+            fingerprints=fingerprints if cache is not None else None,
+            seed=job.get("seed"),
+            on_batch=lambda idx, rows: queue.put(
+                ("rows", worker_id, [indices[i] for i in idx], rows)
+            ),
+        )
+        if cache is not None:
+            cache.close()
+        summary = dict(run.summary)
+        summary.pop("latency", None)
+        summary.update({"cores": list(cores), "load_time": load_time})
+        if compiled is not None:
+            summary["compile"] = compiled
+        queue.put(("done", worker_id, summary))
+    except Exception:
+        queue.put(("error", worker_id, traceback.format_exc()))
+
+
+def _collect(
+    queue,
+    procs: Sequence[Any],
+    *,
+    on_batch: Callable[[List[int], List[Dict[str, Any]]], None],
+    progress: Optional[Callable[[int], Any]] = None,
+    poll_interval: float = 1.0,
+) -> Dict[int, Dict[str, Any]]:
+    """Read worker messages until every worker has reported `done`.
+
+    A worker that dies without reporting (OOM kill, segfault in a native
+    kernel) never posts `error`, so the queue is polled and worker exit
+    codes checked between messages. A dead worker gets one more poll for
+    messages still in flight before the run fails.
+    """
+    import queue as queue_mod
+
+    workers: Dict[int, Dict[str, Any]] = {}
+    suspects: set = set()
+    while len(workers) < len(procs):
+        try:
+            msg = queue.get(timeout=poll_interval)
+        except queue_mod.Empty:
+            dead = {
+                w
+                for w, p in enumerate(procs)
+                if w not in workers and p.exitcode is not None
+            }
+            for w in sorted(dead & suspects):
+                code = procs[w].exitcode
+                how = f"signal {-code}" if code < 0 else f"exit code {code}"
+                raise RuntimeError(
+                    f"eval worker {w} died ({how}) without reporting; "
+                    "check memory use with fewer --num_workers"
+                )
+            suspects = dead
+            continue
+        if msg[0] == "rows":
+            _, _, idx, rows = msg
+            on_batch(idx, rows)
+            if progress is not None:
+                progress(len(idx))
+        elif msg[0] == "done":
+            workers[msg[1]] = msg[2]
+        else:
+            raise RuntimeError(f"eval worker {msg[1]} failed:\n{msg[2]}")
+    return workers
+
+
+def run_sharded(
+    prompts: Sequence[str],
+    lengths: Sequence[int],
+    *,
+    num_workers: int,
+    job: Dict[str, Any],
+    on_batch: Callable[[List[int], List[Dict[str, Any]]], None],
+    cores: Optional[Sequence[int]] = None,
+    progress: Optional[Callable[[int], Any]] = None,
+) -> Dict[str, Any]:
+    """Evaluate `prompts` across `num_workers` spawned, pinned processes.
+
+    `on_batch(indices, rows)` runs in the parent with indices into `prompts`.
+    Returns a scaling report: aggregate throughput plus per-worker stats.
+    """
+    import multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    sets = core_sets(num_workers, cores)
+    shards = shard_by_length(lengths, num_workers)
+    procs = []
+    start = time.perf_counter()
+    for w, (cs, shard) in enumerate(zip(sets, shards)):
+        p = ctx.Process(
+            target=_worker_main,
+            args=(w, cs, shard, [prompts[i] for i in shard], job, queue),
+            daemon=True,
+        )
+        p.start()
+        procs.append(p)
+
+    try:
+        workers = _collect(queue, procs, on_batch=on_batch, progress=progress)
+    finally:
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+    wall = time.perf_counter() - start
+
+    n = len(prompts)
+    return {
+        "num_workers": num_workers,
+        "threads_per_worker": [len(s) for s in sets],
+        "items": n,
+        "wall_time": wall,
+        "items_per_sec": n / wall if wall else 0.0,
+        "workers": [workers[w] for w in sorted(workers)],
+    }
+
+
+def update_scaling_report(path, report: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge this run into `worker_scaling.json`, keyed by worker count.
+
+    Speedup and efficiency are relative to the smallest worker count on
+    record (ideally a 1-worker run of the same suite).
+    """
+    import json
+    from pathlib import Path
+
+    path = Path(path)
+    data: Dict[str, Any] = {"runs": {}}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    runs = data.setdefault("runs", {})
+    runs[str(report["num_workers"])] = report
+    ref_n = min(int(k) for k in runs)
+    ref = runs[str(ref_n)]["items_per_sec"]
+    data["scaling"] = [
+        {
+            "num_workers": int(k),
+            "items_per_sec": r["items_per_sec"],
+            "speedup": r["items_per_sec"] / ref if ref else 0.0,
+            "efficiency": (r["items_per_sec"] / ref) / (int(k) / ref_n) if ref else 0.0,
+        }
+        for k, r in sorted(runs.items(), key=lambda kv: int(kv[0]))
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return data
@@ -0,0 +1,95 @@
+"""Quantization backend selection and CPU dynamic int8.
+
+`--quantization` used to mean bitsandbytes 4-bit NF4 only and silently fell
+back to full precision on hosts without CUDA or bitsandbytes. It now
+resolves to a backend:
+
+- ``"nf4"``: bitsandbytes 4-bit weights (needs CUDA and bitsandbytes);
+- ``"int8-dynamic"``: `torch.ao.quantization.quantize_dynamic` on
+  `nn.Linear` layers, with int8 weights and activations quantized per batch
+  at run time. Runs on any CPU with fbgemm/qnnpack kernels.
+
+``True``/``"auto"`` picks NF4 when available and dynamic int8 otherwise.
+"""
+
+from __future__ import annotations
+
+import difflib
+import importlib
+import sys
+from typing import Dict, Iterable, Optional, Sequence, Union
+
+QUANTIZATION_BACKENDS = ("nf4", "int8-dynamic")
+# lm_head feeds the softmax directly and dominates output drift when
+# quantized; LoRA matrices are tiny and must stay float for PEFT.
+DEFAULT_SKIP = ("lm_head",)
+
+
+def _torch():
+    return sys.modules.get("torch") or importlib.import_module("torch")
+
+
+def resolve_quantization(
+    quantization: Union[bool, str, None], *, nf4_supported: bool
+) -> Optional[str]:
+    """Map a flag value to a backend name, or None for full precision."""
+    if quantization in (None, False, "none", ""):
+        return None
+    if quantization in (True, "auto"):
+        return "nf4" if nf4_supported else "int8-dynamic"
+    if quantization not in QUANTIZATION_BACKENDS:
+        raise ValueError(
+            f"unknown quantization {quantization!r}; "
+            f"expected one of {('auto',) + QUANTIZATION_BACKENDS}"
+        )
+    if quantization == "nf4" and not nf4_supported:
+        raise RuntimeError("nf4 quantization needs CUDA and bitsandbytes")
+    return quantization
+
+
+def _skipped(name: str, skip: Iterable[str]) -> bool:
+    parts = name.split(".")
+    return any(p in skip or p.startswith("lora_") for p in parts)
+
+
+def quantize_dynamic_int8(model, *, skip: Iterable[str] = DEFAULT_SKIP):
+    """Swap `nn.Linear` layers for dynamic int8 ones, in place.
+
+    Expects float32 weights on CPU. Layers whose dotted name contains a
+    `skip` component or a `lora_*` component stay in float, so an attached
+    (unmerged) adapter keeps working on top of quantized base layers.
+    Returns the model.
+    """
+    torch = _torch()
+    skip = set(skip)
+    from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+    spec = {
+        name: default_dynamic_qconfig
+        for name, module in model.named_modules()
+        if isinstance(module, torch.nn.Linear) and not _skipped(name, skip)
+    }
+    if spec:
+        quantize_dynamic(model, spec, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def output_drift(
+    reference: Sequence[str], candidate: Sequence[str]
+) -> Dict[str, float]:
+    """Exact-match rate and whitespace-token similarity against a reference run."""
+    if len(reference) != len(candidate):
+        raise ValueError("reference and candidate must be the same length")
+    ratios = [
+        difflib.SequenceMatcher(None, (r or "").split(), (c or "").split()).ratio()
+        for r, c in zip(reference, candidate)
+    ]
+    n = len(ratios)
+    return {
+        "compared": n,
+        "exact_match": (
+            sum(r == c for r, c in zip(reference, candidate)) / n if n else 0.0
+        ),
+        "similarity": sum(ratios) / n if n else 0.0,
+        "min_similarity": min(ratios) if n else 0.0,
+    }
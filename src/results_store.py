@@ -0,0 +1,81 @@
+"""Append-only JSONL store for evaluation results.
+
+Rows are appended and flushed as each batch finishes, so a crash loses at
+most the batch in flight. `completed_ids` drives `--resume`, and summary
+statistics are computed from the stored file rather than from memory.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+RESULTS_FILENAME = "results.jsonl"
+
+
+def row_id(row: Dict[str, Any]) -> Tuple[str, str]:
+    """(suite, id) identity of a stored row."""
+    return str(row.get("suite", "")), str(row["id"])
+
+
+def _repair_tail(path: Path) -> None:
+    """Drop a trailing partial line left by an interrupted write."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def iter_results(path: Path | str) -> Iterator[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break  # partial last line from a crash
+            if line.strip():
+                yield json.loads(line)
+
+
+def completed_ids(path: Path | str) -> Set[Tuple[str, str]]:
+    return {row_id(r) for r in iter_results(path)}
+
+
+def read_results(path: Path | str) -> List[Dict[str, Any]]:
+    """Stored rows, last write wins per (suite, id)."""
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for r in iter_results(path):
+        rows[row_id(r)] = r
+    return list(rows.values())
+
+
+class ResultsWriter:
+    """Append rows to a JSONL file, flushing after every batch."""
+
+    def __init__(self, path: Path | str, *, resume: bool = False) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume and self.path.exists():
+            _repair_tail(self.path)
+        self._f = open(self.path, "a" if resume else "w", encoding="utf-8")
+        self.written = 0
+
+    def write(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self.written += 1
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
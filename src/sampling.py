@@ -0,0 +1,178 @@
+"""Length-grouped batching for training and batched generation.
+
+Random batches pad every row to the longest member, which is expensive when
+one-line tickets share a batch with pasted multi-page logs. Grouping examples
+of similar token length keeps padding low; shuffling within a bounded window
+(and shuffling the resulting batch order) keeps training stochastic.
+"""
+
+from __future__ import annotations
+
+import random
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+
+def length_grouped_batches(
+    lengths: Sequence[int],
+    batch_size: int,
+    *,
+    shuffle: bool = True,
+    window_batches: int = 50,
+    seed: int = 0,
+    drop_last: bool = False,
+) -> List[List[int]]:
+    """Group example indices into batches of similar length.
+
+    - shuffle=False: global sort by length (descending), for deterministic
+      batched inference.
+    - shuffle=True: shuffle all indices, then sort by length only within
+      windows of `window_batches * batch_size` examples and shuffle the
+      resulting batch order. The full batch with the longest example is moved
+      to the front so memory peaks surface on the first step.
+
+    The one short batch (if any) always comes last, so re-chunking the flat
+    index stream by `batch_size`, as a DataLoader does, reproduces exactly
+    these batches.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be > 0")
+    if window_batches <= 0:
+        raise ValueError("window_batches must be > 0")
+
+    n = len(lengths)
+    indices = list(range(n))
+    if not shuffle:
+        indices.sort(key=lambda i: (-lengths[i], i))
+        batches = [indices[i : i + batch_size] for i in range(0, n, batch_size)]
+    else:
+        rng = random.Random(seed)
+        rng.shuffle(indices)
+        window = window_batches * batch_size
+        batches = []
+        for w in range(0, n, window):
+            chunk = sorted(indices[w : w + window], key=lambda i: -lengths[i])
+            batches.extend(
+                chunk[i : i + batch_size] for i in range(0, len(chunk), batch_size)
+            )
+        short = [b for b in batches if len(b) < batch_size]
+        batches = [b for b in batches if len(b) == batch_size]
+        rng.shuffle(batches)
+        if batches:
+            longest = max(
+                range(len(batches)), key=lambda b: max(lengths[i] for i in batches[b])
+            )
+            batches[0], batches[longest] = batches[longest], batches[0]
+        batches.extend(short)
+
+    if drop_last and batches and len(batches[-1]) < batch_size:
+        batches = [b for b in batches if len(b) == batch_size]
+    return batches
+
+
+class LengthGroupedSampler:
+    """Index sampler yielding length-grouped batches back to back.
+
+    Meant for `DataLoader(sampler=..., batch_size=batch_size)`: consecutive
+    runs of `batch_size` indices form one length-grouped batch (the short
+    batch is last, so chunks never straddle two groups). `set_epoch`
+    reseeds the shuffle so every epoch sees a different grouping.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        *,
+        shuffle: bool = True,
+        window_batches: int = 50,
+        seed: int = 0,
+    ) -> None:
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.window_batches = window_batches
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = int(epoch)
+
+    def batches(self) -> List[List[int]]:
+        return length_grouped_batches(
+            self.lengths,
+            self.batch_size,
+            shuffle=self.shuffle,
+            window_batches=self.window_batches,
+            seed=self.seed + self.epoch,
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        for batch in self.batches():
+            yield from batch
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+
+def dataloader_batches(indices: Iterable[int], batch_size: int) -> List[List[int]]:
+    """Cut a flat index stream into batches the way `DataLoader(batch_size=...)` does."""
+    indices = list(indices)
+    return [indices[i : i + batch_size] for i in range(0, len(indices), batch_size)]
+
+
+def padding_stats(
+    lengths: Sequence[int], batches: Sequence[Sequence[int]]
+) -> Dict[str, float]:
+    """Real vs padded token counts when each batch pads to its longest row."""
+    real = 0
+    padded = 0
+    for batch in batches:
+        if not batch:
+            continue
+        longest = max(lengths[i] for i in batch)
+        real += sum(lengths[i] for i in batch)
+        padded += longest * len(batch)
+    return {
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "pad_tokens": padded - real,
+        "pad_fraction": (padded - real) / padded if padded else 0.0,
+    }
+
+
+def padding_report(
+    lengths: Sequence[int],
+    batch_size: int,
+    *,
+    window_batches: int = 50,
+    seed: int = 0,
+    shuffle: bool = True,
+) -> Dict[str, Dict[str, float]]:
+    """Compare padding overhead of random batches vs length-grouped batches.
+
+    Both are scored on the batches a DataLoader actually forms, i.e. the
+    sampler's flat index stream cut into runs of `batch_size`.
+    """
+    order = list(range(len(lengths)))
+    random.Random(seed).shuffle(order)
+    sampler = LengthGroupedSampler(
+        lengths,
+        batch_size,
+        shuffle=shuffle,
+        window_batches=window_batches,
+        seed=seed,
+    )
+    return {
+        "random": padding_stats(lengths, dataloader_batches(order, batch_size)),
+        "length_grouped": padding_stats(
+            lengths, dataloader_batches(sampler, batch_size)
+        ),
+    }
+
+
+def token_lengths(tokenizer, texts: Sequence[str]) -> List[int]:
+    """Token count per text via one batched, unpadded tokenizer call."""
+    if not texts:
+        return []
+    enc = tokenizer(list(texts), padding=False, truncation=False, return_tensors=None)
+    return [len(ids) for ids in enc["input_ids"]]
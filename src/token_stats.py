@@ -0,0 +1,103 @@
+"""Token-length statistics for sizing `max_length` from data.
+
+All statistics are computed with NumPy over per-record length arrays, so a
+whole split is summarized in a handful of vectorized passes:
+
+- prompt / answer / combined length percentiles
+- fraction of records and tokens lost to truncation at candidate lengths,
+  under both `tokenize_pairs` semantics (prompt and answer truncated
+  independently) and combined SFT semantics (prompt + answer)
+- projected row counts for `tokenize_dataset.py --chunking-strategy sliding_window`
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from src.chunking import num_joint_windows
+
+PERCENTILES = (50, 90, 95, 99, 100)
+
+
+def percentiles(lengths: np.ndarray) -> Dict[str, float]:
+    arr = np.asarray(lengths, dtype=np.int64)
+    if arr.size == 0:
+        return {}
+    out = {
+        f"p{q}": float(v) for q, v in zip(PERCENTILES, np.percentile(arr, PERCENTILES))
+    }
+    out["mean"] = float(arr.mean())
+    out["min"] = float(arr.min())
+    return out
+
+
+def truncation_loss(lengths: np.ndarray, max_length: int) -> Dict[str, float]:
+    """Fraction of records over `max_length` and of tokens cut by truncation."""
+    arr = np.asarray(lengths, dtype=np.int64)
+    total = int(arr.sum())
+    lost = int(np.maximum(arr - max_length, 0).sum())
+    return {
+        "records_truncated": float((arr > max_length).mean()) if arr.size else 0.0,
+        "tokens_lost": lost,
+        "tokens_lost_fraction": lost / total if total else 0.0,
+    }
+
+
+def split_report(
+    prompt_lengths: Sequence[int],
+    answer_lengths: Sequence[int],
+    *,
+    max_lengths: Sequence[int],
+    stride: int,
+) -> Dict[str, object]:
+    """Summarize one split's token lengths at each candidate `max_length`."""
+    p = np.asarray(prompt_lengths, dtype=np.int64)
+    a = np.asarray(answer_lengths, dtype=np.int64)
+    combined = p + a
+    n = int(p.size)
+
+    candidates: Dict[str, object] = {}
+    for m in max_lengths:
+        pair_over = (p > m) | (a > m)
+        pair_lost = int(np.maximum(p - m, 0).sum() + np.maximum(a - m, 0).sum())
+        pair_total = int(combined.sum())
+        windows = num_joint_windows(p, a, max_length=m, stride=stride)
+        candidates[str(m)] = {
+            "pairs": {
+                "records_truncated": float(pair_over.mean()) if n else 0.0,
+                "tokens_lost": pair_lost,
+                "tokens_lost_fraction": pair_lost / pair_total if pair_total else 0.0,
+            },
+            "combined": truncation_loss(combined, m),
+            "sliding_window_rows": int(windows.sum()),
+            "sliding_window_row_multiplier": float(windows.sum() / n) if n else 0.0,
+        }
+
+    return {
+        "records": n,
+        "prompt": percentiles(p),
+        "answer": percentiles(a),
+        "combined": percentiles(combined),
+        "max_length": candidates,
+    }
+
+
+def text_histogram(lengths: Sequence[int], *, width: int = 40, title: str = "") -> str:
+    """Render a power-of-two bucketed histogram as plain text."""
+    arr = np.asarray(lengths, dtype=np.int64)
+    lines: List[str] = [title] if title else []
+    if arr.size == 0:
+        return "\n".join(lines + ["(empty)"])
+    top = max(int(arr.max()), 1)
+    edges = [0] + [2**k for k in range(4, int(np.ceil(np.log2(top))) + 1)]
+    if edges[-1] < top:
+        edges.append(top)
+    edges[-1] = max(edges[-1], top) + 1
+    counts, _ = np.histogram(arr, bins=edges)
+    peak = max(int(counts.max()), 1)
+    for lo, hi, c in zip(edges[:-1], edges[1:], counts):
+        bar = "#" * int(round(width * int(c) / peak))
+        lines.append(f"{lo:>7}-{hi - 1:<7} {int(c):>8} {bar}")
+    return "\n".join(lines)
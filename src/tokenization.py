@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, List, Sequence, Tuple, Union
 
+from src.chunking import joint_budget
 from src.models import DataRecord
 
 if TYPE_CHECKING:  # import for type checking only
@@ -89,3 +90,61 @@ def tokenize_pairs(
         answer_input_ids=list(enc_a["input_ids"]),
         answer_attention_mask=list(enc_a["attention_mask"]),
     )
+
+
+IGNORE_INDEX = -100
+
+
+@dataclass
+class SFTExamples:
+    input_ids: List[List[int]]
+    labels: List[List[int]]
+
+
+def tokenize_sft_examples(
+    records: Sequence[DataRecord],
+    tokenizer_or_id: Union[str, "PreTrainedTokenizerBase"],
+    *,
+    max_length: int = 512,
+    pair_template=default_pair_template,
+) -> SFTExamples:
+    """Tokenize records into causal-LM training examples (prompt + answer).
+
+    Prompt tokens are masked to IGNORE_INDEX in `labels` so the loss only
+    covers the answer. The answer is followed by EOS when the tokenizer has one.
+    Examples are unpadded. One that exceeds `max_length` is split with
+    `joint_budget`: the prompt keeps its last tokens, so a long prompt cannot
+    leave a row with no supervised tokens.
+    """
+    tok = _ensure_tokenizer(tokenizer_or_id)
+    prompts: List[str] = []
+    answers: List[str] = []
+    for rec in records:
+        p, a = pair_template(rec)
+        prompts.append(p)
+        answers.append(a)
+
+    enc_p = tok(prompts, padding=False, truncation=False, return_tensors=None)
+    enc_a = tok(
+        answers,
+        padding=False,
+        truncation=False,
+        add_special_tokens=False,
+        return_tensors=None,
+    )
+    eos_id = getattr(tok, "eos_token_id", None)
+
+    input_ids: List[List[int]] = []
+    labels: List[List[int]] = []
+    for p_ids, a_ids in zip(enc_p["input_ids"], enc_a["input_ids"]):
+        a_ids = list(a_ids)
+        if eos_id is not None:
+            a_ids.append(eos_id)
+        p_ids = list(p_ids)
+        if len(p_ids) + len(a_ids) > max_length:
+            budget, kept = joint_budget(len(p_ids), len(a_ids), max_length=max_length)
+            p_ids = p_ids[len(p_ids) - min(budget, len(p_ids)) :]
+            a_ids = a_ids[:kept]
+        input_ids.append(p_ids + a_ids)
+        labels.append([IGNORE_INDEX] * len(p_ids) + a_ids)
+    return SFTExamples(input_ids=input_ids, labels=labels)
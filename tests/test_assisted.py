@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import pytest
+from src.assisted import (
+    assisted_generate_kwargs,
+    compare_with_plain,
+    count_forward_calls,
+    summarize_comparisons,
+)
+from src.generation import BatchedGenerator
+
+
+class _Handle:
+    def __init__(self, hooks, fn):
+        self.hooks, self.fn = hooks, fn
+
+    def remove(self):
+        self.hooks.remove(self.fn)
+
+
+class _Model:
+    """Greedy fake: appends tokens 5,6,7,8; assisted mode accepts 2 per call."""
+
+    def __init__(self):
+        self.hooks = []
+
+    def register_forward_hook(self, fn):
+        self.hooks.append(fn)
+        return _Handle(self.hooks, fn)
+
+    def _forward(self):
+        for fn in list(self.hooks):
+            fn(self, (), None)
+
+    def generate(self, input_ids, max_new_tokens, do_sample, **kwargs):
+        assert do_sample is False and "temperature" not in kwargs
+        per_call = 2 if kwargs.get("prompt_lookup_num_tokens") else 1
+        for _ in range(0, max_new_tokens, per_call):
+            self._forward()
+        return [list(input_ids[0]) + [5, 6, 7, 8][:max_new_tokens]]
+
+
+def test_kwargs_modes():
+    assert assisted_generate_kwargs() == {}
+    assert assisted_generate_kwargs(prompt_lookup_num_tokens=3) == {
+        "prompt_lookup_num_tokens": 3
+    }
+    draft = object()
+    assert assisted_generate_kwargs(assistant_model=draft) == {"assistant_model": draft}
+    with pytest.raises(ValueError):
+        assisted_generate_kwargs(assistant_model=draft, prompt_lookup_num_tokens=3)
+
+
+def test_forward_counter_unhooks():
+    model = _Model()
+    with count_forward_calls(model) as calls:
+        model._forward()
+        model._forward()
+    model._forward()
+    assert calls[0] == 2 and model.hooks == []
+
+
+def test_compare_reports_parity_and_acceptance():
+    item = compare_with_plain(
+        _Model(),
+        {"input_ids": [[1, 2]]},
+        generate_kwargs={"max_new_tokens": 4, "temperature": 0.7},
+        assisted_kwargs={"prompt_lookup_num_tokens": 3},
+    )
+    assert item["parity"] is True
+    assert (item["plain_forward_calls"], item["assisted_forward_calls"]) == (4, 2)
+    stats = summarize_comparisons([item])
+    assert stats["new_tokens"] == 4
+    assert stats["tokens_per_forward"] == pytest.approx(2.0)
+    assert stats["accepted_fraction"] == pytest.approx(0.5)
+    assert stats["parity_failures"] == 0
+
+
+def test_assisted_kwargs_do_not_change_cache_params():
+    tok = object()
+    plain = BatchedGenerator(tok, batch_size=1, max_new_tokens=8, do_sample=False)
+    assisted = BatchedGenerator(
+        tok,
+        batch_size=1,
+        max_new_tokens=8,
+        do_sample=False,
+        assistant_model=object(),
+        tokenizer=tok,
+    )
+    assert plain.cache_params == assisted.cache_params
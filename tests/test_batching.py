@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import sys
+import threading
+import types
+
+import pytest
+from api.batching import MicroBatcher, make_generate_batch, token_counter
+from tests.test_generation import _Model, _Tok
+
+
+class _Recorder:
+    """Blocking batch function that records each batch it receives."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.threads = set()
+        self.fail = fail
+
+    def __call__(self, prompts):
+        self.batches.append(list(prompts))
+        self.threads.add(threading.get_ident())
+        if self.fail:
+            raise ValueError("model fell over")
+        return [p.upper() for p in prompts]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_are_coalesced_and_routed():
+    rec = _Recorder()
+
+    async def main():
+        batcher = MicroBatcher(rec, max_batch_size=8, max_wait_ms=50)
+        await batcher.start()
+        out = await asyncio.gather(*(batcher.submit(f"p{i}") for i in range(5)))
+        stats = batcher.stats()
+        await batcher.stop()
+        return out, stats
+
+    out, stats = _run(main())
+    assert out == [f"P{i}" for i in range(5)]
+    assert rec.batches == [[f"p{i}" for i in range(5)]]
+    assert threading.get_ident() not in rec.threads  # ran off the event loop
+    assert stats["batches"] == 1 and stats["mean_batch_size"] == 5
+    assert stats["queue_wait"]["count"] == 5
+
+
+def test_max_batch_size_splits_batches():
+    rec = _Recorder()
+
+    async def main():
+        batcher = MicroBatcher(rec, max_batch_size=2, max_wait_ms=50)
+        await batcher.start()
+        out = await asyncio.gather(*(batcher.submit(str(i)) for i in range(5)))
+        await batcher.stop()
+        return out
+
+    assert _run(main()) == ["0", "1", "2", "3", "4"]
+    assert [len(b) for b in rec.batches] == [2, 2, 1]
+
+
+def test_token_budget_bounds_padded_batch():
+    rec = _Recorder()
+    prompts = ["a" * 10, "b" * 10, "c" * 30, "d" * 5]
+
+    async def main():
+        batcher = MicroBatcher(
+            rec, max_batch_size=8, max_wait_ms=50, max_batch_tokens=40, count_tokens=len
+        )
+        await batcher.start()
+        await asyncio.gather(*(batcher.submit(p) for p in prompts))
+        await batcher.stop()
+
+    _run(main())
+    # 2 x 10 fits; adding a 30-token prompt would pad to 3 x 30 > 40
+    assert rec.batches == [prompts[:2], prompts[2:3], prompts[3:]]
+
+
+def test_token_budget_counts_new_tokens():
+    rec = _Recorder()
+    prompts = ["a" * 10, "b" * 10, "c" * 4]
+
+    async def main():
+        batcher = MicroBatcher(
+            rec,
+            max_batch_size=8,
+            max_wait_ms=50,
+            max_batch_tokens=40,
+            max_new_tokens=15,
+            count_tokens=len,
+        )
+        await batcher.start()
+        await asyncio.gather(*(batcher.submit(p) for p in prompts))
+        await batcher.stop()
+
+    _run(main())
+    # 2 x (10 + 15) > 40, although the prompts alone (2 x 10) would fit
+    assert rec.batches == [prompts[:1], prompts[1:2], prompts[2:]]
+
+
+def test_window_expiry_flushes_partial_batch():
+    rec = _Recorder()
+
+    async def main():
+        batcher = MicroBatcher(rec, max_batch_size=8, max_wait_ms=5)
+        await batcher.start()
+        first = await batcher.submit("x")
+        second = await batcher.submit("y")
+        await batcher.stop()
+        return first, second
+
+    assert _run(main()) == ("X", "Y")
+    assert rec.batches == [["x"], ["y"]]
+
+
+def test_batch_errors_reach_every_caller():
+    rec = _Recorder(fail=True)
+
+    async def main():
+        batcher = MicroBatcher(rec, max_batch_size=4, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(
+            *(batcher.submit(p) for p in "ab"), return_exceptions=True
+        )
+        # The scheduler survives a failed batch
+        rec.fail = False
+        after = await batcher.submit("c")
+        stats = batcher.stats()
+        await batcher.stop()
+        return results, after, stats
+
+    results, after, stats = _run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert after == "C"
+    assert stats["failed_batches"] == 1
+
+
+def test_cancelled_callers_are_skipped():
+    rec = _Recorder()
+
+    async def main():
+        batcher = MicroBatcher(rec, max_batch_size=4, max_wait_ms=30)
+        await batcher.start()
+        gone = asyncio.create_task(batcher.submit("gone"))
+        kept = asyncio.create_task(batcher.submit("kept"))
+        await asyncio.sleep(0)
+        gone.cancel()
+        out = await kept
+        await batcher.stop()
+        return out
+
+    assert _run(main()) == "KEPT"
+    assert rec.batches == [["kept"]]
+
+
+def test_submit_requires_start():
+    async def main():
+        await MicroBatcher(_Recorder()).submit("x")
+
+    with pytest.raises(RuntimeError):
+        _run(main())
+
+
+def test_make_generate_batch_returns_new_tokens_only(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules,
+        "torch",
+        types.SimpleNamespace(
+            inference_mode=contextlib.nullcontext, manual_seed=lambda s: None
+        ),
+    )
+    generate_batch = make_generate_batch(_Model(9), _Tok(), max_batch_size=4)
+    assert generate_batch(["a bb", "ccc"]) == ["9", "9"]
+
+
+def test_token_counter_uses_its_own_tokenizer():
+    class _Counting:
+        calls = 0
+
+        def __call__(self, text):
+            self.calls += 1
+            return {"input_ids": text.split()}
+
+    tok = _Counting()
+    count = token_counter(tok)
+    assert count("a bb ccc") == 3
+    assert tok.calls == 0  # the serving tokenizer is left to the worker
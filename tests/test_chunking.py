@@ -1,6 +1,33 @@
 from __future__ import annotations
 
-from src.chunking import chunk_ids_sliding_window, sliding_windows
+import re
+
+import numpy as np
+from src.chunking import (
+    boundary_token_windows,
+    chunk_batch_sliding_window,
+    chunk_ids_sliding_window,
+    chunk_prompt_answer_joint,
+    chunk_text_on_boundaries,
+    joint_budget,
+    last_window_for_text,
+    num_joint_windows,
+    num_sliding_windows,
+    sliding_window_array,
+    sliding_windows,
+    tail_window_for_text,
+    text_boundaries,
+)
+
+
+def _reference_chunks(ids, max_length, stride, pad_id):
+    chunks, masks = [], []
+    for s, e in sliding_windows(len(ids), max_length=max_length, stride=stride):
+        w = list(ids[s:e])
+        pad = max_length - len(w)
+        chunks.append(w + [pad_id] * pad)
+        masks.append([1] * len(w) + [0] * pad)
+    return chunks, masks
 
 
 def test_sliding_windows_basic():
@@ -38,3 +65,184 @@ def test_chunk_ids_short_sequence_single_window():
     assert chunks[0][:3] == ids
     assert masks[0][:3] == [1, 1, 1]
     assert all(x == 0 for x in chunks[0][3:])
+
+
+def test_num_sliding_windows_closed_form():
+    lengths = np.arange(0, 200)
+    for max_length, stride in [(10, 2), (16, 0), (8, 7), (5, 9)]:
+        want = [
+            len(sliding_windows(int(n), max_length=max_length, stride=stride))
+            for n in lengths
+        ]
+        got = num_sliding_windows(lengths, max_length=max_length, stride=stride)
+        assert got.tolist() == want
+        assert num_sliding_windows(57, max_length=max_length, stride=stride) == want[57]
+
+
+def test_sliding_window_array_matches_list_semantics():
+    for n in [0, 1, 7, 8, 9, 25, 26, 30, 61]:
+        ids = list(range(100, 100 + n))
+        windows, masks = sliding_window_array(ids, max_length=8, stride=2, pad_id=-1)
+        assert (windows.tolist(), masks.tolist()) == _reference_chunks(ids, 8, 2, -1)
+
+
+def test_sliding_window_array_is_view_when_tail_on_grid():
+    ids = np.arange(26)  # step 6: starts 0, 6, 12, tail 18 lies on the grid
+    windows, _ = sliding_window_array(ids, max_length=8, stride=2)
+    assert np.shares_memory(windows, ids)
+    assert windows[-1].tolist() == list(range(18, 26))
+
+
+def test_chunk_batch_matches_per_sequence():
+    seqs = [list(range(n)) for n in (0, 3, 8, 25, 30)]
+    windows, masks, owner = chunk_batch_sliding_window(
+        seqs, max_length=8, stride=2, pad_id=-1
+    )
+    row = 0
+    for i, seq in enumerate(seqs):
+        want_c, want_m = _reference_chunks(seq, 8, 2, -1)
+        k = len(want_c)
+        assert owner[row : row + k].tolist() == [i] * k
+        assert windows[row : row + k].tolist() == want_c
+        assert masks[row : row + k].tolist() == want_m
+        row += k
+    assert row == windows.shape[0]
+
+
+def test_joint_chunker_fits_budget_without_duplicate_rows():
+    prompt = list(range(1, 41))
+    answer = [900, 901, 902]
+    out = chunk_prompt_answer_joint(prompt, answer, max_length=16, stride=4, pad_id=0)
+    rows = list(zip(out.prompt_input_ids, out.answer_input_ids))
+    assert len(rows) == len(set((tuple(p), tuple(a)) for p, a in rows))
+    assert len(rows) == num_joint_windows(40, 3, max_length=16, stride=4)
+    for p, a, pm, am in zip(
+        out.prompt_input_ids,
+        out.answer_input_ids,
+        out.prompt_attention_mask,
+        out.answer_attention_mask,
+    ):
+        # one combined budget, answer intact at the front of the answer side
+        assert len(p) + len(a) == 16
+        assert a[:3] == answer
+        assert sum(pm) + sum(am) == len(p) + 3
+    # prompt fully covered: first window starts at 0, last ends at the tail
+    assert out.prompt_input_ids[0][0] == 1
+    assert out.prompt_input_ids[-1][-1] == 40
+
+
+def test_joint_chunker_truncates_long_answer_once():
+    out = chunk_prompt_answer_joint(
+        [1, 2], list(range(100, 130)), max_length=8, stride=2, pad_to_max_length=False
+    )
+    assert out.prompt_input_ids == [[1, 2]]
+    assert out.answer_input_ids == [list(range(100, 106))]
+
+
+def test_joint_budget_keeps_answer_that_fits_whole():
+    # a long prompt no longer pulls a fitting answer down to max_length // 2
+    assert joint_budget(5000, 400, max_length=512) == (112, 400)
+    budget, kept = joint_budget(
+        np.array([5000, 3, 5000]), np.array([511, 600, 600]), max_length=512
+    )
+    assert budget.tolist() == [1, 3, 256]
+    assert kept.tolist() == [511, 509, 256]
+    out = chunk_prompt_answer_joint(
+        list(range(1, 301)), list(range(1000, 1400)), max_length=512, stride=16
+    )
+    assert all(a[:400] == list(range(1000, 1400)) for a in out.answer_input_ids)
+    assert all(len(p) <= 112 for p in out.prompt_input_ids)
+
+
+class _SpyTok:
+    """Whitespace tokenizer with BOS/EOS that records encoded characters."""
+
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocab = {}
+        self.chars = 0
+
+    def __call__(self, batch, **_kw):
+        self.chars += sum(len(t) for t in batch)
+        ids = [
+            [1]
+            + [self.vocab.setdefault(w, len(self.vocab) + 3) for w in t.split()]
+            + [2]
+            for t in batch
+        ]
+        return {"input_ids": ids}
+
+
+def test_tail_window_matches_full_path_and_encodes_only_tail():
+    text = " ".join(f"w{i % 97}x{i}" for i in range(20000))
+    full_tok, tail_tok = _SpyTok(), _SpyTok()
+    want = last_window_for_text(full_tok, text, max_length=64, stride=16)
+    got = tail_window_for_text(tail_tok, text, max_length=64, stride=16)
+    # ids come from separate vocabs; compare the decoded words instead
+    inv_full = {v: k for k, v in full_tok.vocab.items()}
+    inv_tail = {v: k for k, v in tail_tok.vocab.items()}
+    assert [inv_full.get(i, i) for i in want[0]] == [inv_tail.get(i, i) for i in got[0]]
+    assert got[1] == want[1] == [1] * 64
+    assert tail_tok.chars < len(text) // 50
+
+
+def test_tail_window_short_text_falls_back_to_full_path():
+    tok = _SpyTok()
+    ids, mask = tail_window_for_text(tok, "hello there", max_length=8, stride=2)
+    assert len(ids) == 8 and mask == [1, 1, 1, 1, 0, 0, 0, 0]
+
+
+def test_text_boundaries_sentences_lines_and_turns():
+    text = "Hi there. It broke!\nAgent: try again?  ok"
+    b = text_boundaries(text)
+    assert text[b[0] :].startswith("It broke")
+    assert text[b[1] :].startswith("Agent:")
+    assert text[b[2] :].startswith("ok")
+
+
+def test_boundary_token_windows_cut_on_boundaries():
+    # boundaries at tokens 4, 9, 12; each window ends at the last one that fits
+    assert boundary_token_windows([4, 9, 12], 20, max_length=10) == [
+        (0, 9),
+        (9, 12),
+        (12, 20),
+    ]
+    # no boundary inside the budget -> hard cut
+    assert boundary_token_windows([], 25, max_length=10) == [
+        (0, 10),
+        (10, 20),
+        (20, 25),
+    ]
+    # overlap re-includes whole units only
+    assert boundary_token_windows([3, 6, 9], 14, max_length=10, overlap=4) == [
+        (0, 9),
+        (6, 14),
+    ]
+
+
+class _OffsetTok:
+    """Word tokenizer returning fast-tokenizer style offset mappings."""
+
+    def __call__(self, batch, **_kw):
+        ids, offs = [], []
+        for text in batch:
+            ms = list(re.finditer(r"\S+", text))
+            ids.append([len(m.group()) for m in ms])
+            offs.append([(m.start(), m.end()) for m in ms])
+        return {"input_ids": ids, "offset_mapping": offs}
+
+
+def test_chunk_text_on_boundaries_traces_back_to_text():
+    text = "One two three. Four five six seven. Eight nine.\nUser: ten eleven"
+    wins = chunk_text_on_boundaries(_OffsetTok(), text, max_length=6, pad_id=0)
+    spans = [text[w.char_start : w.char_end] for w in wins]
+    assert spans == [
+        "One two three.",
+        "Four five six seven. Eight nine.",
+        "User: ten eleven",
+    ]
+    assert all(len(w.input_ids) == 6 for w in wins)
+    assert wins[0].attention_mask == [1, 1, 1, 0, 0, 0]
+    # windows tile the token sequence without overlap
+    assert [w.token_start for w in wins[1:]] == [w.token_end for w in wins[:-1]]
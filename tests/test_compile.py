@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+import types
+
+import pytest
+from src.evaluation import (
+    batch_size_buckets,
+    bucket_length,
+    compile_for_inference,
+    pad_to_bucket,
+)
+
+
+class _Tok:
+    eos_token_id = 2
+
+    def __init__(self):
+        self.pad_calls = []
+        self.padding_side = "right"
+
+    def pad(self, features, return_tensors=None, **kwargs):
+        self.pad_calls.append(kwargs)
+        self.padded_side = self.padding_side
+        rows = features["input_ids"]
+        width = kwargs.get("max_length") or max(len(r) for r in rows)
+        return {"input_ids": [[0] * (width - len(r)) + list(r) for r in rows]}
+
+
+class _Model:
+    device = "cpu"
+
+    def __init__(self, fail_generate=False):
+        self.generation_config = types.SimpleNamespace(cache_implementation=None)
+        self.generate_calls = []
+        self.fail_generate = fail_generate
+
+    def forward(self, *args, **kwargs):
+        return "eager"
+
+    def generate(self, **kwargs):
+        if self.fail_generate:
+            raise RuntimeError("inductor exploded")
+        self.generate_calls.append(kwargs)
+
+
+@pytest.fixture
+def fake_torch(monkeypatch, tmp_path):
+    monkeypatch.setenv("SUPPORTBOT_COMPILE_CACHE_DIR", str(tmp_path / "cc"))
+    monkeypatch.delenv("TORCHINDUCTOR_CACHE_DIR", raising=False)
+    compiled = []
+
+    def compile(fn, **kwargs):
+        compiled.append(kwargs)
+
+        def run(*a, **k):
+            if torch.recompile_error:
+                raise RuntimeError("Unsupported: data-dependent branch")
+            return "compiled"
+
+        return run
+
+    torch = types.SimpleNamespace(
+        compile=compile,
+        full=lambda shape, value, **kw: [[value] * shape[1]] * shape[0],
+        ones_like=lambda x: [[1] * len(x[0])] * len(x),
+        long="long",
+        inference_mode=contextlib.nullcontext,
+        compiled=compiled,
+        recompile_error=False,
+    )
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    yield torch
+    os.environ.pop("TORCHINDUCTOR_CACHE_DIR", None)
+
+
+def test_bucket_length():
+    assert bucket_length(1, (64, 128)) == 64
+    assert bucket_length(64, (128, 64)) == 64
+    assert bucket_length(65, (64, 128)) == 128
+    assert bucket_length(300, (64, 128)) == 384
+
+
+def test_pad_to_bucket_left_pads_to_bucket_width():
+    tok = _Tok()
+    out = pad_to_bucket(tok, [[5, 6, 7]], (4, 8), return_tensors=None)
+    assert tok.padded_side == "left"
+    assert tok.padding_side == "right"  # the shared tokenizer is left as it was
+    assert out["input_ids"] == [[0, 5, 6, 7]]
+    assert tok.pad_calls[-1] == {"padding": "max_length", "max_length": 4}
+
+    pad_to_bucket(tok, [[5, 6, 7]], None, return_tensors=None)
+    assert tok.pad_calls[-1] == {}
+
+
+def test_compile_warms_every_bucket_and_batch_size(fake_torch, tmp_path):
+    model = _Model()
+    report = compile_for_inference(
+        model, _Tok(), buckets=(128, 64), batch_sizes=(1, 4), max_new_tokens=8
+    )
+
+    assert report["enabled"] and report["error"] is None
+    assert report["mode"] == "default"  # no CUDA on the fake torch
+    assert model.generation_config.cache_implementation == "static"
+    assert model.forward() == "compiled"
+    assert fake_torch.compiled[-1]["fullgraph"] is True
+    shapes = [
+        (len(c["input_ids"]), len(c["input_ids"][0])) for c in model.generate_calls
+    ]
+    assert shapes == [(1, 64), (1, 128), (4, 64), (4, 128)]
+    assert all(c["max_new_tokens"] == 8 for c in model.generate_calls)
+    assert os.environ["TORCHINDUCTOR_CACHE_DIR"] == str((tmp_path / "cc").resolve())
+
+
+def test_compile_failure_restores_eager(fake_torch):
+    model = _Model(fail_generate=True)
+    report = compile_for_inference(model, _Tok(), buckets=(64,))
+
+    assert not report["enabled"]
+    assert "inductor exploded" in report["error"]
+    assert model.forward() == "eager"
+    assert "forward" not in vars(model)
+    assert model.generation_config.cache_implementation is None
+
+
+def test_compile_targets_base_model_of_peft_wrapper(fake_torch):
+    inner = _Model()
+
+    class _Peft:
+        device = "cpu"
+
+        def get_base_model(self):
+            return inner
+
+        def generate(self, **kwargs):
+            inner.generate(**kwargs)
+
+    report = compile_for_inference(_Peft(), _Tok(), buckets=(64,))
+    assert report["enabled"]
+    assert inner.forward() == "compiled"
+    assert inner.generation_config.cache_implementation == "static"
+
+
+def test_batch_size_buckets():
+    assert batch_size_buckets(1) == [1]
+    assert batch_size_buckets(8) == [1, 2, 4, 8]
+    assert batch_size_buckets(6) == [1, 2, 4, 6]
+
+
+def test_compile_warms_base_variant_of_unmerged_adapter(fake_torch):
+    model = _Model()
+    model.adapter_on = True
+
+    @contextlib.contextmanager
+    def disable_adapter():
+        model.adapter_on = False
+        yield
+        model.adapter_on = True
+
+    model.disable_adapter = disable_adapter
+    generate = model.generate
+    states = []
+    model.generate = lambda **kw: (states.append(model.adapter_on), generate(**kw))
+
+    report = compile_for_inference(model, _Tok(), buckets=(64,), batch_sizes=(1, 2))
+    assert report["enabled"] and report["adapter_variants"] == 2
+    assert states == [True, True, False, False]
+
+
+def test_compile_error_after_warmup_reverts_to_eager(fake_torch):
+    model = _Model()
+    report = compile_for_inference(model, _Tok(), buckets=(64,))
+    assert report["enabled"]
+
+    fake_torch.recompile_error = True  # an unwarmed shape fails to trace
+    with pytest.warns(RuntimeWarning, match="reverting to eager"):
+        assert model.forward() == "eager"
+    assert not report["enabled"] and report["fallback"] == "runtime"
+    assert "data-dependent" in report["error"]
+    assert "forward" not in vars(model)
+    assert model.generation_config.cache_implementation is None
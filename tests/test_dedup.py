@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from src.dedup import RowDeduper, row_digest
+
+
+def test_row_digest_is_length_delimited():
+    # same concatenation, different split between prompt and answer
+    assert row_digest([1, 2], [3]) != row_digest([1], [2, 3])
+    assert row_digest([1, 2], [3]) == row_digest([1, 2], [3])
+
+
+def test_deduper_counts_repeats():
+    d = RowDeduper()
+    assert d.add([1, 2, 3], [9]) is True
+    assert d.add([4, 5], [9]) is True
+    assert d.add([1, 2, 3], [9]) is False
+    rep = d.report()
+    assert rep["rows_checked"] == 3
+    assert rep["duplicate_rows"] == 1
+    assert rep["duplicate_tokens"] == 4
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from src.eval_schema import (
+    ErrorPatterns,
+    ErrorType,
+    classify_error,
+    classify_errors_batch,
+    load_error_patterns,
+)
+
+RESPONSES = [
+    "",
+    None,
+    "   ",
+    "Sorry, I can't help with that request today.",
+    "You CANNOT downgrade mid-cycle, but here is how to schedule it.",
+    "Ok",
+    "Sure thing",
+    "Open Settings > Billing and click Download invoice.",
+    "cannot",
+    "I am not able to",
+]
+
+
+def test_batch_matches_row_classifier():
+    batch = classify_errors_batch(RESPONSES)
+    expected = []
+    for r in RESPONSES:
+        etype = classify_error("", r)
+        expected.append(etype.value if isinstance(etype, ErrorType) else None)
+    assert list(batch.labels) == expected
+    assert batch.counts == {"other": 3, "refusal": 4, "style": 2}
+    assert list(batch.masks["style"]) == [e == "style" for e in expected]
+
+
+def test_batch_matches_row_classifier_on_unicode_whitespace():
+    # Python's str.split/strip treat these as whitespace; Arrow's kernels don't
+    responses = [
+        "\u3000 .\t\xa0\na",
+        "\xa0",
+        "\u3000",
+        "a\x1cb c",
+        "x\x1f y z",
+        "ok\u2003fine then",
+        "\x1c\x1d\x1e\x1f",
+    ]
+    batch = classify_errors_batch(responses)
+    expected = []
+    for r in responses:
+        etype = classify_error("", r)
+        expected.append(etype.value if isinstance(etype, ErrorType) else None)
+    assert list(batch.labels) == expected
+
+
+def test_default_yaml_matches_builtin_defaults():
+    assert load_error_patterns() == ErrorPatterns()
+
+
+def test_custom_pattern_packs(tmp_path):
+    path = tmp_path / "patterns.yaml"
+    path.write_text(
+        "refusal:\n"
+        "  substrings: ['unable to']\n"
+        "  regex: ['against (our|the) policy']\n"
+        "style:\n"
+        "  max_words: 1\n"
+        "  regex: ['^as an ai']\n"
+    )
+    patterns = load_error_patterns(path)
+    batch = classify_errors_batch(
+        [
+            "We are unable to refund this.",
+            "That is against our policy.",
+            "As an AI model, here are the steps.",
+            "Done",
+            "Two words",
+        ],
+        patterns,
+    )
+    assert list(batch.labels) == ["refusal", "refusal", "style", "style", None]
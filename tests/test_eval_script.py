@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from scripts import eval as E
+
+
+def test_resolve_suites_expands_directories(tmp_path):
+    suites = tmp_path / "suites"
+    suites.mkdir()
+    (suites / "billing.jsonl").write_text("{}\n")
+    (suites / "setup.jsonl").write_text("{}\n")
+    extra = tmp_path / "extra.jsonl"
+    extra.write_text("{}\n")
+
+    resolved = E._resolve_suites([str(suites), str(extra)])
+    assert [name for name, _ in resolved] == ["billing", "setup", "extra"]
+
+    with pytest.raises(SystemExit):
+        E._resolve_suites([str(suites), str(suites / "setup.jsonl")])
+    with pytest.raises(SystemExit):
+        E._resolve_suites([str(tmp_path / "missing.jsonl")])
+
+
+def test_write_outputs_per_suite(tmp_path):
+    rows = [
+        {"prompt": "a", "suite": "billing", "base_response": "x", "base_latency": 1.0},
+        {"prompt": "b", "suite": "setup", "base_response": "y", "base_latency": 2.0},
+    ]
+    E._write_outputs(
+        [r for r in rows if r["suite"] == "setup"],
+        tmp_path / "setup",
+        model_names=["base"],
+        batch_size=2,
+        has_peft=False,
+        annotate_errors=False,
+        label="setup",
+    )
+    stats = json.loads((tmp_path / "setup" / "latency_stats.json").read_text())
+    assert stats["items"] == 1
+    assert stats["models"]["base"]["latency"]["p50"] == pytest.approx(2.0)
+    assert (tmp_path / "setup" / "results.csv").read_text().count("\n") == 2
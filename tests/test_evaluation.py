@@ -41,8 +41,8 @@ def test_load_model_and_tokenizer_basic(monkeypatch):
     fake_transformers.AutoModelForCausalLM = auto_model
 
     # Force stub modules to be used even if real ones were imported earlier
-    sys.modules["transformers"] = fake_transformers
-    sys.modules["torch"] = make_fake_torch()
+    monkeypatch.setitem(sys.modules, "transformers", fake_transformers)
+    monkeypatch.setitem(sys.modules, "torch", make_fake_torch())
 
     from src import evaluation as evalmod
 
@@ -85,8 +85,8 @@ def test_load_model_and_tokenizer_quantization_path(monkeypatch):
         AutoModelForCausalLM=auto_model,
         BitsAndBytesConfig=BitsAndBytesConfig,
     )
-    sys.modules["transformers"] = fake_transformers
-    sys.modules["torch"] = make_fake_torch()
+    monkeypatch.setitem(sys.modules, "transformers", fake_transformers)
+    monkeypatch.setitem(sys.modules, "torch", make_fake_torch())
 
     from src import evaluation as evalmod
 
@@ -112,7 +112,7 @@ def test_load_peft_model_merges(monkeypatch):
             return _P()
 
     fake_peft = types.SimpleNamespace(PeftModel=_FakePeftModel)
-    sys.modules["peft"] = fake_peft
+    monkeypatch.setitem(sys.modules, "peft", fake_peft)
 
     from src import evaluation as evalmod
 
@@ -120,6 +120,27 @@ def test_load_peft_model_merges(monkeypatch):
     assert merged == "MERGED"
 
 
+def test_load_peft_model_unmerged(monkeypatch):
+    class _FakePeftModel:
+        @classmethod
+        def from_pretrained(cls, model, path):
+            inst = cls()
+            inst.base = model
+            return inst
+
+        def merge_and_unload(self):
+            raise AssertionError("must not merge")
+
+    monkeypatch.setitem(
+        sys.modules, "peft", types.SimpleNamespace(PeftModel=_FakePeftModel)
+    )
+    from src import evaluation as evalmod
+
+    base = object()
+    model = evalmod.load_peft_model(base, "/tmp/adapter", merge=False)
+    assert isinstance(model, _FakePeftModel) and model.base is base
+
+
 def test_load_peft_model_missing():
     # Ensure peft import fails
     sys.modules.pop("peft", None)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import contextlib
+import sys
+import types
+
+import pytest
+from src.generation import BatchedGenerator, adapter_variants
+
+
+class _Tensor(list):
+    def to(self, device):
+        return self
+
+
+class _Tok:
+    """Whitespace tokenizer with left padding support (pad id 0)."""
+
+    def __init__(self):
+        self.padding_side = "right"
+        self.calls = 0
+
+    def __call__(self, texts, **kwargs):
+        self.calls += 1
+        return {"input_ids": [[len(w) for w in t.split()] for t in texts]}
+
+    def pad(self, features, return_tensors=None):
+        rows = features["input_ids"]
+        width = max(len(r) for r in rows)
+        assert self.padding_side == "left"
+        ids = _Tensor([[0] * (width - len(r)) + list(r) for r in rows])
+        mask = _Tensor([[0] * (width - len(r)) + [1] * len(r) for r in rows])
+        return {"input_ids": ids, "attention_mask": mask}
+
+    def batch_decode(self, output, skip_special_tokens=True):
+        return [" ".join(str(t) for t in row if t) for row in output]
+
+
+class _Model:
+    device = "cpu"
+
+    def __init__(self, suffix):
+        self.suffix = suffix
+        self.batch_shapes = []
+
+    def generate(self, input_ids, attention_mask, streamer=None, **kwargs):
+        self.batch_shapes.append((len(input_ids), len(input_ids[0])))
+        if streamer is not None:
+            streamer.put(input_ids)
+            streamer.put([self.suffix] * len(input_ids))
+            streamer.end()
+        return [list(row) + [self.suffix] for row in input_ids]
+
+
+@pytest.fixture(autouse=True)
+def _fake_torch(monkeypatch):
+    fake = types.SimpleNamespace(inference_mode=contextlib.nullcontext)
+    monkeypatch.setitem(sys.modules, "torch", fake)
+
+
+def test_plan_tokenizes_once_and_sorts_by_length():
+    tok = _Tok()
+    engine = BatchedGenerator(tok, batch_size=2)
+    plan = engine.plan(["a", "a b c", "a b", "a b c d"])
+    assert tok.calls == 1
+    assert plan.batches == [[3, 1], [2, 0]]
+
+
+def test_run_restores_order_and_reports_latency():
+    tok = _Tok()
+    base, peft = _Model(7), _Model(9)
+    engine = BatchedGenerator(tok, batch_size=2, max_new_tokens=1)
+    prompts = ["x", "yy zz", "aaa", "b c d"]
+    run = engine.run(prompts, {"base": base, "peft": peft})
+
+    assert [r["prompt"] for r in run.rows] == prompts
+    assert run.rows[0]["base_response"] == "1 7"
+    assert run.rows[1]["peft_response"] == "2 2 9"
+    assert run.rows[3]["base_response"] == "1 1 1 7"
+    # Left padding: every batch is padded to its longest member only
+    assert base.batch_shapes == [(2, 3), (2, 1)]
+    for r in run.rows:
+        assert r["batch_size"] == 2
+        assert r["base_latency"] == pytest.approx(r["base_batch_time"] / 2)
+    assert run.summary["batches"] == 2
+    assert run.summary["base"]["items_per_sec"] > 0
+    assert run.summary["prompt_padding"]["pad_tokens"] == 1
+
+
+def test_rejects_bad_batch_size():
+    with pytest.raises(ValueError):
+        BatchedGenerator(_Tok(), batch_size=0)
+
+
+class _FakePeftModel(_Model):
+    """One weight copy; the adapter changes the generated suffix."""
+
+    def __init__(self):
+        super().__init__(suffix=9)
+        self.enabled = True
+
+    @contextlib.contextmanager
+    def disable_adapter(self):
+        self.enabled = False
+        try:
+            yield
+        finally:
+            self.enabled = True
+
+    def generate(self, input_ids, attention_mask, **kwargs):
+        self.suffix = 9 if self.enabled else 7
+        return super().generate(input_ids, attention_mask, **kwargs)
+
+
+def test_adapter_variants_toggle_one_model_per_batch():
+    model = _FakePeftModel()
+    engine = BatchedGenerator(_Tok(), batch_size=2)
+    run = engine.run(["a b", "c", "d e f"], adapter_variants(model))
+
+    assert run.rows[0]["base_response"] == "1 1 7"
+    assert run.rows[0]["peft_response"] == "1 1 9"
+    assert run.rows[2]["base_response"] == "1 1 1 7"
+    assert model.enabled
+    # Each batch is generated twice (adapter off, then on) before the next
+    assert len(model.batch_shapes) == 4
+    assert model.batch_shapes[0] == model.batch_shapes[1]
+
+
+def test_run_records_ttft_and_token_counts():
+    engine = BatchedGenerator(_Tok(), batch_size=2)
+    run = engine.run(["a b c", "d"], {"base": _Model(7)})
+    row = run.rows[0]
+    assert row["base_input_tokens"] == 3
+    assert row["base_output_tokens"] == 1
+    assert run.rows[1]["base_output_tokens"] == 1
+    assert 0 <= row["base_ttft"] <= row["base_batch_time"]
+    stats = run.summary["latency"]["base"]
+    assert stats["input_tokens"]["count"] == 2
+    assert set(stats["latency"]) == {"p50", "p90", "p99", "mean", "count"}
+
+
+def test_on_batch_streams_and_releases_rows():
+    seen = []
+    engine = BatchedGenerator(_Tok(), batch_size=2)
+    run = engine.run(
+        ["a", "b c", "d e f"],
+        {"base": _Model(7)},
+        on_batch=lambda idx, rows: seen.append((idx, [r["prompt"] for r in rows])),
+    )
+    assert seen == [([2, 1], ["d e f", "b c"]), ([0], ["a"])]
+    assert run.rows == []
+    # latency is still summarized over every released row
+    stats = run.summary["latency"]["base"]
+    assert stats["latency"]["count"] == 3
+    assert stats["input_tokens"]["mean"] == pytest.approx(2.0)
+
+
+def test_batch_buckets_pad_rows_and_drop_filler():
+    model = _Model(7)
+    engine = BatchedGenerator(_Tok(), batch_size=4, batch_buckets=(1, 2, 4))
+    run = engine.run(["a", "b b", "c"], {"m": model})
+    assert model.batch_shapes == [(4, 2)]
+    assert [r["m_response"] for r in run.rows] == ["1 7", "1 1 7", "1 7"]
+    assert [r["m_output_tokens"] for r in run.rows] == [1, 1, 1]
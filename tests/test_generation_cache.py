@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import contextlib
+import sys
+import types
+
+import pytest
+from src.evaluation import adapter_fingerprint
+from src.generation import BatchedGenerator
+from src.generation_cache import GenerationCache, cache_key, model_fingerprint
+from tests.test_generation import _Model, _Tok
+
+
+@pytest.fixture(autouse=True)
+def _fake_torch(monkeypatch):
+    fake = types.SimpleNamespace(
+        inference_mode=contextlib.nullcontext, manual_seed=lambda s: None
+    )
+    monkeypatch.setitem(sys.modules, "torch", fake)
+
+
+def test_cache_key_covers_every_field():
+    base = cache_key("fp", "hi", {"max_new_tokens": 8}, 0)
+    assert base == cache_key("fp", "hi", {"max_new_tokens": 8}, 0)
+    assert base != cache_key("fp2", "hi", {"max_new_tokens": 8}, 0)
+    assert base != cache_key("fp", "hi!", {"max_new_tokens": 8}, 0)
+    assert base != cache_key("fp", "hi", {"max_new_tokens": 9}, 0)
+    assert base != cache_key("fp", "hi", {"max_new_tokens": 8}, 1)
+
+
+def test_cache_persists_and_counts(tmp_path):
+    cache = GenerationCache(tmp_path)
+    cache.put_many([("a", "x"), ("b", "y")])
+    cache.close()
+
+    cache = GenerationCache(tmp_path)
+    assert cache.get_many(["a", "b", "c"]) == {"a": "x", "b": "y"}
+    report = cache.report()
+    assert (report["hits"], report["misses"], report["entries"]) == (2, 1, 2)
+
+
+def test_engine_generates_only_misses(tmp_path):
+    prompts = ["a b", "c", "d e f"]
+    fps = {"base": model_fingerprint("base/model")}
+
+    cache = GenerationCache(tmp_path)
+    first = BatchedGenerator(_Tok(), batch_size=2).run(
+        prompts[:2], {"base": _Model(7)}, cache=cache, fingerprints=fps, seed=0
+    )
+    assert first.summary["base"]["generated"] == 2
+
+    model = _Model(7)
+    run = BatchedGenerator(_Tok(), batch_size=2).run(
+        prompts, {"base": model}, cache=cache, fingerprints=fps, seed=0
+    )
+    assert run.summary["base"]["generated"] == 1
+    assert model.batch_shapes == [(1, 3)]
+    assert [r["base_cached"] for r in run.rows] == [True, True, False]
+    assert [r["base_response"] for r in run.rows] == ["1 1 7", "1 7", "1 1 1 7"]
+    assert run.rows[0]["base_latency"] is None
+    assert run.summary["cache"]["hits"] == 2
+
+
+def test_sampled_generation_bypasses_cache(tmp_path):
+    fps = {"base": model_fingerprint("base/model")}
+    cache = GenerationCache(tmp_path)
+    gen = BatchedGenerator(_Tok(), batch_size=2, do_sample=True)
+    for _ in range(2):
+        run = gen.run(
+            ["a b", "c"], {"base": _Model(7)}, cache=cache, fingerprints=fps, seed=0
+        )
+    assert run.summary["base"]["generated"] == 2
+    assert "base_cached" not in run.rows[0]
+    assert cache.report()["entries"] == 0
+
+
+def test_adapter_fingerprint_tracks_content(tmp_path):
+    (tmp_path / "adapter_config.json").write_text("{}")
+    weights = tmp_path / "adapter_model.safetensors"
+    weights.write_bytes(b"\x00" * 16)
+    before = adapter_fingerprint(str(tmp_path))
+    assert before == adapter_fingerprint(str(tmp_path))
+    weights.write_bytes(b"\x01" * 16)
+    assert adapter_fingerprint(str(tmp_path)) != before
+    assert model_fingerprint("m", adapter_fingerprint=before) != model_fingerprint("m")
+
+
+def test_local_base_fingerprint_tracks_checkpoint_files(tmp_path):
+    base = tmp_path / "base"
+    base.mkdir()
+    weights = base / "model.safetensors"
+    weights.write_bytes(b"v1")
+    before = model_fingerprint(str(base))
+    assert before == model_fingerprint(str(base))
+    weights.write_bytes(b"retrained")
+    assert model_fingerprint(str(base)) != before
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+from src.latency import TimingStreamer, latency_stats, latency_summary, new_token_counts
+
+
+def test_streamer_marks_first_generated_token():
+    s = TimingStreamer()
+    s.put([[1, 2, 3]])  # prompt
+    assert s.ttft is None
+    s.put([4])
+    s.put([5])
+    s.end()
+    assert s.ttft is not None and s.ttft >= 0
+    assert s.end_time >= s.first_token_time
+
+
+def test_new_token_counts_skip_pad_after_eos():
+    output = [[0, 5, 6, 7, 2, 2], [8, 9, 6, 7, 8, 2]]
+    assert new_token_counts(output, 3, pad_id=2) == [1, 2]
+
+
+def test_latency_summary_ignores_missing():
+    out = latency_summary([1.0, None, 2.0, 3.0])
+    assert out["count"] == 3
+    assert out["p50"] == pytest.approx(2.0)
+    assert out["mean"] == pytest.approx(2.0)
+    assert latency_summary([None]) == {"count": 0}
+
+
+def test_latency_stats_per_model():
+    rows = [{"base_latency": 1.0, "peft_latency": 2.0}, {"base_latency": 3.0}]
+    stats = latency_stats(rows, ["base", "peft"])
+    assert stats["base"]["latency"]["count"] == 2
+    assert stats["peft"]["latency"]["count"] == 1
+    assert stats["peft"]["ttft"] == {"count": 0}
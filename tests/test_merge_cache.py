@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+from src import evaluation
+from src.merge_cache import (
+    MergeCache,
+    base_revision,
+    load_merged,
+    merge_cache_from_env,
+    merge_key,
+)
+
+
+class _Model:
+    def __init__(self, payload: bytes = b"w" * 100):
+        self.payload = payload
+        self.saved = []
+
+    def save_pretrained(self, path, safe_serialization=False):
+        assert safe_serialization
+        (path / "model.safetensors").write_bytes(self.payload)
+        (path / "config.json").write_text("{}")
+        self.saved.append(path)
+
+
+class _Tok:
+    def save_pretrained(self, path):
+        (path / "tokenizer.json").write_text("{}")
+
+
+def test_store_then_lookup_roundtrip(tmp_path):
+    cache = MergeCache(tmp_path)
+    assert cache.lookup("k") is None
+    path = cache.store("k", _Model(), _Tok(), adapter="abc")
+
+    assert cache.lookup("k") == path
+    assert (path / "model.safetensors").read_bytes() == b"w" * 100
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert set(manifest["k"]["files"]) == {
+        "model.safetensors",
+        "config.json",
+        "tokenizer.json",
+    }
+    assert manifest["k"]["adapter"] == "abc"
+    assert cache.report()["hits"] == 1 and cache.report()["misses"] == 1
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = MergeCache(tmp_path)
+    path = cache.store("k", _Model(), _Tok())
+    (path / "model.safetensors").write_bytes(b"x" * 100)  # same size, new bytes
+
+    assert cache.lookup("k") is None
+    assert cache.corrupt == 1
+    assert not path.exists() and len(cache) == 0
+
+
+def test_size_only_verification_catches_truncation(tmp_path):
+    cache = MergeCache(tmp_path, verify="size")
+    path = cache.store("k", _Model(), _Tok())
+    (path / "model.safetensors").write_bytes(b"w" * 10)
+    assert cache.lookup("k") is None
+
+
+def test_budget_evicts_least_recently_used(tmp_path):
+    cache = MergeCache(tmp_path, max_bytes=250)
+    cache.store("a", _Model(), _Tok())
+    cache.store("b", _Model(), _Tok())
+    cache.lookup("a")  # b is now least recently used
+    cache.store("c", _Model(), _Tok())
+
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None and cache.lookup("c") is not None
+    assert cache.evictions == 1
+
+
+def test_env_cache_verifies_sizes_unless_configured(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUPPORTBOT_MERGE_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("SUPPORTBOT_MERGE_CACHE_VERIFY", raising=False)
+    assert merge_cache_from_env().verify == "size"
+    monkeypatch.setenv("SUPPORTBOT_MERGE_CACHE_VERIFY", "sha256")
+    assert merge_cache_from_env().verify == "sha256"
+    monkeypatch.setenv("SUPPORTBOT_MERGE_CACHE_DIR", "")
+    assert merge_cache_from_env() is None
+
+
+def test_invalid_verify_mode(tmp_path):
+    with pytest.raises(ValueError):
+        MergeCache(tmp_path, verify="md5")
+
+
+def test_key_and_local_revision(tmp_path):
+    (tmp_path / "config.json").write_text("{}")
+    rev = base_revision(str(tmp_path))
+    assert rev.startswith("local-") and rev == base_revision(str(tmp_path))
+    (tmp_path / "model.safetensors").write_bytes(b"w")
+    assert base_revision(str(tmp_path)) != rev
+
+    k = merge_key("m", "r", "a", "bfloat16")
+    assert k == merge_key("m", "r", "a", "bfloat16")
+    assert k != merge_key("m", "r", "a", "float32")
+    assert k != merge_key("m", "r2", "a", "bfloat16")
+
+
+def test_load_merged_skips_merge_on_hit(monkeypatch, tmp_path):
+    base = tmp_path / "base"
+    base.mkdir()
+    (base / "config.json").write_text("{}")
+    loads, merges = [], []
+
+    def fake_load(name, quantization=False, dtype=None, **kwargs):
+        loads.append((name, kwargs.get("fast_load")))
+        return _Model(), _Tok()
+
+    def fake_peft(model, path, merge=True, timeline=None):
+        merges.append(path)
+        return model
+
+    monkeypatch.setattr(evaluation, "load_model_and_tokenizer", fake_load)
+    monkeypatch.setattr(evaluation, "load_peft_model", fake_peft)
+    cache = MergeCache(tmp_path / "cache")
+
+    _, _, hit = load_merged(str(base), "adapter", cache=cache, adapter="fp")
+    assert hit is False and merges == ["adapter"]
+    _, _, hit = load_merged(str(base), "adapter", cache=cache, adapter="fp")
+    assert hit is True and merges == ["adapter"]
+    # The hit loads the cached safetensors directory with the fast path
+    assert loads[-1][1] is True
+    assert loads[-1][0].startswith(str(tmp_path / "cache"))
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import pytest
+from src.model_registry import (
+    ModelKey,
+    ModelRegistry,
+    estimate_bytes,
+    resident_bytes,
+)
+
+MB = 1024 * 1024
+
+
+class _Tensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def numel(self):
+        return self.nbytes
+
+    def element_size(self):
+        return 1
+
+
+class _Model:
+    def __init__(self, name, mb):
+        self.name = name
+        self._params = [_Tensor(mb * MB)]
+
+    def parameters(self):
+        return iter(self._params)
+
+
+SIZES = {"a": 4, "b": 4, "c": 6}
+
+
+@pytest.fixture
+def loads():
+    return []
+
+
+@pytest.fixture
+def registry(loads):
+    def loader(key: ModelKey, peft_model_path, **options):
+        loads.append(key.base_model_name)
+        return _Model(key.base_model_name, SIZES[key.base_model_name]), "tok"
+
+    return ModelRegistry(10 * MB, loader=loader)
+
+
+def test_hits_return_resident_instance(registry, loads):
+    m1, tok = registry.get("a")
+    m2, _ = registry.get("a")
+    assert m1 is m2 and tok == "tok"
+    assert loads == ["a"]
+    entry = registry.report()["entries"][0]
+    assert entry["hits"] == 1 and entry["resident_mb"] == pytest.approx(4)
+
+
+def test_lru_eviction_under_budget(registry, loads):
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # a becomes most recently used
+    registry.get("c")  # 4 + 4 + 6 > 10: evicts b (LRU)
+    names = [e["base_model_name"] for e in registry.report()["entries"]]
+    assert names == ["a", "c"]
+    assert registry.evictions == 1
+    registry.get("b")
+    assert loads == ["a", "b", "c", "b"]
+
+
+def test_evicts_before_loading_when_size_is_known():
+    resident_at_load = []
+
+    def loader(key, peft_model_path, **options):
+        resident_at_load.append(registry.resident_total)
+        return _Model(key.base_model_name, SIZES[key.base_model_name]), "tok"
+
+    registry = ModelRegistry(
+        10 * MB,
+        loader=loader,
+        estimator=lambda key, path: SIZES[key.base_model_name] * MB,
+    )
+    registry.get("a")
+    registry.get("b")
+    registry.get("c")  # a is evicted before c's weights are read
+    assert resident_at_load == [0, 4 * MB, 4 * MB]
+    # resident + incoming weights never exceed the budget
+    assert all(r + SIZES[n] * MB <= 10 * MB for r, n in zip(resident_at_load, "abc"))
+
+
+def test_estimate_bytes_sums_local_safetensors(tmp_path):
+    (tmp_path / "model-00001.safetensors").write_bytes(b"\x00" * 10)
+    (tmp_path / "model-00002.safetensors").write_bytes(b"\x00" * 5)
+    (tmp_path / "config.json").write_text("{}")
+    assert estimate_bytes(ModelKey(str(tmp_path))) == 15
+    assert estimate_bytes(ModelKey(str(tmp_path / "missing"))) == 0
+
+
+def test_keys_cover_dtype_and_quantization(registry, loads):
+    registry.get("a", dtype="bfloat16")
+    registry.get("a", dtype="float32")
+    registry.get("a", quantization=True)
+    assert loads == ["a", "a", "a"]
+
+
+def test_adapter_key_uses_content_hash(registry, tmp_path):
+    (tmp_path / "adapter_model.safetensors").write_bytes(b"x")
+    key = registry.key_for("a", peft_model_path=str(tmp_path), merge=False)
+    assert key.adapter and len(key.adapter) == 64 and key.merged is False
+    assert registry.key_for("a", merge=False).merged is True
+
+
+def test_resident_bytes_without_parameters():
+    assert resident_bytes(object()) == 0
+
+
+def test_resident_bytes_counts_packed_int8_weights():
+    class _Packed:
+        def _weight_bias(self):
+            return _Tensor(3 * MB), None
+
+    class _QLinear:
+        _packed_params = _Packed()
+
+    model = _Model("q", 1)
+    model.modules = lambda: iter([model, _QLinear(), _Packed()])
+    assert resident_bytes(model) == 4 * MB
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pytest
+from src.models import DataRecord, Inputs, Meta, Outputs
+from src.packing import (
+    block_diagonal_mask,
+    pack_examples,
+    packing_report,
+    segment_ids,
+)
+from src.tokenization import IGNORE_INDEX, tokenize_sft_examples
+
+
+class _WsTok:
+    """Whitespace tokenizer with a BOS on prompts and an EOS id."""
+
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        self.eos_token_id = 99
+        self.pad_token_id = 0
+
+    def __call__(self, batch, add_special_tokens=True, **_kw):
+        ids: List[List[int]] = []
+        for text in batch:
+            row = [self.vocab.setdefault(w, len(self.vocab) + 1) for w in text.split()]
+            ids.append(([98] if add_special_tokens else []) + row)
+        return {"input_ids": ids, "attention_mask": [[1] * len(r) for r in ids]}
+
+
+def _rec(i: int, answer: str) -> DataRecord:
+    return DataRecord(
+        id=f"r{i}",
+        inputs=Inputs(question=f"q{i} a b", context=None),
+        outputs=Outputs(answer=answer),
+        meta=Meta(source="web", timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc)),
+    )
+
+
+def test_tokenize_sft_examples_masks_prompt():
+    out = tokenize_sft_examples([_rec(1, "x y")], _WsTok(), max_length=32)
+    ids, labels = out.input_ids[0], out.labels[0]
+    # BOS + 3 prompt tokens masked; answer + EOS supervised
+    assert labels[:4] == [IGNORE_INDEX] * 4
+    assert labels[4:] == ids[4:]
+    assert ids[-1] == 99
+
+
+def test_tokenize_sft_examples_long_prompt_keeps_answer():
+    rec = _rec(1, "x y")
+    rec.inputs.context = " ".join(f"c{i}" for i in range(40))
+    tok = _WsTok()
+    out = tokenize_sft_examples([rec], tok, max_length=16)
+    ids, labels = out.input_ids[0], out.labels[0]
+    assert len(ids) == len(labels) == 16
+    # the prompt is cut from the left; answer + EOS stay supervised
+    assert labels[:13] == [IGNORE_INDEX] * 13
+    assert labels[13:] == ids[13:] and ids[-1] == 99
+    assert ids[12] == tok.vocab["c39"]
+
+
+def test_pack_examples_fills_rows_and_resets_positions():
+    ids = [[1] * 5, [2] * 3, [3] * 4, [4] * 2, [5] * 6]
+    labels = [list(x) for x in ids]
+    packed = pack_examples(ids, labels, max_length=8, pad_id=0)
+    # 20 tokens into rows of 8 -> 3 rows (best-fit decreasing)
+    assert len(packed.input_ids) == 3
+    assert all(len(r) == 8 for r in packed.input_ids)
+    # every example appears exactly once
+    assert sorted(n for row in packed.seq_lengths for n in row) == [2, 3, 4, 5, 6]
+    for row_ids, row_labels, row_pos, lens in zip(
+        packed.input_ids, packed.labels, packed.position_ids, packed.seq_lengths
+    ):
+        start = 0
+        for k, n in enumerate(lens):
+            assert row_pos[start : start + n] == list(range(n))
+            if k > 0:
+                # no loss across the example boundary
+                assert row_labels[start] == IGNORE_INDEX
+            start += n
+        assert all(t == 0 for t in row_ids[start:])
+        assert all(t == IGNORE_INDEX for t in row_labels[start:])
+
+
+def test_pack_examples_truncates_overlong():
+    packed = pack_examples([[7] * 12], [[7] * 12], max_length=8)
+    assert packed.input_ids == [[7] * 8]
+    assert packed.seq_lengths == [[8]]
+
+
+def test_segment_ids_mark_examples_and_padding():
+    assert segment_ids([2, 1], max_length=5) == [0, 0, 1, -1, -1]
+
+
+def test_block_diagonal_mask_blocks_cross_example_attention():
+    torch = pytest.importorskip("torch")
+    m = block_diagonal_mask([[2, 1]], max_length=4)
+    assert m.shape == (1, 1, 4, 4)
+    allowed = (m[0, 0] == 0).int().tolist()
+    assert allowed[0] == [1, 0, 0, 0]
+    assert allowed[1] == [1, 1, 0, 0]
+    assert allowed[2] == [0, 0, 1, 0]
+    assert allowed[3] == [0, 0, 0, 1]  # padding attends only to itself
+    assert m.min() == torch.finfo(torch.float32).min
+
+
+def test_packing_report_gain_matches_row_reduction():
+    lengths = [2, 2, 2, 2]
+    packed = pack_examples([[1] * 2] * 4, [[1] * 2] * 4, max_length=8)
+    rep = packing_report(lengths, packed, max_length=8)
+    assert rep["rows_packed"] == 1
+    assert rep["efficiency_packed"] == 1.0
+    assert rep["expected_tokens_per_sec_gain"] == 4.0
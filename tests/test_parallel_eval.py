@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import queue
+import types
+
+import pytest
+from src.parallel_eval import (
+    _collect,
+    core_sets,
+    shard_by_length,
+    update_scaling_report,
+)
+
+
+def test_core_sets_are_disjoint_and_balanced():
+    sets = core_sets(3, cores=range(8))
+    assert sets == [[0, 1, 2], [3, 4, 5], [6, 7]]
+    with pytest.raises(ValueError):
+        core_sets(9, cores=range(8))
+    with pytest.raises(ValueError):
+        core_sets(0, cores=range(8))
+
+
+def test_shard_by_length_balances_tokens():
+    lengths = [5, 100, 7, 90, 50, 60]
+    shards = shard_by_length(lengths, 2)
+    assert sorted(i for s in shards for i in s) == list(range(6))
+    totals = [sum(lengths[i] for i in s) for s in shards]
+    assert abs(totals[0] - totals[1]) <= 5
+    # Shards stay length-sorted
+    for s in shards:
+        assert [lengths[i] for i in s] == sorted((lengths[i] for i in s), reverse=True)
+
+
+def test_scaling_report_accumulates_runs(tmp_path):
+    path = tmp_path / "worker_scaling.json"
+    update_scaling_report(path, {"num_workers": 1, "items_per_sec": 2.0})
+    data = update_scaling_report(path, {"num_workers": 4, "items_per_sec": 6.0})
+    by_n = {e["num_workers"]: e for e in data["scaling"]}
+    assert by_n[1]["speedup"] == pytest.approx(1.0)
+    assert by_n[4]["speedup"] == pytest.approx(3.0)
+    assert by_n[4]["efficiency"] == pytest.approx(0.75)
+
+
+def test_collect_routes_rows_until_all_done():
+    q = queue.Queue()
+    q.put(("rows", 0, [1], [{"r": 1}]))
+    q.put(("done", 0, {"items": 1}))
+    seen = []
+    procs = [types.SimpleNamespace(exitcode=None)]
+    workers = _collect(q, procs, on_batch=lambda i, r: seen.append(i))
+    assert seen == [[1]] and workers == {0: {"items": 1}}
+
+
+def test_collect_fails_when_worker_dies_silently():
+    q = queue.Queue()
+    q.put(("done", 0, {}))
+    procs = [types.SimpleNamespace(exitcode=0), types.SimpleNamespace(exitcode=-9)]
+    with pytest.raises(RuntimeError, match="worker 1 died \\(signal 9\\)"):
+        _collect(q, procs, on_batch=lambda i, r: None, poll_interval=0.01)
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import sys
+import types
+from datetime import datetime, timezone
+
+import pytest
+from src.models import DataRecord, Inputs, Meta, Outputs
+from src.tokenization import IGNORE_INDEX
+
+
+class _WsTok:
+    eos_token_id = 2
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, batch, add_special_tokens=True, **_kw):
+        ids = [
+            ([1] if add_special_tokens else [])
+            + [self.vocab.setdefault(w, len(self.vocab) + 10) for w in t.split()]
+            for t in batch
+        ]
+        return {"input_ids": ids, "attention_mask": [[1] * len(r) for r in ids]}
+
+
+def _rec(i: int) -> DataRecord:
+    return DataRecord(
+        id=f"r{i}",
+        inputs=Inputs(question=f"how do I reset {i}", context=None),
+        outputs=Outputs(answer="open settings"),
+        meta=Meta(source="web", timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc)),
+    )
+
+
+def test_prepare_data_sft_split_loads_in_train_lora(tmp_path, monkeypatch):
+    # Other tests may leave stub torch/transformers modules behind; datasets
+    # probes sys.modules for torch when writing Arrow.
+    for name in ("torch", "transformers"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    from scripts import prepare_data as P
+    from scripts import train_lora as T
+
+    sft_dir = tmp_path / "sft"
+    tok = _WsTok()
+    P._dump_sft_dataset([_rec(1), _rec(2)], tok, sft_dir / "train", max_length=16)
+    P._dump_sft_dataset([_rec(3)], tok, sft_dir / "val", max_length=16)
+    (sft_dir / "meta.json").write_text(json.dumps({"tokenizer": "fake"}))
+
+    train_ds, val_ds = T._load_pretokenized(sft_dir, "fake")
+    assert len(train_ds) == 2 and len(val_ds) == 1
+    row = train_ds[0]
+    # BOS + 5 prompt tokens masked, answer (2) + EOS supervised
+    assert row["labels"][:6] == [IGNORE_INDEX] * 6
+    assert row["labels"][6:] == row["input_ids"][6:]
+    assert row["length"] == len(row["input_ids"]) == 9
+
+
+def test_rows_without_supervised_labels_are_dropped(tmp_path, monkeypatch):
+    for name in ("torch", "transformers"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    from datasets import Dataset
+    from scripts import prepare_data as P
+    from scripts import train_lora as T
+
+    class _NoEos(_WsTok):
+        eos_token_id = None
+
+    empty = _rec(2)
+    empty.outputs.answer = ""
+    sft_dir = tmp_path / "sft"
+    dropped = P._dump_sft_dataset(
+        [_rec(1), empty], _NoEos(), sft_dir / "train", max_length=16
+    )
+    assert dropped == 1
+
+    # splits written without the filter are cleaned up at load time
+    ids = [[1, 10, 11], [1, 12, 13]]
+    labels = [[IGNORE_INDEX] * 3, [IGNORE_INDEX, IGNORE_INDEX, 13]]
+    Dataset.from_dict({"input_ids": ids, "labels": labels}).save_to_disk(
+        str(sft_dir / "val")
+    )
+    (sft_dir / "meta.json").write_text(json.dumps({"tokenizer": "fake"}))
+    train_ds, val_ds = T._load_pretokenized(sft_dir, "fake")
+    assert train_ds["id"] == ["r1"]
+    assert val_ds["input_ids"] == [[1, 12, 13]]
+
+
+def test_pretokenized_max_length_mismatch_fails(tmp_path):
+    from scripts import train_lora as T
+
+    (tmp_path / "meta.json").write_text(
+        json.dumps({"tokenizer": "fake", "max_length": 512})
+    )
+    with pytest.raises(SystemExit, match="--max-length 512"):
+        T._load_pretokenized(tmp_path, "fake", 2048)
+
+
+def test_pack_tokenized_dataset_matches_in_memory_packing(tmp_path, monkeypatch):
+    for name in ("torch", "transformers"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    from datasets import Dataset
+    from scripts import train_lora as T
+    from src.packing import pack_examples
+
+    ids = [[1] * 5, [2] * 3, [3] * 4, [4] * 2, [5] * 6, [6] * 10]
+    labels = [[IGNORE_INDEX] + x[1:] for x in ids]
+    ds = Dataset.from_dict(
+        {"input_ids": ids, "labels": labels, "length": [len(x) for x in ids]}
+    )
+    tok = types.SimpleNamespace(pad_token_id=0)
+    packed, report = T._pack_tokenized(
+        ds, tok, max_length=8, cache_file=tmp_path / "train.arrow", batch_size=2
+    )
+    expected = pack_examples(ids, labels, max_length=8)
+    assert packed["input_ids"] == expected.input_ids
+    assert packed["labels"] == expected.labels
+    assert packed["seq_lengths"] == expected.seq_lengths
+    assert packed.cache_files[0]["filename"] == str(tmp_path / "train.arrow")
+    assert report["rows_packed"] == len(expected.input_ids)
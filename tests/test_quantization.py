@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import sys
+import types
+
+import pytest
+from src.quantization import _skipped, output_drift, resolve_quantization
+
+
+def test_auto_prefers_nf4_then_cpu_int8():
+    assert resolve_quantization(True, nf4_supported=True) == "nf4"
+    assert resolve_quantization(True, nf4_supported=False) == "int8-dynamic"
+    assert resolve_quantization("auto", nf4_supported=False) == "int8-dynamic"
+    assert resolve_quantization(False, nf4_supported=True) is None
+    assert resolve_quantization("int8-dynamic", nf4_supported=True) == "int8-dynamic"
+
+
+def test_explicit_backend_errors():
+    with pytest.raises(RuntimeError):
+        resolve_quantization("nf4", nf4_supported=False)
+    with pytest.raises(ValueError):
+        resolve_quantization("int4", nf4_supported=True)
+
+
+def test_skip_keeps_lm_head_and_lora_in_float():
+    assert _skipped("lm_head", {"lm_head"})
+    assert _skipped("model.layers.0.q_proj.lora_A.default", {"lm_head"})
+    assert not _skipped("model.layers.0.q_proj.base_layer", {"lm_head"})
+    assert not _skipped("model.layers.0.mlp.up_proj", {"lm_head"})
+
+
+def test_output_drift():
+    drift = output_drift(["a b c", "x y"], ["a b c", "x z"])
+    assert drift["compared"] == 2
+    assert drift["exact_match"] == 0.5
+    assert drift["min_similarity"] == 0.5
+    assert drift["similarity"] == pytest.approx(0.75)
+    with pytest.raises(ValueError):
+        output_drift(["a"], [])
+
+
+def test_cpu_host_loads_float32_then_quantizes(monkeypatch):
+    class _Tok:
+        pad_token = "<pad>"
+
+        @classmethod
+        def from_pretrained(cls, name):
+            return cls()
+
+    calls = []
+
+    def auto_model(name, **kwargs):
+        calls.append(kwargs)
+        return "model"
+
+    f32 = object()
+    monkeypatch.setitem(
+        sys.modules,
+        "transformers",
+        types.SimpleNamespace(AutoTokenizer=_Tok, AutoModelForCausalLM=auto_model),
+    )
+    monkeypatch.setitem(
+        sys.modules, "torch", types.SimpleNamespace(bfloat16=object(), float32=f32)
+    )
+    from src import evaluation as evalmod
+    from src import quantization
+
+    quantized = []
+    monkeypatch.setattr(evalmod, "_quantization_supported", lambda: False)
+    monkeypatch.setattr(
+        quantization, "quantize_dynamic_int8", lambda m, **kw: quantized.append(m)
+    )
+
+    evalmod.load_model_and_tokenizer("base/model", quantization=True)
+    assert calls[-1]["torch_dtype"] is f32
+    assert calls[-1]["device_map"] == "cpu"
+    assert "quantization_config" not in calls[-1]
+    assert quantized == ["model"]
+
+    # Deferred for adapters: quantize only after the adapter is attached
+    evalmod.load_model_and_tokenizer(
+        "base/model", quantization=True, defer_quantization=True
+    )
+    assert quantized == ["model"]
+    evalmod.quantize_after_adapter("peft", True)
+    assert quantized == ["model", "peft"]
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from src.results_store import ResultsWriter, completed_ids, read_results
+
+
+def test_writer_appends_and_resumes(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with ResultsWriter(path) as w:
+        w.write([{"suite": "s", "id": "0", "x": 1}, {"suite": "s", "id": "1", "x": 2}])
+    # Simulate a crash mid-write of the next batch
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"suite": "s", "id": "2", "x"')
+
+    assert completed_ids(path) == {("s", "0"), ("s", "1")}
+    with ResultsWriter(path, resume=True) as w:
+        w.write([{"suite": "s", "id": "2", "x": 3}])
+    assert [r["x"] for r in read_results(path)] == [1, 2, 3]
+
+    # Without resume the file starts over
+    with ResultsWriter(path) as w:
+        w.write([{"suite": "s", "id": "9", "x": 0}])
+    assert completed_ids(path) == {("s", "9")}
+
+
+def test_read_results_last_write_wins(tmp_path):
+    path = tmp_path / "results.jsonl"
+    with ResultsWriter(path) as w:
+        w.write([{"id": "a", "v": 1}])
+        w.write([{"id": "a", "v": 2}])
+    assert read_results(path) == [{"id": "a", "v": 2}]
+    assert read_results(tmp_path / "missing.jsonl") == []
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from src.sampling import (
+    LengthGroupedSampler,
+    dataloader_batches,
+    length_grouped_batches,
+    padding_report,
+    padding_stats,
+    token_lengths,
+)
+
+
+def test_sorted_batches_cover_all_indices_once():
+    lengths = [5, 1, 9, 3, 7, 2, 8]
+    batches = length_grouped_batches(lengths, 3, shuffle=False)
+    assert batches == [[2, 6, 4], [0, 3, 5], [1]]
+
+
+def test_shuffled_batches_deterministic_and_complete():
+    lengths = [(i * 37) % 101 for i in range(200)]
+    a = length_grouped_batches(lengths, 8, shuffle=True, window_batches=4, seed=1)
+    b = length_grouped_batches(lengths, 8, shuffle=True, window_batches=4, seed=1)
+    c = length_grouped_batches(lengths, 8, shuffle=True, window_batches=4, seed=2)
+    assert a == b and a != c
+    assert sorted(i for batch in a for i in batch) == list(range(200))
+    # longest example is in the first batch
+    assert max(lengths) in [lengths[i] for i in a[0]]
+
+
+def test_grouping_reduces_padding():
+    lengths = [(i * 37) % 101 + 1 for i in range(400)]
+    rep = padding_report(lengths, 8, window_batches=10, seed=0)
+    assert rep["length_grouped"]["real_tokens"] == rep["random"]["real_tokens"]
+    assert rep["length_grouped"]["pad_fraction"] < rep["random"]["pad_fraction"] / 2
+
+
+def test_padding_stats_counts():
+    stats = padding_stats([2, 4, 4], [[0, 1], [2]])
+    assert stats["real_tokens"] == 10
+    assert stats["padded_tokens"] == 12
+    assert stats["pad_tokens"] == 2
+
+
+def test_sampler_reshuffles_per_epoch():
+    lengths = list(range(64))
+    s = LengthGroupedSampler(lengths, 4, window_batches=2, seed=3)
+    first = list(s)
+    s.set_epoch(1)
+    second = list(s)
+    assert sorted(first) == sorted(second) == lengths
+    assert first != second
+    assert len(s) == 64
+
+
+def test_dataloader_chunks_match_planned_batches():
+    lengths = [100, 99, 98, 97, 10, 9, 8, 7, 50, 49]
+    for seed in range(20):
+        s = LengthGroupedSampler(lengths, 4, window_batches=1, seed=seed)
+        assert dataloader_batches(s, 4) == s.batches()
+        assert len(s.batches()[-1]) == 2
+
+
+def test_token_lengths_uses_one_batched_call():
+    calls = []
+
+    def tok(batch, **kw):
+        calls.append(batch)
+        return {"input_ids": [t.split() for t in batch]}
+
+    assert token_lengths(tok, ["a b", "c", "d e f"]) == [2, 1, 3]
+    assert len(calls) == 1
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import sys
+import types
+
+from src.startup import StartupTimeline, prefetch_weights, safetensors_files, warmup
+
+
+class _Recorder:
+    def __init__(self, ret=None):
+        self.calls = []
+        self.ret = ret
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return self.ret
+
+
+def test_timeline_records_phases_and_exports_json(tmp_path):
+    tl = StartupTimeline()
+    with tl.phase("tokenizer"):
+        pass
+    with tl.phase("weights", prefetch=True) as entry:
+        entry["shards"] = 2
+
+    report = tl.report()
+    assert [p["name"] for p in report["phases"]] == ["tokenizer", "weights"]
+    assert report["phases"][1]["prefetch"] is True
+    assert report["phases"][1]["shards"] == 2
+    assert report["time_to_ready"] >= report["phases"][1]["seconds"]
+    assert "time_to_ready" in tl.format()
+
+    out = tmp_path / "nested" / "startup.json"
+    tl.to_json(out)
+    assert json.loads(out.read_text())["phases"][0]["name"] == "tokenizer"
+
+
+def test_prefetch_reads_local_shards(tmp_path):
+    (tmp_path / "model-00002.safetensors").write_bytes(b"b" * 10)
+    (tmp_path / "model-00001.safetensors").write_bytes(b"a" * 10)
+    (tmp_path / "config.json").write_text("{}")
+
+    assert [f.name for f in safetensors_files(str(tmp_path))] == [
+        "model-00001.safetensors",
+        "model-00002.safetensors",
+    ]
+    thread = prefetch_weights(str(tmp_path))
+    assert thread is not None
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_prefetch_without_shards_is_noop(tmp_path):
+    assert prefetch_weights(str(tmp_path)) is None
+
+
+def test_fast_load_passes_mmap_kwargs_and_times_phases(monkeypatch, tmp_path):
+    (tmp_path / "model.safetensors").write_bytes(b"x" * 10)
+
+    class _Tok:
+        pad_token = None
+        eos_token = "</s>"
+
+        @classmethod
+        def from_pretrained(cls, name):
+            return cls()
+
+    auto_model = _Recorder(ret=object())
+    monkeypatch.setitem(
+        sys.modules,
+        "transformers",
+        types.SimpleNamespace(AutoTokenizer=_Tok, AutoModelForCausalLM=auto_model),
+    )
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(bfloat16=object()))
+
+    from src import evaluation as evalmod
+
+    monkeypatch.setattr(evalmod, "_quantization_supported", lambda: False)
+    tl = StartupTimeline()
+    evalmod.load_model_and_tokenizer(
+        str(tmp_path), fast_load=True, prefetch=True, timeline=tl
+    )
+
+    _, kwargs = auto_model.calls[-1]
+    assert kwargs["low_cpu_mem_usage"] is True
+    assert kwargs["use_safetensors"] is True
+    names = [p["name"] for p in tl.phases]
+    assert names == ["tokenizer", "weights"]
+    assert tl.phases[1]["prefetch"] is True
+
+
+def test_default_load_keeps_previous_kwargs(monkeypatch):
+    class _Tok:
+        pad_token = "<pad>"
+
+        @classmethod
+        def from_pretrained(cls, name):
+            return cls()
+
+    auto_model = _Recorder(ret=object())
+    monkeypatch.setitem(
+        sys.modules,
+        "transformers",
+        types.SimpleNamespace(AutoTokenizer=_Tok, AutoModelForCausalLM=auto_model),
+    )
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(bfloat16=object()))
+
+    from src import evaluation as evalmod
+
+    monkeypatch.setattr(evalmod, "_quantization_supported", lambda: False)
+    evalmod.load_model_and_tokenizer("base/model")
+    _, kwargs = auto_model.calls[-1]
+    assert "low_cpu_mem_usage" not in kwargs
+    assert "use_safetensors" not in kwargs
+
+
+def test_warmup_generates_one_token(monkeypatch):
+    monkeypatch.setitem(
+        sys.modules,
+        "torch",
+        types.SimpleNamespace(inference_mode=contextlib.nullcontext),
+    )
+
+    class _Inputs(dict):
+        def to(self, device):
+            return self
+
+    model = types.SimpleNamespace(device="cpu", generate=_Recorder())
+    tl = StartupTimeline()
+    warmup(model, lambda text, return_tensors: _Inputs(input_ids=[[1]]), tl)
+
+    _, kwargs = model.generate.calls[-1]
+    assert kwargs["max_new_tokens"] == 1
+    assert [p["name"] for p in tl.phases] == ["first_token"]
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import sys
+import threading
+import types
+
+import pytest
+from api.streaming import AsyncTextStreamer, StreamMetrics, stream_generate
+from tests.test_generation import _Tensor
+
+
+class _Tok:
+    """Tokenizer whose ids are character codes; id 0 decodes to U+FFFD."""
+
+    padding_side = "right"
+
+    def __call__(self, text, **kwargs):
+        return {"input_ids": [ord(c) for c in text]}
+
+    def pad(self, features, return_tensors=None, **kwargs):
+        rows = features["input_ids"]
+        return {
+            "input_ids": _Tensor(rows),
+            "attention_mask": _Tensor([[1] * len(r) for r in rows]),
+        }
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(i) if i else "\ufffd" for i in ids)
+
+
+class _Model:
+    """Streams `reply` one token per step, checking stop criteria each step."""
+
+    device = "cpu"
+
+    def __init__(self, reply, fail=False, step=None):
+        self.reply = reply
+        self.fail = fail
+        self.step = step
+        self.steps = 0
+        self.stopped = threading.Event()
+
+    def generate(self, input_ids, attention_mask, streamer, stopping_criteria, **kw):
+        streamer.put(input_ids)
+        for ch in self.reply:
+            if self.fail:
+                raise ValueError("model fell over")
+            if self.step is not None:
+                self.step.acquire(timeout=1)
+            self.steps += 1
+            streamer.put([ord(ch)])
+            if any(c(input_ids, None) for c in stopping_criteria):
+                self.stopped.set()
+                break
+        streamer.end()
+
+
+@pytest.fixture(autouse=True)
+def _fake_torch(monkeypatch):
+    fake = types.SimpleNamespace(inference_mode=contextlib.nullcontext)
+    monkeypatch.setitem(sys.modules, "torch", fake)
+
+
+def _frames(chunks):
+    out = []
+    for chunk in chunks:
+        head, data = chunk.strip().split("\n")
+        out.append((head[len("event: ") :], json.loads(data[len("data: ") :])))
+    return out
+
+
+async def _collect(gen):
+    return [chunk async for chunk in gen]
+
+
+def test_streams_tokens_then_done_with_ttft():
+    metrics = StreamMetrics()
+    chunks = asyncio.run(
+        _collect(stream_generate(_Model("hey"), _Tok(), "hi", metrics=metrics))
+    )
+    frames = _frames(chunks)
+    assert [f for f in frames if f[0] == "token"] == [
+        ("token", {"text": c}) for c in "hey"
+    ]
+    event, done = frames[-1]
+    assert event == "done" and done["output_tokens"] == 3
+    assert 0 <= done["ttft"] <= done["total_time"]
+    stats = metrics.stats()
+    assert stats["started"] == stats["completed"] == 1
+    assert stats["ttft"]["count"] == 1
+
+
+def test_error_is_reported_as_event():
+    metrics = StreamMetrics()
+    chunks = asyncio.run(
+        _collect(stream_generate(_Model("x", fail=True), _Tok(), "hi", metrics=metrics))
+    )
+    [(event, data)] = _frames(chunks)
+    assert event == "error" and "model fell over" in data["detail"]
+    assert metrics.failed == 1
+
+
+def test_closing_the_stream_cancels_generation():
+    step = threading.Semaphore(0)
+    model = _Model("abcdefgh", step=step)
+    metrics = StreamMetrics()
+
+    async def main():
+        gen = stream_generate(model, _Tok(), "hi", metrics=metrics)
+        step.release()
+        first = await gen.__anext__()
+        await gen.aclose()  # what the server does when the client goes away
+        step.release()
+        return first
+
+    first = asyncio.run(main())
+    assert _frames([first]) == [("token", {"text": "a"})]
+    assert model.stopped.wait(1)
+    assert model.steps <= 2  # stopped at the first check after the close
+    assert metrics.cancelled == 1 and metrics.completed == 0
+
+
+def test_disconnect_check_stops_stream():
+    model = _Model("abcdefgh")
+
+    async def gone():
+        return True
+
+    chunks = asyncio.run(
+        _collect(stream_generate(model, _Tok(), "hi", is_disconnected=gone))
+    )
+    assert len(chunks) == 1
+    assert model.stopped.wait(1)
+
+
+def test_incomplete_characters_are_held_back():
+    async def main():
+        streamer = AsyncTextStreamer(_Tok(), asyncio.get_running_loop())
+        streamer.put([[104, 105]])  # prompt
+        streamer.put([0])
+        streamer.put([ord("a")])
+        streamer.end()
+        return [t async for t in streamer]
+
+    # The U+FFFD chunk is withheld until a later token is decoded
+    assert asyncio.run(main()) == ["\ufffda"]
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from src.token_stats import split_report, text_histogram
+
+
+def test_split_report_truncation_and_rows():
+    prompts = [4, 10, 30]
+    answers = [2, 2, 12]
+    rep = split_report(prompts, answers, max_lengths=[8, 64], stride=2)
+    assert rep["records"] == 3
+    assert rep["prompt"]["p100"] == 30.0
+    at8 = rep["max_length"]["8"]
+    # records 2 and 3 exceed 8 on at least one side
+    assert abs(at8["pairs"]["records_truncated"] - 2 / 3) < 1e-9
+    # lost: prompt (10-8)+(30-8) + answer (12-8)
+    assert at8["pairs"]["tokens_lost"] == 28
+    # combined lengths 6, 12, 42 -> lost 4 + 34
+    assert at8["combined"]["tokens_lost"] == 38
+    # joint budget: prompt budgets 6, 6, 4 (answer 12 kept to 4) with
+    # overlap 2 -> 1 + 2 + 14 rows
+    assert at8["sliding_window_rows"] == 17
+    at64 = rep["max_length"]["64"]
+    assert at64["pairs"]["records_truncated"] == 0.0
+    assert at64["sliding_window_rows"] == 3
+
+
+def test_text_histogram_counts_all_values():
+    out = text_histogram([1, 2, 20, 40, 40, 300], width=10, title="t")
+    lines = out.splitlines()
+    assert lines[0] == "t"
+    assert sum(int(line.split()[1]) for line in lines[1:]) == 6